@@ -0,0 +1,106 @@
+"""
+Performance benchmarks for the shop.
+
+Run from the project directory (next to manage.py), e.g.::
+
+    python -m benchmarks.search --sizes 100000 1000000
+
+Each benchmark runs against a scratch SQLite database, never db.sqlite3.
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import django
+
+
+def setup(db_path=None):
+    """Point Django at a fresh scratch database and migrate it."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ecomsite.settings")
+
+    from django.conf import settings
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="shop-bench-"), "bench.sqlite3")
+    settings.DATABASES["default"]["NAME"] = db_path
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+    return db_path
+
+
+# ==========================
+# SYNTHETIC CATALOG
+# ==========================
+SYLLABLES = [
+    "ka", "lo", "mi", "ne", "ra", "su", "to", "vi", "ze", "po",
+    "ber", "cal", "dor", "fen", "gar", "hol", "jin", "lum", "mor", "tek",
+]
+
+
+def make_vocabulary(size=5000, seed=1):
+    """Deterministic list of pronounceable fake words."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def insert_products(count, batch_size=20000, seed=1, subcategories=()):
+    """
+    Bulk-load ``count`` synthetic products with raw executemany. With
+    ``subcategories`` (``(category_id, subcategory_id)`` pairs) each
+    product is filed under a random one.
+    """
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    now = timezone.now().isoformat()
+    placements = list(subcategories) or [(None, None)]
+
+    sql = (
+        "INSERT INTO shop_products "
+        "(title, price, discount, description, image, image_url, image_variants, "
+        "category_id, subcategory_id, created_at, updated_at) "
+        "VALUES (%s, %s, 0, %s, '', NULL, '{}', %s, %s, %s, %s)"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, count, batch_size):
+            rows = [
+                (
+                    " ".join(rng.choices(vocabulary, k=3)).title(),
+                    round(rng.uniform(1, 500), 2),
+                    " ".join(rng.choices(vocabulary, k=20)),
+                    *rng.choice(placements),
+                    now,
+                    now,
+                )
+                for _ in range(min(batch_size, count - start))
+            ]
+            cursor.executemany(sql, rows)
+    return vocabulary
+
+
+# ==========================
+# TIMING
+# ==========================
+def measure(func, repeat=20):
+    """Call ``func`` ``repeat`` times; return latency stats in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max": samples[-1],
+    }
@@ -0,0 +1,121 @@
+"""
+WSGI vs ASGI on the read path.
+
+Seeds one scratch database, then serves it twice — gunicorn with sync
+workers (``ecomsite.wsgi``) and uvicorn (``ecomsite.asgi``, where index,
+details and profile run as async views) — and loads each with the same
+mix of listing, detail and profile requests from 500 keep-alive
+connections (benchmarks/loadgen.py).
+
+    python -m benchmarks.asgi_vs_wsgi --products 20000 --workers 4 --connections 500
+
+Needs gunicorn and uvicorn installed; both servers get the same worker
+count. Raise ``ulimit -n`` above the connection count first.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+from . import insert_products, loadgen, setup
+from .dataset import login_cookie
+
+
+SERVERS = {
+    "wsgi": lambda port, workers, threads: [
+        sys.executable, "-m", "gunicorn", "ecomsite.wsgi:application",
+        "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+        "--threads", str(threads), "--log-level", "warning",
+    ],
+    "asgi": lambda port, workers, threads: [
+        sys.executable, "-m", "uvicorn", "ecomsite.asgi:application",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+        "--log-level", "warning", "--no-access-log",
+    ],
+}
+
+
+def seed(products):
+    """Catalog plus one shopper with a wishlist; returns (paths, cookie)."""
+    from django.contrib.auth.models import User
+
+    from shop.models import Products, Wishlist
+
+    insert_products(products)
+    product_ids = list(Products.objects.values_list("id", flat=True))
+    rng = random.Random(5)
+
+    user = User.objects.create_user("loadtest", password="loadtest")
+    Wishlist.objects.create(user=user).products.set(rng.sample(product_ids, 20))
+
+    paths = ["/", "/profile/"] + [f"/{pk}/" for pk in rng.sample(product_ids, 50)]
+    return paths, login_cookie(user)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not come up")
+
+
+def run_server(name, db_path, args, paths, cookie):
+    env = dict(os.environ, SHOP_DB_PATH=db_path, DJANGO_SETTINGS_MODULE="ecomsite.settings")
+    command = SERVERS[name](args.port, args.workers, args.threads)
+    server = subprocess.Popen(command, env=env)
+    try:
+        wait_for_port(args.port)
+        url = f"http://127.0.0.1:{args.port}"
+        loadgen.run(url, paths, connections=args.workers * 4, duration=3, cookie=cookie)
+        return loadgen.run(url, paths, args.connections, args.duration, cookie)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, args.connections * 2 + 256)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    db_path = setup()
+    paths, cookie = seed(args.products)
+
+    results = {}
+    for name in ("wsgi", "asgi"):
+        results[name] = run_server(name, db_path, args, paths, cookie)
+
+    print(f"{args.products:,} products, {args.workers} workers, {args.connections} connections")
+    print(f"{'':6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  errors")
+    for name, stats in results.items():
+        print(
+            f"{name:6}{stats['throughput']:>10,.0f}{stats['p50']:>10.1f}"
+            f"{stats['p95']:>10.1f}{stats['p99']:>10.1f}  {stats['errors'] or '-'}"
+        )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
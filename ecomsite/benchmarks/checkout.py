@@ -0,0 +1,125 @@
+"""
+Concurrent checkout stress test.
+
+Every user's cart is submitted twice, from different threads at once (a
+double-click), and the run then checks that exactly one order per user
+exists with the right lines and total — nothing lost, nothing duplicated.
+
+    python -m benchmarks.checkout --users 500 --threads 16
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import insert_products, setup
+
+
+LINES_PER_CART = 3
+
+
+def seed_carts(users):
+    from django.contrib.auth.models import User
+
+    from shop.models import Cart, CartItem, Products
+
+    insert_products(200)
+    products = list(Products.objects.values_list("id", "price"))
+    rng = random.Random(7)
+
+    User.objects.bulk_create([User(username=f"buyer{n}") for n in range(users)])
+    accounts = list(User.objects.filter(username__startswith="buyer"))
+    Cart.objects.bulk_create([Cart(user=user) for user in accounts])
+    carts = Cart.objects.in_bulk(field_name="user_id")
+
+    expected = {}
+    items = []
+    for user in accounts:
+        total = 0.0
+        for product_id, price in rng.sample(products, LINES_PER_CART):
+            quantity = rng.randint(1, 3)
+            items.append(CartItem(
+                cart=carts[user.id], product_id=product_id, price=price, quantity=quantity,
+            ))
+            total += price * quantity
+        expected[user.id] = total
+    CartItem.objects.bulk_create(items)
+    Cart.objects.recompute_totals()
+    return accounts, expected
+
+
+def run(users, threads):
+    setup()
+
+    from django.db import OperationalError, connection
+
+    from shop.checkout import place_order_from_cart
+    from shop.models import CartItem, Order, OrderItem
+
+    accounts, expected = seed_carts(users)
+    submissions = [user for user in accounts for _ in range(2)]
+    random.Random(3).shuffle(submissions)
+
+    lock_errors = 0
+    counter_lock = threading.Lock()
+
+    def submit(user):
+        nonlocal lock_errors
+        try:
+            for attempt in range(50):
+                try:
+                    return place_order_from_cart(user)
+                except OperationalError:
+                    with counter_lock:
+                        lock_errors += 1
+                    time.sleep(0.005 * (attempt + 1))
+            raise RuntimeError(f"gave up on {user.username}")
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(submit, submissions))
+    elapsed = time.perf_counter() - started
+
+    placed = [order for order in results if order is not None]
+    per_user = {}
+    for user_id, total in Order.objects.values_list("user_id", "total"):
+        per_user.setdefault(user_id, []).append(total)
+
+    problems = []
+    for user in accounts:
+        totals = per_user.get(user.id, [])
+        if len(totals) != 1:
+            problems.append(f"{user.username}: {len(totals)} orders")
+        elif abs(totals[0] - expected[user.id]) > 1e-6:
+            problems.append(f"{user.username}: total {totals[0]} != {expected[user.id]}")
+    if OrderItem.objects.count() != users * LINES_PER_CART:
+        problems.append(f"{OrderItem.objects.count()} order lines, expected {users * LINES_PER_CART}")
+    if CartItem.objects.exists():
+        problems.append(f"{CartItem.objects.count()} cart items left behind")
+
+    print(f"{users} users x 2 submissions on {threads} threads")
+    print(f"  orders placed     {len(placed)}")
+    print(f"  duplicates caught {len(submissions) - len(placed)}")
+    print(f"  lock retries      {lock_errors}")
+    print(f"  throughput        {len(placed) / elapsed:,.0f} orders/s ({elapsed:.2f}s)")
+    if problems:
+        print("FAILED:")
+        for problem in problems[:20]:
+            print("  " + problem)
+        raise SystemExit(1)
+    print("  OK: one order per user, no lost or duplicated lines")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+    run(args.users, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Synthetic shop data for benchmarks.
+
+``generate()`` fills a (scratch) database with categories, subcategories,
+products, users, filled carts and past orders (plus their "frequently
+bought together" index), all by bulk inserts, and is deterministic for a
+given ``seed``. A few hundred thousand rows take seconds::
+
+    python -m benchmarks.dataset --products 100000 --orders 50000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import timedelta
+
+from . import insert_products, setup
+
+
+PASSWORD = "bench"
+
+
+def generate(categories=10, subcategories=5, products=10000, users=200, carts=100, orders=1000,
+             lines=3, seed=1):
+    """
+    Returns a dict of what was made: ``category_ids``, ``product_ids``,
+    ``shopper`` (a user with a filled cart) and
+    ``buyers`` (further users with filled carts, ready to check out).
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from shop import copurchase
+    from shop.models import Cart, CartItem, Category, Order, Products, SubCategory
+
+    rng = random.Random(seed)
+
+    with transaction.atomic():
+        Category.objects.bulk_create([Category(name=f"Category {n}") for n in range(categories)])
+        category_ids = list(Category.objects.values_list("id", flat=True))
+        SubCategory.objects.bulk_create([
+            SubCategory(category_id=category_id, name=f"Sub {n}")
+            for category_id in category_ids for n in range(subcategories)
+        ])
+        placements = list(SubCategory.objects.values_list("category_id", "id"))
+
+    insert_products(products, seed=seed, subcategories=placements)
+    catalog = list(Products.objects.values_list("id", "title", "price"))
+    call_command("rebuild_search_index", verbosity=0, stdout=open(os.devnull, "w"))
+
+    # Users share one password hash: hashing is deliberately slow.
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([User(username=f"shopper{n}", password=password) for n in range(users)])
+    accounts = list(User.objects.filter(username__startswith="shopper").order_by("id"))
+
+    with transaction.atomic():
+        Cart.objects.bulk_create([Cart(user=user) for user in accounts[:carts]])
+        cart_ids = Cart.objects.in_bulk(field_name="user_id")
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart_ids[user.id], product_id=product_id, price=price, quantity=rng.randint(1, 3))
+            for user in accounts[:carts]
+            for product_id, _, price in rng.sample(catalog, min(lines, len(catalog)))
+        ])
+        Cart.objects.recompute_totals()
+
+    # Orders go in with raw executemany: Order.created_at is auto_now_add,
+    # and history should be spread over the past year.
+    now = timezone.now()
+    statuses = [status for status, _ in Order.STATUS_CHOICES]
+    order_rows, item_rows = [], []
+    for n in range(orders):
+        picked = [
+            (product_id, title, price, rng.randint(1, 3))
+            for product_id, title, price in rng.sample(catalog, min(lines, len(catalog)))
+        ]
+        order_rows.append((
+            rng.choice(accounts).id,
+            f"#BENCH-{n:07d}",
+            rng.choice(statuses),
+            round(sum(price * quantity for _, _, price, quantity in picked), 2),
+            (now - timedelta(minutes=rng.randrange(365 * 24 * 60))).isoformat(),
+        ))
+        item_rows.append(picked)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO shop_order (user_id, order_code, status, total, created_at) VALUES (%s, %s, %s, %s, %s)",
+            order_rows,
+        )
+        cursor.execute("SELECT order_code, id FROM shop_order WHERE order_code LIKE '#BENCH-%%'")
+        order_ids = dict(cursor.fetchall())
+        cursor.executemany(
+            "INSERT INTO shop_orderitem (order_id, product_id, product_name, price, quantity)"
+            " VALUES (%s, %s, %s, %s, %s)",
+            [
+                (order_ids[row[1]], product_id, title, price, quantity)
+                for row, picked in zip(order_rows, item_rows)
+                for product_id, title, price, quantity in picked
+            ],
+        )
+    copurchase.rebuild(workers=0)
+
+    with_carts = accounts[:carts]
+    return {
+        "category_ids": category_ids,
+        "product_ids": [product_id for product_id, _, _ in catalog],
+        "shopper": with_carts[0] if with_carts else None,
+        "buyers": with_carts[1:],
+    }
+
+
+def login_cookie(user):
+    """``Cookie`` header value of a fresh logged-in session for ``user``."""
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--subcategories", type=int, default=5, help="per category")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--carts", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--db", help="database file (default: a new scratch file)")
+    args = parser.parse_args()
+
+    db_path = setup(args.db)
+    started = time.perf_counter()
+    generate(args.categories, args.subcategories, args.products, args.users, args.carts, args.orders)
+    print(f"generated in {time.perf_counter() - started:.1f}s: {db_path}")
+
+
+if __name__ == "__main__":
+    main()
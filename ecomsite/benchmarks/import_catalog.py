@@ -0,0 +1,71 @@
+"""
+Catalog import throughput.
+
+Writes a synthetic CSV (categories, subcategories and products with
+unique SKUs) and times ``manage.py import_catalog`` on a scratch database,
+then imports it again to time the update path.
+
+    python -m benchmarks.import_catalog --rows 1000000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from . import make_vocabulary, setup
+
+
+def write_csv(path, rows, seed=1):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    categories = [f"Category {n}" for n in range(20)]
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["category", "subcategory", "sku", "title", "price", "discount", "description", "image_url"])
+        for n in range(rows):
+            writer.writerow([
+                rng.choice(categories),
+                f"Sub {rng.randrange(10)}",
+                f"SKU-{n:08d}",
+                " ".join(rng.choices(vocabulary, k=3)).title(),
+                round(rng.uniform(1, 500), 2),
+                0,
+                " ".join(rng.choices(vocabulary, k=20)),
+                "",
+            ])
+
+
+def run(rows, batch_size, chunk_size):
+    setup()
+
+    from django.core.management import call_command
+
+    from shop.models import Products
+
+    path = os.path.join(tempfile.mkdtemp(prefix="shop-import-"), "catalog.csv")
+    started = time.perf_counter()
+    write_csv(path, rows)
+    print(f"wrote {rows:,} rows ({os.path.getsize(path) / 1e6:.0f} MB) in {time.perf_counter() - started:.1f}s")
+
+    for label in ("insert", "update"):
+        started = time.perf_counter()
+        call_command("import_catalog", path, batch_size=batch_size, chunk_size=chunk_size, verbosity=0,
+                     stdout=open(os.devnull, "w"))
+        elapsed = time.perf_counter() - started
+        print(f"{label:7} {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    assert Products.objects.count() == rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+    run(args.rows, args.batch_size, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
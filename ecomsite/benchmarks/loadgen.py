@@ -0,0 +1,123 @@
+"""
+Minimal HTTP/1.1 load generator (asyncio, keep-alive, no dependencies).
+
+Opens ``connections`` sockets to a running server and has each one issue
+GET requests back to back for ``duration`` seconds, cycling through
+``paths``. Reports throughput, latency percentiles and errors.
+
+    python -m benchmarks.loadgen http://127.0.0.1:8000 / /1/ --connections 500
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(samples, fraction):
+    """``samples`` must be sorted."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    chunked = False
+    close = False
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding" and b"chunked" in value.lower():
+            chunked = True
+        elif name == b"connection" and value.strip().lower() == b"close":
+            close = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return status, close
+
+
+async def _worker(host, port, paths, deadline, latencies, errors, cookie):
+    requests = itertools.cycle(
+        (
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+            + (f"Cookie: {cookie}\r\n" if cookie else "")
+            + "\r\n"
+        ).encode()
+        for path in paths
+    )
+    writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(next(requests))
+            status, close = await _read_response(reader)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors[f"HTTP {status}"] = errors.get(f"HTTP {status}", 0) + 1
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+            errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def _run(url, paths, connections, duration, cookie):
+    parts = urlsplit(url)
+    latencies, errors = [], {}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _worker(parts.hostname, parts.port or 80, paths, deadline, latencies, errors, cookie)
+        for _ in range(connections)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "connections": connections,
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "errors": errors,
+    }
+
+
+def run(url, paths, connections=500, duration=20.0, cookie=None):
+    """Load ``url`` and return a stats dict (latencies in milliseconds)."""
+    return asyncio.run(_run(url, paths, connections, duration, cookie))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("url")
+    parser.add_argument("paths", nargs="*", default=["/"])
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--cookie")
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.paths, args.connections, args.duration, args.cookie), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Order code allocation: legacy random-code probe loop vs. the block/Feistel
+allocator, measured as full ``Order`` inserts per second on top of an
+existing order table.
+
+    python -m benchmarks.order_codes --sizes 1000000 10000000 50000000
+
+Existing orders carry the codes the allocator itself would have issued for
+sequence numbers 0..N-1, so the table is as full as it would be in
+production. Expect large sizes to take a while to seed (50M rows is a few
+GB of SQLite).
+"""
+import argparse
+import random
+import time
+
+from . import setup
+
+
+def legacy_code(Order, chars, probes):
+    while True:
+        probes[0] += 1
+        code = "#ORD-" + "".join(random.choices(chars, k=5))
+        if not Order.objects.filter(order_code=code).exists():
+            return code
+
+
+def seed_orders(user, stop, batch_size=50_000):
+    """Top the table up with allocator codes for sequence numbers below ``stop``."""
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from shop import order_codes
+
+    permutation = order_codes.get_allocator().permutation
+    now = timezone.now().isoformat()
+    sql = (
+        # OR IGNORE: a random legacy code may already sit on one of these.
+        "INSERT OR IGNORE INTO shop_order (user_id, order_code, status, total, created_at) "
+        "VALUES (%s, %s, 'delivered', 10.0, %s)"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Start after every block the allocator has already handed out.
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'shop_ordercodeblock'")
+        row = cursor.fetchone()
+        start = row[0] * order_codes.BLOCK_SIZE if row else 0
+
+        for low in range(start, stop, batch_size):
+            cursor.executemany(sql, [
+                (user.pk, order_codes.encode(permutation.permute(n)), now)
+                for n in range(low, min(stop, low + batch_size))
+            ])
+        # Make the allocator's next block start after the seeded range.
+        blocks = -(-stop // order_codes.BLOCK_SIZE)
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'shop_ordercodeblock'")
+        cursor.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES ('shop_ordercodeblock', %s)",
+            [blocks],
+        )
+    order_codes.get_allocator().discard_block()
+
+
+def run(sizes, count):
+    setup()
+
+    from django.contrib.auth.models import User
+
+    from shop import order_codes
+    from shop.models import Order
+
+    user = User.objects.create_user("bench")
+    chars = order_codes.ALPHABET
+
+    print(f"{'existing':>12}{'fill':>8}{'legacy/s':>12}{'probes':>9}{'allocator/s':>14}")
+    for size in sizes:
+        started = time.perf_counter()
+        seed_orders(user, size)
+        seed_time = time.perf_counter() - started
+
+        probes = [0]
+        started = time.perf_counter()
+        for _ in range(count):
+            Order.objects.create(user=user, total=1, order_code=legacy_code(Order, chars, probes))
+        legacy_rate = count / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for _ in range(count):
+            Order.objects.create(user=user, total=1)
+        allocator_rate = count / (time.perf_counter() - started)
+
+        fill = size / order_codes.CODE_SPACE
+        print(
+            f"{size:>12,}{fill:>8.1%}{legacy_rate:>12,.0f}{probes[0] / count:>9.2f}"
+            f"{allocator_rate:>14,.0f}   (seeded in {seed_time:.0f}s)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument("--count", type=int, default=2000, help="orders timed per size")
+    args = parser.parse_args()
+    run(sorted(args.sizes), args.count)
+
+
+if __name__ == "__main__":
+    main()
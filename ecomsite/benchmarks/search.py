@@ -0,0 +1,64 @@
+"""
+Search latency: FTS5 index vs. the old ``title__icontains`` scan.
+
+    python -m benchmarks.search --sizes 100000 1000000
+"""
+import argparse
+
+from . import insert_products, measure, setup
+
+
+def run(sizes, repeat):
+    setup()
+
+    from django.core.paginator import Paginator
+    from django.db import connection
+
+    from shop import search
+    from shop.models import Products
+
+    def first_page(queryset):
+        page = Paginator(queryset, 10).get_page(1)
+        return list(page.object_list), page.paginator.count
+
+    loaded = 0
+    for size in sizes:
+        vocabulary = insert_products(size - loaded, seed=size)
+        loaded = size
+        indexed = search.rebuild_index()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        word = vocabulary[len(vocabulary) // 2]
+        queries = {
+            "word": word,
+            "prefix": word[:4],
+            "two words": f"{vocabulary[10]} {vocabulary[20]}",
+            "typo": word[:-2] + word[-1] + word[-2],
+        }
+
+        print(f"\n{size:,} products ({indexed:,} indexed, fts5={search.fts5_available()})")
+        print(f"{'query':<12}{'backend':<10}{'p50 ms':>10}{'p95 ms':>10}{'hits':>10}")
+        for label, query in queries.items():
+            fts = Products.objects.all()
+            legacy = Products.objects.filter(title__icontains=query).order_by("-id")
+
+            fts_stats = measure(lambda: first_page(search.search_products(fts, query)), repeat)
+            legacy_stats = measure(lambda: first_page(legacy), repeat)
+
+            fts_hits = first_page(search.search_products(fts, query))[1]
+            legacy_hits = first_page(legacy)[1]
+            print(f"{label:<12}{'fts5':<10}{fts_stats['p50']:>10.2f}{fts_stats['p95']:>10.2f}{fts_hits:>10}")
+            print(f"{'':<12}{'icontains':<10}{legacy_stats['p50']:>10.2f}{legacy_stats['p95']:>10.2f}{legacy_hits:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    run(sorted(args.sizes), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+DB queries per request: stock sessions/auth/messages vs the "fast" profile.
+
+Runs the same logged-in clicks under both SHOP_SESSION_PROFILE setups
+(see settings.py) and counts queries per step, split into session/auth
+queries and the rest. Steps that redirect are followed, as a browser
+would, so the flash message is shown and consumed.
+
+    python -m benchmarks.sessions --repeat 50
+"""
+import argparse
+import statistics
+import time
+
+from . import setup
+
+
+PROFILES = {
+    "db": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+        "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+        "MESSAGE_STORAGE": "django.contrib.messages.storage.fallback.FallbackStorage",
+    },
+    "fast": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+        "AUTHENTICATION_BACKENDS": ["shop.auth_cache.CachedModelBackend"],
+        "MESSAGE_STORAGE": "django.contrib.messages.storage.cookie.CookieStorage",
+    },
+}
+
+
+def steps(data):
+    product = data["product_ids"][0]
+    return [
+        ("GET /", "get", "/", {}),
+        ("GET /<id>/", "get", f"/{product}/", {}),
+        ("GET /cart/", "get", "/cart/", {}),
+        ("add to cart -> /cart/", "get", f"/add-to-cart/{product}/", {"HTTP_REFERER": "/cart/"}),
+        ("toggle wishlist -> /", "get", f"/wishlist/toggle/{product}/", {"HTTP_REFERER": "/"}),
+    ]
+
+
+def run_profile(profile, data, repeat):
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+
+    results = {}
+    with override_settings(**PROFILES[profile]):
+        client = Client()
+        client.force_login(data["shopper"])
+        for label, method, path, headers in steps(data):
+            getattr(client, method)(path, follow=True, **headers)   # warm caches
+            latencies, queries, overhead = [], 0, 0
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    getattr(client, method)(path, follow=True, **headers)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                queries += len(captured)
+                overhead += sum(
+                    1 for query in captured
+                    if '"django_session"' in query["sql"] or 'FROM "auth_user"' in query["sql"]
+                )
+            results[label] = {
+                "queries": queries / repeat,
+                "session_auth": overhead / repeat,
+                "p50": statistics.median(latencies),
+            }
+    return results
+
+
+def run(repeat):
+    setup()
+
+    from django.test.utils import setup_test_environment
+
+    from .dataset import generate
+
+    setup_test_environment(debug=False)
+    data = generate(products=2000, users=10, carts=1, orders=200)
+    results = {profile: run_profile(profile, data, repeat) for profile in PROFILES}
+
+    print(f"{'step':24}{'db: queries':>13}{'(sess/auth)':>13}{'ms':>7}{'fast: queries':>15}{'(sess/auth)':>13}{'ms':>7}")
+    for label in results["db"]:
+        before, after = results["db"][label], results["fast"][label]
+        print(
+            f"{label:24}{before['queries']:>13.1f}{before['session_auth']:>13.1f}{before['p50']:>7.1f}"
+            f"{after['queries']:>15.1f}{after['session_auth']:>13.1f}{after['p50']:>7.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+SQLite under write contention: stock settings vs the tuned profile.
+
+Several processes share one database file. Each runs the shop's own
+read and write paths in a loop for ``--duration`` seconds: listing reads
+plus cart writes (``add_product``), and a checkout every few writes.
+Lock errors are counted, not retried. The run is repeated with
+SHOP_SQLITE_TUNED=0 (rollback journal, deferred transactions) and
+SHOP_SQLITE_TUNED=1 (WAL, BEGIN IMMEDIATE, ...; see settings.py).
+
+    python -m benchmarks.sqlite_contention --processes 8 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+
+def worker(db_path, tuned, user_id, duration, write_ratio, results):
+    os.environ["SHOP_DB_PATH"] = db_path
+    os.environ["SHOP_SQLITE_TUNED"] = "1" if tuned else "0"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ecomsite.settings")
+
+    import django
+
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.db import OperationalError
+
+    from shop.cart import add_product
+    from shop.checkout import place_order_from_cart
+    from shop.models import Products
+
+    rng = random.Random(user_id)
+    user = User.objects.get(pk=user_id)
+    products = list(Products.objects.all()[:100])
+    reads = writes = locked = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        try:
+            if rng.random() < write_ratio:
+                add_product(user, rng.choice(products))
+                if rng.random() < 0.2:
+                    place_order_from_cart(user)
+                writes += 1
+            else:
+                list(Products.objects.order_by("-created_at", "-id")[:10])
+                user.cart.items.count()
+                reads += 1
+        except OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            locked += 1
+    results.put((reads, writes, locked))
+
+
+def prepare(processes):
+    """Scratch database with a catalog and one writer (with a cart) per process."""
+    from . import insert_products, setup
+
+    db_path = setup(os.path.join(tempfile.mkdtemp(prefix="shop-contention-"), "contention.sqlite3"))
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+
+    from shop.cart import add_product
+    from shop.models import Products
+
+    insert_products(500)
+    User.objects.bulk_create([User(username=f"writer{n}") for n in range(processes)])
+    writers = list(User.objects.filter(username__startswith="writer"))
+    product = Products.objects.first()
+    for user in writers:
+        add_product(user, product)
+    connection.close()
+    return db_path, [user.pk for user in writers]
+
+
+def run(db_path, users, tuned, duration, write_ratio):
+    """Returns reads/s, writes/s and the number of lock errors."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(db_path, tuned, user_id, duration, write_ratio, results))
+        for user_id in users
+    ]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    reads, writes, locked = (sum(column) for column in zip(*totals))
+    return {"reads": reads / duration, "writes": writes / duration, "lock_errors": locked}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    # Seed in stock (rollback journal) mode; the tuned run switches the
+    # file to WAL, which persists.
+    os.environ["SHOP_SQLITE_TUNED"] = "0"
+    db_path, users = prepare(args.processes)
+
+    print(f"{args.processes} processes, {args.duration:.0f}s, {args.write_ratio:.0%} writes")
+    print(f"{'profile':10}{'reads/s':>10}{'writes/s':>10}{'lock errors':>13}")
+    for label, tuned in (("stock", False), ("tuned", True)):
+        if tuned:
+            # As `manage.py migrate` does on deploy (shop/apps.py).
+            with closing(sqlite3.connect(db_path)) as db:
+                db.execute("PRAGMA journal_mode=WAL")
+        stats = run(db_path, users, tuned, args.duration, args.write_ratio)
+        print(f"{label:10}{stats['reads']:>10,.0f}{stats['writes']:>10,.0f}{stats['lock_errors']:>13,}")
+
+
+if __name__ == "__main__":
+    main()
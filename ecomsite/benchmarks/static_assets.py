@@ -0,0 +1,95 @@
+"""
+Per-page static byte report.
+
+Builds the static files (collectstatic with shop.staticfiles) into a
+scratch STATIC_ROOT, renders the main pages, and for every local
+stylesheet/script a page references compares the source bytes with what
+is actually sent: minified, and minified + gzip/brotli. Because built
+names are content-hashed and served immutable, a repeat visit sends none
+of them.
+
+    python -m benchmarks.static_assets
+"""
+import argparse
+import os
+import re
+import tempfile
+
+from . import setup
+
+
+ASSET = re.compile(r"""(?:href|src)=["']([^"']+\.(?:css|js))["']""")
+
+
+def seed():
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+
+    from shop.cart import add_product
+    from shop.checkout import place_order_from_cart
+    from shop.models import Products
+
+    product = Products.objects.create(title="Desk Lamp", price=25, description="Warm light")
+    user = User.objects.create_user("static", password="static")
+    add_product(user, product)
+    order = place_order_from_cart(user)
+    add_product(user, product)
+    return user, {
+        "index": "/",
+        "details": f"/{product.pk}/",
+        "cart": "/cart/",
+        "profile": "/profile/",
+        "order success": reverse("order_success", args=[order.order_code]),
+    }
+
+
+def sent_size(path):
+    sizes = [os.path.getsize(path)]
+    sizes += [os.path.getsize(path + ext) for ext in (".br", ".gz") if os.path.exists(path + ext)]
+    return min(sizes)
+
+
+def run():
+    setup()
+
+    from django.conf import settings
+    from django.contrib.staticfiles import finders
+    from django.core.management import call_command
+    from django.test import Client, override_settings
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    user, pages = seed()
+    client = Client()
+    client.force_login(user)
+
+    static_root = tempfile.mkdtemp(prefix="shop-static-")
+    with override_settings(STATIC_ROOT=static_root, DEBUG=False):
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+        static_url = "/" + settings.STATIC_URL.lstrip("/")
+        print(f"{'page':15}{'html':>8}{'assets':>8}{'source':>10}{'minified':>10}{'sent':>9}{'saved':>8}")
+        for name, url in pages.items():
+            html = client.get(url).content.decode()
+            source = minified = sent = count = 0
+            for asset in ASSET.findall(html):
+                if not asset.startswith(static_url):
+                    continue
+                built = os.path.join(static_root, asset[len(static_url):])
+                original = re.sub(r"\.[0-9a-f]{12}(\.\w+)$", r"\1", built)
+                source += os.path.getsize(finders.find(os.path.relpath(original, static_root)))
+                minified += os.path.getsize(built)
+                sent += sent_size(built)
+                count += 1
+            saved = 1 - sent / source if source else 0
+            print(f"{name:15}{len(html):>8,}{count:>8}{source:>10,}{minified:>10,}{sent:>9,}{saved:>8.0%}")
+        print("Repeat visits: 0 bytes of static assets (hashed names, Cache-Control: immutable).")
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__).parse_args()
+    run()
+
+
+if __name__ == "__main__":
+    main()
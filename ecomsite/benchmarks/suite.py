@@ -0,0 +1,283 @@
+"""
+Page benchmark suite: latency, queries per request and throughput.
+
+Generates a synthetic shop (benchmarks/dataset.py) in a scratch database
+and runs every scenario — ``/``, a category listing, ``/<id>/``,
+``/cart/`` and ``/place-order/`` — through one or both drivers:
+
+* ``client``: in-process ``django.test.Client``, one request at a time.
+  Measures the Django stack alone.
+* ``http``: a real server (gunicorn or uvicorn, as in
+  benchmarks/asgi_vs_wsgi.py) loaded over keep-alive connections by
+  benchmarks/loadgen.py. GET scenarios only.
+
+Queries per request come from shop/metrics.py either way: its in-process
+registry for ``client``, and ``/metrics`` scraped before and after each
+scenario for ``http``.
+
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --output current.json --compare baseline.json
+
+With ``--compare``, a scenario whose p95 latency rises or throughput
+drops by more than ``--threshold``, or whose queries per request grow at
+all, is reported as a regression and the exit status is 1. Compare runs
+made on the same machine with the same options.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.request import Request, urlopen
+
+from . import loadgen, setup
+from .asgi_vs_wsgi import SERVERS, wait_for_port
+from .dataset import generate, login_cookie
+
+
+def scenarios(data, seed=1):
+    """name -> view name, method, paths to cycle through, logged in or not."""
+    rng = random.Random(seed)
+    products = rng.sample(data["product_ids"], min(200, len(data["product_ids"])))
+    return {
+        "index": {"view": "index", "method": "GET", "paths": ["/"], "login": False},
+        "category": {
+            "view": "index", "method": "GET", "login": False,
+            "paths": [f"/?category={pk}" for pk in data["category_ids"]],
+        },
+        "details": {"view": "details", "method": "GET", "paths": [f"/{pk}/" for pk in products], "login": False},
+        "cart": {"view": "cart", "method": "GET", "paths": ["/cart/"], "login": True},
+        "place_order": {"view": "place_order", "method": "POST", "paths": ["/place-order/"], "login": True},
+    }
+
+
+def summarize(latencies, elapsed, queries_per_request, errors):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": loadgen.percentile(latencies, 0.50),
+        "p95": loadgen.percentile(latencies, 0.95),
+        "p99": loadgen.percentile(latencies, 0.99),
+        "queries_per_request": queries_per_request,
+        "errors": errors,
+    }
+
+
+# ==========================
+# DRIVERS
+# ==========================
+def run_client(scenario, data, requests, warmup):
+    from django.test import Client
+
+    from shop import metrics
+
+    if scenario["method"] == "POST":
+        # Each checkout empties a cart, so every request is another buyer.
+        calls = []
+        for user in data["buyers"][:requests]:
+            client = Client()
+            client.force_login(user)
+            calls.append((client, scenario["paths"][0]))
+        warmup = 0
+    else:
+        client = Client()
+        if scenario["login"]:
+            client.force_login(data["shopper"])
+        calls = [(client, path) for path in itertools.islice(itertools.cycle(scenario["paths"]), warmup + requests)]
+
+    def fetch(client, path):
+        return client.post(path) if scenario["method"] == "POST" else client.get(path)
+
+    for client, path in calls[:warmup]:
+        fetch(client, path)
+
+    metrics.registry.reset()
+    latencies, errors = [], {}
+    started = time.perf_counter()
+    for client, path in calls[warmup:]:
+        begun = time.perf_counter()
+        status = fetch(client, path).status_code
+        latencies.append((time.perf_counter() - begun) * 1000)
+        if status >= 400:
+            errors[f"HTTP {status}"] = errors.get(f"HTTP {status}", 0) + 1
+    elapsed = time.perf_counter() - started
+
+    totals = metrics.registry.snapshot().get(scenario["view"])
+    served = sum(totals["requests"].values()) if totals else 0
+    return summarize(latencies, elapsed, totals["queries"] / served if served else 0.0, errors)
+
+
+def scrape(url, view, token):
+    """(requests, queries) so far for ``view``, summed over all workers."""
+    requests = queries = 0.0
+    with urlopen(Request(f"{url}/metrics", headers={"Authorization": f"Bearer {token}"})) as response:
+        for line in response.read().decode().splitlines():
+            if f'view="{view}"' not in line:
+                continue
+            name, value = line.rsplit(" ", 1)
+            if name.startswith("shop_http_requests_total{"):
+                requests += float(value)
+            elif name.startswith("shop_db_queries_total{"):
+                queries += float(value)
+    return requests, queries
+
+
+def run_http(selected, data, db_path, args):
+    token = secrets.token_urlsafe(16)
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE="ecomsite.settings",
+        SHOP_DB_PATH=db_path,
+        SHOP_METRICS_DIR=tempfile.mkdtemp(prefix="shop-metrics-"),
+        SHOP_METRICS_TOKEN=token,
+    )
+    server = subprocess.Popen(SERVERS[args.server](args.port, args.workers, args.threads), env=env)
+    url = f"http://127.0.0.1:{args.port}"
+    cookie = login_cookie(data["shopper"])
+    results = {}
+    try:
+        wait_for_port(args.port)
+        for name, scenario in selected.items():
+            if scenario["method"] != "GET":
+                continue
+            session = cookie if scenario["login"] else None
+            loadgen.run(url, scenario["paths"], args.connections, min(args.duration, 2.0), session)
+            before = scrape(url, scenario["view"], token)
+            stats = loadgen.run(url, scenario["paths"], args.connections, args.duration, session)
+            time.sleep(1.5)   # let every worker flush its metrics snapshot
+            after = scrape(url, scenario["view"], token)
+            served = after[0] - before[0]
+            stats["queries_per_request"] = (after[1] - before[1]) / served if served else 0.0
+            stats.pop("connections")
+            results[name] = stats
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return results
+
+
+# ==========================
+# COMPARISON
+# ==========================
+def compare(baseline, current, threshold=0.20):
+    """Human-readable regressions of ``current`` against ``baseline``."""
+    regressions = []
+    for key, new in current["results"].items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        if old["p95"] and new["p95"] > old["p95"] * (1 + threshold):
+            regressions.append(f"{key}: p95 {old['p95']:.1f} -> {new['p95']:.1f} ms")
+        if new["throughput"] < old["throughput"] * (1 - threshold):
+            regressions.append(f"{key}: throughput {old['throughput']:.0f} -> {new['throughput']:.0f} req/s")
+        if new["queries_per_request"] > old["queries_per_request"] + 0.05:
+            regressions.append(
+                f"{key}: queries/request {old['queries_per_request']:.2f} -> {new['queries_per_request']:.2f}"
+            )
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ==========================
+# MAIN
+# ==========================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--scenarios", nargs="+", choices=["index", "category", "details", "cart", "place_order"])
+    parser.add_argument("--drivers", nargs="+", choices=["client", "http"], default=["client"])
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per client scenario")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--server", choices=sorted(SERVERS), default="wsgi")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per http scenario")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.20)
+    args = parser.parse_args()
+
+    db_path = setup()
+
+    import django
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment(debug=False)
+    started = time.perf_counter()
+    data = generate(
+        categories=args.categories, products=args.products, users=args.users,
+        carts=args.requests + 1, orders=args.orders,
+    )
+    print(f"dataset ready in {time.perf_counter() - started:.1f}s")
+
+    selected = scenarios(data)
+    if args.scenarios:
+        selected = {name: selected[name] for name in args.scenarios}
+
+    results = {}
+    if "client" in args.drivers:
+        for name, scenario in selected.items():
+            results[f"client/{name}"] = run_client(scenario, data, args.requests, args.warmup)
+    if "http" in args.drivers:
+        for name, stats in run_http(selected, data, db_path, args).items():
+            results[f"http/{name}"] = stats
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "dataset": {
+                "products": args.products, "categories": args.categories,
+                "users": args.users, "orders": args.orders,
+            },
+            "options": {key: getattr(args, key) for key in ("requests", "warmup", "server", "workers",
+                                                             "threads", "connections", "duration")},
+        },
+        "results": results,
+    }
+
+    print(f"{'scenario':22}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}  errors")
+    for key, stats in results.items():
+        print(
+            f"{key:22}{stats['throughput']:>9,.0f}{stats['p50']:>9.1f}{stats['p95']:>9.1f}"
+            f"{stats['p99']:>9.1f}{stats['queries_per_request']:>9.2f}  {stats['errors'] or '-'}"
+        )
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(json.load(handle), report, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@ ASGI config for ecomsite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The read-heavy shop views (index, details, profile) are async and run
+natively here, e.g. ``uvicorn ecomsite.asgi:application --workers 4``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.metrics.MetricsMiddleware',
+    'shop.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +68,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'shop.context_processors.category_tree',
+                'shop.context_processors.cart_count',
             ],
         },
     },
@@ -77,10 +84,137 @@ WSGI_APPLICATION = 'ecomsite.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # SHOP_DB_PATH lets benchmark servers run against a scratch copy.
+        'NAME': os.environ.get('SHOP_DB_PATH', BASE_DIR / 'db.sqlite3'),
+    }
+}
+
+# SQLite tuned for concurrent workers. WAL lets readers run alongside the
+# single writer; the mode is stored in the database file, so `manage.py
+# migrate` switches it once (shop/apps.py) instead of every connection
+# rewriting the file, even for read-only commands. The pragmas below are
+# per connection: synchronous=NORMAL is durable across crashes of the app
+# (not of the OS) in WAL mode, and BEGIN IMMEDIATE takes the write lock up
+# front so that two transactions never deadlock upgrading a read lock,
+# which SQLite reports as "database is locked" without waiting.
+# busy_timeout is in milliseconds, mmap_size in bytes, and a negative
+# cache_size in KiB per connection.
+# SHOP_SQLITE_TUNED=0 keeps SQLite's defaults (benchmarks/sqlite_contention.py).
+SHOP_SQLITE_TUNED = os.environ.get('SHOP_SQLITE_TUNED', '1') == '1'
+
+SHOP_SQLITE_JOURNAL_MODE = 'WAL'
+
+SHOP_SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -16000,
+}
+
+SHOP_SQLITE_TRANSACTION_MODE = 'IMMEDIATE'
+
+if SHOP_SQLITE_TUNED:
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SHOP_SQLITE_PRAGMAS.items()),
+        'transaction_mode': SHOP_SQLITE_TRANSACTION_MODE,
+        'timeout': SHOP_SQLITE_PRAGMAS['busy_timeout'] / 1000,
     }
+
+# Catalog read replicas (shop/routers.py): product/category reads go to a
+# replica unless the request wrote, or the user wrote within the last
+# SHOP_REPLICA_STICKY_SECONDS. SHOP_REPLICA_DB_PATHS is a comma-separated
+# list of SQLite files that `manage.py replicate_catalog` keeps in sync.
+SHOP_REPLICA_DB_PATHS = [path for path in os.environ.get('SHOP_REPLICA_DB_PATHS', '').split(',') if path]
+
+SHOP_CATALOG_REPLICAS = []
+for number, replica_path in enumerate(SHOP_REPLICA_DB_PATHS, 1):
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], NAME=replica_path, TEST={'MIRROR': 'default'},
+    )
+    SHOP_CATALOG_REPLICAS.append(f'replica{number}')
+
+SHOP_REPLICA_STICKY_SECONDS = 5
+
+DATABASE_ROUTERS = ['shop.routers.CatalogReplicaRouter']
+
+
+# Cache
+# Shared by the category tree, product-grid fragments and listing counts,
+# and home to the version counters (shop/versions.py) that invalidate them.
+# SHOP_CACHE_BACKEND picks the store: "file" (shared by all workers on one
+# host, default), "redis" (SHOP_REDIS_URL, e.g. a local redis-server) or
+# "locmem" (per process). With locmem a change made by another worker or a
+# management command never reaches a process's cached pages, so it only
+# suits a single process, e.g. runserver.
+
+SHOP_CACHE_BACKEND = os.environ.get('SHOP_CACHE_BACKEND', 'file')
+
+SHOP_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shop',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+        # Room for every grid page, count and session before culling;
+        # culling a version counter only reseeds it (a spurious bump).
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('SHOP_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
 }
 
+CACHES = {
+    'default': SHOP_CACHE_BACKENDS[SHOP_CACHE_BACKEND],
+}
+
+# Sessions, the logged-in user and flash messages. The "fast" profile
+# keeps sessions in the cache (written through to the DB), caches the User
+# row per user (shop/auth_cache.py) and carries flash messages in a cookie,
+# so a typical request does no session or auth queries. "db" is Django's
+# stock setup.
+#
+# "fast" needs a cache every worker shares (file or redis): with locmem a
+# logout, password change or deactivation would only reach the worker that
+# handled it. It is the default with a shared cache and refused with
+# locmem. With one worker, SHOP_SESSION_ENGINE=cache drops the session's
+# DB write as well.
+SHOP_SESSION_PROFILE = os.environ.get(
+    'SHOP_SESSION_PROFILE', 'db' if SHOP_CACHE_BACKEND == 'locmem' else 'fast'
+)
+
+if SHOP_SESSION_PROFILE == 'fast':
+    if SHOP_CACHE_BACKEND == 'locmem':
+        raise ImproperlyConfigured(
+            'SHOP_SESSION_PROFILE=fast needs a shared SHOP_CACHE_BACKEND (file or redis), not locmem.'
+        )
+    SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('SHOP_SESSION_ENGINE', 'cached_db')
+    # ModelBackend stays listed so sessions created before the switch
+    # (which name it as their backend) stay logged in.
+    AUTHENTICATION_BACKENDS = [
+        'shop.auth_cache.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ]
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+SHOP_USER_CACHE_TIMEOUT = 300
+
+# Conditional GET on the catalog pages (shop/conditional.py). Set
+# SHOP_RELEASE to a new value on every deploy so browsers and proxies drop
+# pages rendered by the old templates.
+SHOP_RELEASE = os.environ.get('SHOP_RELEASE', '')
+SHOP_PAGE_SHARED_MAX_AGE = 60
+
+# Seconds a rendered product-grid page stays cached (it is also dropped as
+# soon as any product changes).
+SHOP_FRAGMENT_CACHE_TIMEOUT = 600
+
+# Orders per page of the profile's order history (shop/order_history.py).
+SHOP_ORDER_HISTORY_PER_PAGE = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +255,53 @@ STATICFILES_DIRS = [
     BASE_DIR / "shop" / "static",
 ]
 
+# `manage.py collectstatic` builds hashed, minified, precompressed copies
+# here (shop/staticfiles.py). SHOP_SERVE_STATIC lets Django serve them with
+# far-future cache headers when no front-end server does.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'shop.staticfiles.ShopStaticFilesStorage',
+    },
+}
+
+SHOP_SERVE_STATIC = os.environ.get('SHOP_SERVE_STATIC', '1') == '1'
+
+# Uploaded product images and their generated variants (shop/images.py)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Processes used to render image variants; 0 renders inline (tests).
+SHOP_IMAGE_WORKERS = int(os.environ.get('SHOP_IMAGE_WORKERS', os.cpu_count() or 1))
+
+# Downloads of external image_url pictures (shop/remote_images.py)
+SHOP_IMAGE_FETCH_CONCURRENCY = 4
+SHOP_IMAGE_FETCH_TIMEOUT = 10
+SHOP_IMAGE_FETCH_MAX_BYTES = 20 * 1024 * 1024
+
+# "Frequently bought together" (shop/copurchase.py): pairs shown on a
+# product page, pairs kept per product between full rebuilds, and orders
+# with more distinct products than this are left out (bulk buys).
+SHOP_COPURCHASE_SHOWN = 4
+SHOP_COPURCHASE_KEEP = 20
+SHOP_COPURCHASE_MAX_BASKET = 50
+
+# Per-view latency/SQL metrics served at /metrics (shop/metrics.py). With
+# several worker processes, point SHOP_METRICS_DIR at a directory they
+# share (emptied on deploy) so /metrics reports all of them.
+SHOP_METRICS_DIR = os.environ.get('SHOP_METRICS_DIR') or None
+SHOP_METRICS_FLUSH_INTERVAL = 1.0
+# /metrics is for staff users and scrapers sending "Authorization: Bearer
+# <SHOP_METRICS_TOKEN>". SHOP_METRICS_ALLOWED_IPS (comma-separated) opts
+# addresses in as well; leave it empty behind a reverse proxy, where every
+# request arrives from the proxy's address.
+SHOP_METRICS_TOKEN = os.environ.get('SHOP_METRICS_TOKEN', '')
+SHOP_METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('SHOP_METRICS_ALLOWED_IPS', '').split(',') if ip]
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
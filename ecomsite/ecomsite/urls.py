@@ -1,9 +1,11 @@
 """
 URL configuration for ecomsite project.
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
-from shop import views
+from django.urls import path, include, re_path
+from shop import metrics, staticfiles, views
 
 
 urlpatterns = [
@@ -31,6 +33,8 @@ urlpatterns = [
 
     path('track-order/', views.track_order, name='track_order'),
 
+    path('orders/<str:order_code>/items/', views.order_items, name='order_items'),
+
     # legacy checkout redirect
     path('checkout/', views.checkout, name='checkout'),
 
@@ -45,4 +49,25 @@ urlpatterns = [
     path('profile/', views.profile_view, name='profile'),
     path('wishlist/toggle/<int:product_id>/', views.toggle_wishlist, name='toggle_wishlist'),
 
-]
\ No newline at end of file
+    # json api (POST, CSRF-protected) for in-place updates
+    path('api/cart/add/<int:product_id>/', views.api_cart_add, name='api_cart_add'),
+
+    path('api/cart/items/<int:item_id>/remove/', views.api_cart_remove, name='api_cart_remove'),
+
+    path('api/cart/items/<int:item_id>/quantity/', views.api_cart_set_quantity, name='api_cart_set_quantity'),
+
+    path('api/wishlist/toggle/<int:product_id>/', views.api_wishlist_toggle, name='api_wishlist_toggle'),
+
+    # prometheus scrape endpoint
+    path('metrics', metrics.metrics_view, name='metrics'),
+
+]
+
+# uploaded images (served by the front-end server in production)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+# collected static files (hashed names are served as immutable)
+if settings.SHOP_SERVE_STATIC:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), staticfiles.serve),
+    ]
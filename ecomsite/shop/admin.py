@@ -1,12 +1,42 @@
 from django.contrib import admin
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from . import order_export
+from .category_tree import get_category_tree
 from .models import Products, Category, SubCategory, Cart, CartItem, Order, OrderItem
 
 
 # Register your models here.
 
 admin.site.register(Products)
-admin.site.register(Category)
-admin.site.register(SubCategory)
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "subcategory_count", "product_count")
+
+    @admin.display(description="Subcategories")
+    def subcategory_count(self, obj):
+        node = get_category_tree().category(obj.id)
+        return len(node.subcategories) if node else 0
+
+    @admin.display(description="Products")
+    def product_count(self, obj):
+        node = get_category_tree().category(obj.id)
+        return node.product_count if node else 0
+
+
+@admin.register(SubCategory)
+class SubCategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "category", "product_count")
+    list_select_related = ("category",)
+
+    @admin.display(description="Products")
+    def product_count(self, obj):
+        node = get_category_tree().subcategory(obj.id)
+        return node.product_count if node else 0
 
 
 class CartItemInline(admin.TabularInline):
@@ -18,8 +48,14 @@ class CartItemInline(admin.TabularInline):
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ("user", "total_items", "total_price", "updated_at")
+    list_select_related = ("user",)
     inlines = [CartItemInline]
 
+    def save_related(self, request, form, formsets, change):
+        # Inline edits bypass the cart views, so refresh the stored totals.
+        super().save_related(request, form, formsets, change)
+        Cart.objects.filter(pk=form.instance.pk).recompute_totals()
+
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -27,10 +63,35 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ("product_name", "quantity", "price")
 
 
+def _export_response(request, queryset, fmt):
+    rows, arows, content_type = order_export.FORMATS[fmt]
+    # Each handler streams only its own kind of iterator; given the other,
+    # it reads the whole export into memory first.
+    if isinstance(request, ASGIRequest):
+        rows = arows
+    response = StreamingHttpResponse(rows(queryset), content_type=content_type)
+    filename = f"orders-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("order_code", "user", "total", "status", "created_at")
-    list_filter = ("status",)
+    list_filter = ("status", "created_at")
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
     search_fields = ("order_code", "user__username")
     readonly_fields = ("order_code",)
     inlines = [OrderItemInline]
+    actions = ["export_csv", "export_jsonl"]
+
+    # "Select all" + the status/date filters gives month-end exports; the
+    # response streams, so the size of the selection doesn't matter.
+    @admin.action(description="Export selected orders with items (CSV)")
+    def export_csv(self, request, queryset):
+        return _export_response(request, queryset, "csv")
+
+    @admin.action(description="Export selected orders with items (JSONL)")
+    def export_jsonl(self, request, queryset):
+        return _export_response(request, queryset, "jsonl")
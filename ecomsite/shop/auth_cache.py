@@ -0,0 +1,47 @@
+"""
+Cached ``User`` lookups for ``AuthenticationMiddleware``.
+
+Every authenticated request otherwise loads the user's row by primary
+key. ``CachedModelBackend`` keeps that row in the cache under
+``shop:user:<id>`` and ``shop.signals`` drops the entry whenever the User
+is saved or deleted, so password changes (which also log out other
+sessions), deactivation and is_staff changes take effect on the next
+request. Bulk ``QuerySet.update()`` calls skip signals; those changes
+show up within ``SHOP_USER_CACHE_TIMEOUT`` seconds.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+CACHE_KEY = "shop:user:{user_id}"
+
+
+def _key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() reads through the cache."""
+
+    def get_user(self, user_id):
+        user = cache.get(_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(_key(user_id), user, settings.SHOP_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        user = await cache.aget(_key(user_id))
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is None:
+                return None
+            await cache.aset(_key(user_id), user, settings.SHOP_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,91 @@
+"""
+Cart mutations shared by the HTML views and the JSON endpoints.
+
+Every change to a cart line also shifts the stored ``Cart.item_count`` /
+``Cart.subtotal`` with F() expressions in the same transaction. Removals
+and quantity changes take their delta from the line as stored, and only
+apply it if the line still exists, so a stale or repeated request (two
+tabs) cannot push the totals off.
+"""
+from django.db import transaction
+from django.db.models import Exists, F, FloatField, Subquery
+
+from .models import Cart, CartItem
+
+# Largest quantity a shopper can set on one line.
+MAX_QUANTITY = 999
+
+
+def summary(user):
+    """The stored aggregates for ``user``'s cart (zeros if there is none)."""
+    row = Cart.objects.filter(user=user).values("item_count", "subtotal").first()
+    return row or {"item_count": 0, "subtotal": 0.0}
+
+
+async def aitem_count(user):
+    """The stored line count of ``user``'s cart, for the header badge."""
+    row = await Cart.objects.filter(user=user).values_list("item_count", flat=True).afirst()
+    return row or 0
+
+
+def add_product(user, product):
+    """Add one ``product`` to the cart; returns the line's new quantity."""
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+
+        cart_item, created = CartItem.objects.get_or_create(
+            cart=cart,
+            product=product,
+            defaults={"price": product.price, "quantity": 1},
+        )
+
+        if created:
+            Cart.objects.filter(pk=cart.pk).adjust_totals(items=1, amount=cart_item.price)
+            return 1
+
+        CartItem.objects.filter(pk=cart_item.pk).update(quantity=F("quantity") + 1)
+        Cart.objects.filter(pk=cart.pk).adjust_totals(amount=cart_item.price)
+        return cart_item.quantity + 1
+
+
+def _line_delta(line, expression):
+    """``expression`` over the line's stored row, as a subquery."""
+    return Subquery(line.annotate(delta=expression).values("delta"), output_field=FloatField())
+
+
+def remove_item(cart_item):
+    """
+    Delete a line that has already been checked to belong to the user.
+    Returns False if it was already gone (e.g. removed from another tab).
+    """
+    line = CartItem.objects.filter(pk=cart_item.pk)
+    with transaction.atomic():
+        # The totals come off the line as stored, in the same UPDATE, and
+        # only if it is still there.
+        removed = Cart.objects.filter(pk=cart_item.cart_id).filter(Exists(line)).adjust_totals(
+            items=-1, amount=_line_delta(line, -F("price") * F("quantity")),
+        )
+        if removed:
+            line.delete()
+    return bool(removed)
+
+
+def set_quantity(cart_item, quantity):
+    """
+    Set a line's quantity; zero or less removes it. Returns False if the
+    line was already gone.
+    """
+    if quantity <= 0:
+        return remove_item(cart_item)
+
+    line = CartItem.objects.filter(pk=cart_item.pk)
+    with transaction.atomic():
+        # Delta from the stored quantity, not the one read earlier in the
+        # request, which another tab may have changed since.
+        updated = Cart.objects.filter(pk=cart_item.cart_id).filter(Exists(line)).adjust_totals(
+            amount=_line_delta(line, (quantity - F("quantity")) * F("price")),
+        )
+        if updated:
+            line.update(quantity=quantity)
+    cart_item.quantity = quantity
+    return bool(updated)
@@ -0,0 +1,239 @@
+"""
+Streaming catalog import (``manage.py import_catalog``).
+
+Rows come from CSV (with a header) or JSONL, one dict per row::
+
+    category, subcategory, sku, title, price, discount, description, image_url
+
+A row without ``sku``/``title`` only makes sure its category (and
+subcategory) exist. Product rows are upserted by ``sku``.
+
+Memory stays flat: rows are read lazily and written ``batch_size`` at a
+time with ``bulk_create(update_conflicts=True)``; category and subcategory
+names resolve through in-memory maps, so only new names cost a query.
+Every ``chunk_size`` rows are one transaction, followed by a checkpoint
+(rows done, plus the file's size and mtime), so an interrupted import
+resumes after the last committed chunk.
+
+bulk_create() skips model signals, so the importer keeps the search
+index, the category tree and the catalog version up to date itself.
+"""
+import csv
+import itertools
+import json
+import os
+import time
+
+from django.db import transaction
+
+from . import category_tree, search
+from .models import Category, Products, SubCategory
+from .versions import CATALOG, bump_version
+
+
+PRODUCT_FIELDS = [
+    "title", "price", "discount", "description", "image_url", "category", "subcategory", "updated_at",
+]
+
+
+class CatalogImportError(Exception):
+    """Raised for rows or files the importer cannot use."""
+
+
+# ==========================
+# READING
+# ==========================
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise CatalogImportError(f"Cannot tell the format of {path}; pass --format.")
+
+
+def read_rows(handle, fmt):
+    """Rows as dicts; a malformed line raises CatalogImportError naming it."""
+    if fmt == "csv":
+        # strict: a stray quote is an error rather than swallowing the
+        # rest of the file into one field.
+        reader = csv.DictReader(handle, strict=True)
+        try:
+            yield from reader
+        except (csv.Error, ValueError) as exc:   # bad quoting, oversized field, bad encoding
+            raise CatalogImportError(f"line {reader.line_num + 1}: {exc}") from exc
+        return
+    for number, line in enumerate(handle, 1):
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                raise CatalogImportError(f"line {number}: {exc}") from exc
+            yield row
+
+
+def _text(row, key):
+    value = row.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def _number(row, key, default=None):
+    value = _text(row, key)
+    if not value:
+        if default is None:
+            raise ValueError(f"missing {key}")
+        return default
+    return float(value)
+
+
+# ==========================
+# CHECKPOINTS
+# ==========================
+class Checkpoint:
+    """Rows committed so far for one particular source file."""
+
+    def __init__(self, path, source):
+        self.path = path
+        stat = os.stat(source)
+        self.fingerprint = {"source": os.path.abspath(source), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def load(self):
+        """Rows already imported (0 for a fresh start)."""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path) as handle:
+            state = json.load(handle)
+        if {key: state.get(key) for key in self.fingerprint} != self.fingerprint:
+            raise CatalogImportError(
+                f"{self.path} belongs to a different or changed file; rerun with --restart."
+            )
+        return state["rows"]
+
+    def save(self, rows):
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as handle:
+            json.dump(dict(self.fingerprint, rows=rows), handle)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ==========================
+# IMPORTER
+# ==========================
+class CatalogImporter:
+
+    def __init__(self, batch_size=5000, chunk_size=50000, progress=None):
+        self.batch_size = batch_size
+        self.chunk_size = max(chunk_size, batch_size)
+        self.progress = progress
+        self.categories = dict(Category.objects.values_list("name", "id"))
+        self.subcategories = {
+            (category_id, name): pk
+            for pk, category_id, name in SubCategory.objects.values_list("id", "category_id", "name")
+        }
+        self.rows = self.products = self.skipped = 0
+        self.errors = []
+
+    # --- name resolution -------------------------------------------------
+    def _resolve_categories(self, names):
+        missing = {name for name in names if name not in self.categories}
+        if missing:
+            Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+            self.categories.update(Category.objects.filter(name__in=missing).values_list("name", "id"))
+
+    def _resolve_subcategories(self, keys):
+        missing = {key for key in keys if key not in self.subcategories}
+        if missing:
+            SubCategory.objects.bulk_create(
+                [SubCategory(category_id=category_id, name=name) for category_id, name in missing],
+                ignore_conflicts=True,
+            )
+            for category_id, names in itertools.groupby(sorted(missing), key=lambda key: key[0]):
+                self.subcategories.update(
+                    ((category_id, name), pk)
+                    for pk, name in SubCategory.objects.filter(
+                        category_id=category_id, name__in=[name for _, name in names]
+                    ).values_list("id", "name")
+                )
+
+    # --- batches ---------------------------------------------------------
+    def _write_batch(self, batch):
+        self._resolve_categories({_text(row, "category") for _, row in batch} - {""})
+        self._resolve_subcategories({
+            (self.categories[_text(row, "category")], _text(row, "subcategory"))
+            for _, row in batch
+            if _text(row, "category") and _text(row, "subcategory")
+        })
+
+        products = {}
+        for number, row in batch:
+            sku, title = _text(row, "sku"), _text(row, "title")
+            if not sku and not title:
+                continue   # taxonomy-only row
+            try:
+                if not sku or not title:
+                    raise ValueError("product rows need both sku and title")
+                category_id = self.categories.get(_text(row, "category"))
+                subcategory = _text(row, "subcategory")
+                products[sku] = Products(   # a repeated sku: last row wins
+                    sku=sku,
+                    title=title[:200],
+                    price=_number(row, "price"),
+                    discount=_number(row, "discount", 0.0),
+                    description=_text(row, "description"),
+                    image_url=_text(row, "image_url") or None,
+                    category_id=category_id,
+                    subcategory_id=self.subcategories.get((category_id, subcategory)) if subcategory else None,
+                )
+            except ValueError as exc:
+                self.skipped += 1
+                if len(self.errors) < 20:
+                    self.errors.append(f"row {number}: {exc}")
+
+        if products:
+            saved = Products.objects.bulk_create(
+                list(products.values()),
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=PRODUCT_FIELDS,
+            )
+            search.index_products([(p.pk, p.title, p.description) for p in saved])
+            self.products += len(saved)
+
+    def run(self, rows, checkpoint=None):
+        """Import ``rows`` (an iterable of dicts); returns rows/second."""
+        done = checkpoint.load() if checkpoint else 0
+        rows = itertools.islice(rows, done, None)   # cheap skip on resume
+        number = done
+        started = time.perf_counter()
+
+        try:
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    for start in range(0, len(chunk), self.batch_size):
+                        batch = [
+                            (number + offset + 1, row)
+                            for offset, row in enumerate(chunk[start:start + self.batch_size], start)
+                        ]
+                        self._write_batch(batch)
+                number += len(chunk)
+                self.rows += len(chunk)
+                if checkpoint:
+                    checkpoint.save(number)
+                if self.progress:
+                    self.progress(number, self.rows / (time.perf_counter() - started))
+        finally:
+            if self.rows:
+                category_tree.invalidate()
+                bump_version(CATALOG)
+
+        if checkpoint:
+            checkpoint.clear()
+        elapsed = time.perf_counter() - started
+        return self.rows / elapsed if elapsed else 0.0
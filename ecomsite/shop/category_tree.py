@@ -0,0 +1,115 @@
+"""
+Cached, immutable snapshot of the Category → SubCategory taxonomy.
+
+The tree is built with two aggregate queries, stored in the shared cache
+under a version number and memoised per process. Signals in
+``shop.signals`` bump the version whenever a category, subcategory or
+product changes, so every worker picks up the new tree on its next request
+at the cost of a single cache read.
+"""
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .versions import CATEGORY_TREE, bump_version, get_version
+
+
+TREE_KEY = "shop:category_tree:{version}"
+# Superseded versions simply age out.
+TREE_TIMEOUT = 24 * 60 * 60
+
+CategoryNode = namedtuple(
+    "CategoryNode", ["id", "name", "product_count", "subcategories"]
+)
+SubCategoryNode = namedtuple(
+    "SubCategoryNode", ["id", "name", "category_id", "product_count"]
+)
+
+# (version, CategoryTree) for this process
+_local = (None, None)
+
+
+class CategoryTree:
+    """Read-only view over the taxonomy; iterate it like a list of categories."""
+
+    def __init__(self, categories, version):
+        self.categories = tuple(categories)
+        self.version = version
+        self._categories = MappingProxyType({node.id: node for node in self.categories})
+        self._subcategories = MappingProxyType({
+            sub.id: sub for node in self.categories for sub in node.subcategories
+        })
+
+    def __iter__(self):
+        return iter(self.categories)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def category(self, category_id):
+        return self._categories.get(category_id)
+
+    def subcategory(self, subcategory_id):
+        return self._subcategories.get(subcategory_id)
+
+    def __getstate__(self):
+        return {"categories": self.categories, "version": self.version}
+
+    def __setstate__(self, state):
+        self.__init__(state["categories"], state["version"])
+
+
+# ==========================
+# BUILD / LOOKUP
+# ==========================
+def build_tree(version=None):
+    """Read the taxonomy and per-node product counts from the database."""
+    from .models import Category, SubCategory
+
+    subcategories = {}
+    for sub in (
+        SubCategory.objects.annotate(product_count=Count("products"))
+        .order_by("name", "id")
+        .values("id", "name", "category_id", "product_count")
+    ):
+        subcategories.setdefault(sub["category_id"], []).append(SubCategoryNode(**sub))
+
+    categories = [
+        CategoryNode(
+            id=cat["id"],
+            name=cat["name"],
+            product_count=cat["product_count"],
+            subcategories=tuple(subcategories.get(cat["id"], ())),
+        )
+        for cat in (
+            Category.objects.annotate(product_count=Count("products"))
+            .order_by("id")
+            .values("id", "name", "product_count")
+        )
+    ]
+    return CategoryTree(categories, version)
+
+
+def get_category_tree():
+    """The current tree; usually one cache read, never more than two queries."""
+    global _local
+
+    version = get_version(CATEGORY_TREE)
+    local_version, tree = _local
+    if local_version == version:
+        return tree
+
+    key = TREE_KEY.format(version=version)
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_tree(version)
+        cache.set(key, tree, TREE_TIMEOUT)
+    _local = (version, tree)
+    return tree
+
+
+def invalidate():
+    """Bump the shared version so every process rebuilds its snapshot."""
+    bump_version(CATEGORY_TREE)
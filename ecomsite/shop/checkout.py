@@ -0,0 +1,60 @@
+"""
+Cart → Order checkout pipeline.
+
+One transaction, five statements:
+
+1. ``UPDATE shop_cart`` — claims the cart. It takes the write lock up front
+   (SQLite has no SELECT ... FOR UPDATE) and only matches while the cart
+   still has items, so a double-submit finds nothing to claim and stops.
+2. ``SELECT`` the lines with their titles, the order total riding along as
+   a window aggregate.
+3. ``INSERT`` the order (its code needs no lookups, see order_codes.py).
+4. ``INSERT`` all order items in one bulk statement.
+5. ``DELETE`` the cart items.
+
+Once the transaction commits, the order is counted into the "frequently
+bought together" index (copurchase.py).
+"""
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Sum, Window
+from django.db.models.functions import Now
+
+from . import copurchase
+from .models import Cart, CartItem, Order, OrderItem
+
+
+def place_order_from_cart(user):
+    """
+    Turn ``user``'s cart into an Order and return it.
+    Returns None when there is nothing to check out (empty cart, or a
+    concurrent request already placed the order).
+    """
+    with transaction.atomic():
+        claimed = (
+            Cart.objects.filter(user=user)
+            .filter(Exists(CartItem.objects.filter(cart=OuterRef("pk"))))
+            .update(item_count=0, subtotal=0, updated_at=Now())
+        )
+        if not claimed:
+            return None
+
+        lines = list(
+            CartItem.objects.filter(cart__user=user)
+            .annotate(
+                order_total=Window(Sum(F("price") * F("quantity"))),
+            )
+            .values_list("id", "product_id", "product__title", "price", "quantity", "order_total")
+        )
+        if not lines:
+            return None
+
+        order = Order.objects.create(user=user, total=lines[0][5])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, product_name=title, price=price, quantity=quantity)
+            for _, product_id, title, price, quantity, _ in lines
+        ])
+        CartItem.objects.filter(id__in=[line[0] for line in lines]).delete()
+        # The order stands even if the index update fails (robust).
+        transaction.on_commit(lambda: copurchase.record_order(order.id), robust=True)
+
+    return order
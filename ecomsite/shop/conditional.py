@@ -0,0 +1,74 @@
+"""
+Conditional GET for the catalog pages (``index`` and ``details``).
+
+Each view gathers the few values its page is built from, which are
+already cached or cost one primary-key query. It hashes them into an
+ETag and answers ``304 Not Modified`` before rendering when the client's
+copy is current. The hash also covers:
+
+* the viewer: the user id, cart badge count and CSRF secret for members
+  (the header and the page's CSRF token differ per user), or just
+  "anonymous";
+* ``SHOP_RELEASE``, so a deploy with new templates or static names
+  invalidates every copy.
+
+Pages carrying a one-time flash message get no validators.
+
+Cache-Control lets browsers keep member pages privately and revalidate
+them on every view (``private, no-cache``). Anonymous pages are
+identical for everyone without cookies, so a reverse proxy or CDN may
+share them for ``SHOP_PAGE_SHARED_MAX_AGE`` seconds (``s-maxage``).
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.messages.storage.session import SessionStorage
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def _has_pending_messages(request):
+    return CookieStorage.cookie_name in request.COOKIES or SessionStorage.session_key in request.session
+
+
+def page_etag(request, *parts):
+    """Quoted ETag for ``parts`` as seen by this viewer, or None if uncacheable."""
+    if request.method not in ("GET", "HEAD") or _has_pending_messages(request):
+        return None
+    if request.user.is_authenticated:
+        get_token(request)   # the secret the page's token will be made from
+        viewer = ("user", request.user.pk, request.cart_count, request.META["CSRF_COOKIE"])
+    else:
+        viewer = ("anonymous",)
+    digest = hashlib.blake2b(repr((settings.SHOP_RELEASE, viewer, parts)).encode(), digest_size=12)
+    return f'"{digest.hexdigest()}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 response if the client already has this version, else None."""
+    if etag is None:
+        return None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is None:
+        return None
+    return finish(request, response, etag, last_modified)
+
+
+def finish(request, response, etag, last_modified=None):
+    """Set the validators and Cache-Control on a page (or 304) response."""
+    patch_vary_headers(response, ["Cookie"])
+    if etag is None:
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=0, s_maxage=settings.SHOP_PAGE_SHARED_MAX_AGE)
+    return response
@@ -0,0 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import cart
+from .category_tree import get_category_tree
+
+
+def category_tree(request):
+    """Expose the cached taxonomy to every template as ``category_tree``."""
+    return {"category_tree": SimpleLazyObject(get_category_tree)}
+
+
+def cart_count(request):
+    """The header's cart badge: the member's stored ``Cart.item_count``."""
+    if not request.user.is_authenticated:
+        return {"cart_count": 0}
+    if hasattr(request, "cart_count"):   # loaded up front by async views
+        return {"cart_count": request.cart_count}
+    return {"cart_count": SimpleLazyObject(lambda: cart.summary(request.user)["item_count"])}
@@ -0,0 +1,195 @@
+"""
+"Frequently bought together" index.
+
+``CoPurchase`` holds, for each product, the ``SHOP_COPURCHASE_KEEP``
+products that most often shared an order with it, and how many orders
+that was. ``details`` shows the first ``SHOP_COPURCHASE_SHOWN`` with one
+query on ``copurchase_top_idx``; nothing is joined over the order history
+at request time.
+
+Full build (``manage.py build_copurchases``): order lines are streamed in
+order-id order and grouped into baskets of distinct product ids. Chunks
+of baskets are counted in a process pool (``count_pairs`` is plain
+Python, like ``images.render_variants``), the parent merges the counts,
+keeps the top pairs per product and swaps the table in one transaction.
+
+Incremental: ``place_order_from_cart`` calls ``record_order`` once the
+order has committed. It adds one to every pair in the new basket with an
+upsert and trims the touched products back to ``SHOP_COPURCHASE_KEEP``
+rows. A pair trimmed earlier restarts from zero, so between rebuilds the
+counts are lower bounds; keeping more pairs than are shown lets a rising
+pair climb into view, and a periodic full build makes them exact again.
+A full build records the last order it counted in ``CoPurchaseRebuild``,
+in the same transaction as the table swap, and ``record_order`` skips
+anything at or below it, so an order whose hook runs after the swap isn't
+counted twice.
+
+Orders with more than ``SHOP_COPURCHASE_MAX_BASKET`` distinct products
+(bulk buys) are left out: they would add a quadratic number of pairs
+that say little about what goes together.
+"""
+import heapq
+import itertools
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+
+from .models import CoPurchase, CoPurchaseRebuild, OrderItem
+
+
+def count_pairs(baskets):
+    """Counter of ``(a, b)`` with ``a < b`` over baskets of sorted product ids."""
+    counts = Counter()
+    for basket in baskets:
+        counts.update(itertools.combinations(basket, 2))
+    return counts
+
+
+def top_pairs(counts, keep):
+    """``[(product_id, related_id, orders)]``: the ``keep`` best pairs per product."""
+    neighbours = defaultdict(list)
+    for (a, b), orders in counts.items():
+        neighbours[a].append((orders, -b))
+        neighbours[b].append((orders, -a))
+    return [
+        (product_id, -negated, orders)
+        for product_id, candidates in neighbours.items()
+        for orders, negated in heapq.nlargest(keep, candidates)
+    ]
+
+
+def _basket(product_ids):
+    """Sorted distinct ids, or None if the order doesn't count."""
+    basket = sorted(set(product_ids))
+    if len(basket) < 2 or len(basket) > settings.SHOP_COPURCHASE_MAX_BASKET:
+        return None
+    return basket
+
+
+def _baskets(lines):
+    """Baskets from ``(order_id, product_id)`` rows sorted by order id."""
+    for _, rows in itertools.groupby(lines, key=lambda row: row[0]):
+        basket = _basket(product_id for _, product_id in rows)
+        if basket is not None:
+            yield basket
+
+
+def _order_lines(**filters):
+    return (
+        OrderItem.objects.filter(product__isnull=False, **filters)
+        .order_by("order_id")
+        .values_list("order_id", "product_id")
+    )
+
+
+# ==========================
+# INCREMENTAL UPDATES
+# ==========================
+def _increment(basket):
+    table = connection.ops.quote_name(CoPurchase._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (product_id, related_id, orders) VALUES (%s, %s, 1) "
+            f"ON CONFLICT (product_id, related_id) DO UPDATE SET orders = {table}.orders + 1",
+            [(a, b) for a in basket for b in basket if a != b],
+        )
+
+
+def _trim(product_ids):
+    """Drop all but the top SHOP_COPURCHASE_KEEP pairs of ``product_ids``."""
+    ranked = (
+        CoPurchase.objects.filter(product_id__in=product_ids)
+        .annotate(rank=Window(
+            RowNumber(), partition_by=F("product_id"), order_by=(F("orders").desc(), F("related_id").asc()),
+        ))
+        .filter(rank__gt=settings.SHOP_COPURCHASE_KEEP)
+        .values_list("id", flat=True)
+    )
+    surplus = list(ranked)
+    if surplus:
+        CoPurchase.objects.filter(id__in=surplus).delete()
+
+
+def record_order(order_id):
+    """Count a newly placed order into the index."""
+    basket = _basket(_order_lines(order_id=order_id).values_list("product_id", flat=True))
+    if basket is None:
+        return
+    with transaction.atomic():
+        # Read under the write lock: a rebuild swapping the table either
+        # finished first (and counted this order) or hasn't started.
+        if CoPurchaseRebuild.objects.filter(through_order__gte=order_id).exists():
+            return
+        _increment(basket)
+        _trim(basket)
+
+
+# ==========================
+# FULL BUILD
+# ==========================
+def rebuild(workers=1, chunk_size=5000, log=None):
+    """
+    Recount every order and replace the index. ``workers=0`` counts inline.
+    Returns ``(orders counted, pairs seen, rows stored)``.
+    """
+    started = time.perf_counter()
+    last_order = OrderItem.objects.aggregate(last=Max("order_id"))["last"] or 0
+    baskets = _baskets(_order_lines(order_id__lte=last_order).iterator(chunk_size=chunk_size * 4))
+    chunks = iter(lambda: list(itertools.islice(baskets, chunk_size)), [])
+
+    counts = Counter()
+    orders = 0
+    if workers:
+        # Bounded so the baskets aren't all held in memory at once.
+        in_flight = set()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk in chunks:
+                orders += len(chunk)
+                in_flight.add(pool.submit(count_pairs, chunk))
+                if len(in_flight) >= workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        counts.update(future.result())
+            for future in in_flight:
+                counts.update(future.result())
+    else:
+        for chunk in chunks:
+            orders += len(chunk)
+            counts.update(count_pairs(chunk))
+    if log:
+        log(f"Counted {len(counts):,} pairs in {orders:,} orders in {time.perf_counter() - started:.1f}s.")
+
+    rows = [
+        CoPurchase(product_id=product_id, related_id=related_id, orders=n)
+        for product_id, related_id, n in top_pairs(counts, settings.SHOP_COPURCHASE_KEEP)
+    ]
+    with transaction.atomic():
+        CoPurchase.objects.all().delete()
+        CoPurchase.objects.bulk_create(rows, batch_size=5000)
+        # Orders placed while counting had record_order() run against the
+        # old table; count them again into the new one. Hooks still to run
+        # for these orders see the mark and skip them.
+        through = OrderItem.objects.aggregate(last=Max("order_id"))["last"] or 0
+        late = _order_lines(order_id__gt=last_order, order_id__lte=through)
+        for basket in _baskets(late.iterator()):
+            _increment(basket)
+            _trim(basket)
+        CoPurchaseRebuild.objects.update_or_create(pk=1, defaults={"through_order": through})
+    return orders, len(counts), len(rows)
+
+
+# ==========================
+# READS
+# ==========================
+def bought_with(product_id):
+    """The products shown next to ``product_id``, most often bought with it first."""
+    return (
+        CoPurchase.objects.filter(product_id=product_id)
+        .select_related("related")
+        .order_by("-orders", "related_id")[: settings.SHOP_COPURCHASE_SHOWN]
+    )
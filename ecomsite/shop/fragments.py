@@ -0,0 +1,98 @@
+"""
+Rendered-fragment cache for the product grid on ``/``.
+
+The grid and pager HTML depend only on the filter parameters and the
+catalog, so one rendering is shared by every visitor. Keys embed the
+``catalog`` version (bumped by ``shop.signals`` whenever a product changes)
+and the normalized parameters; per-user state such as wishlist hearts is
+applied on top of the shared HTML by the page.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import QueryDict
+
+from .versions import CATALOG, aget_version, get_version
+
+
+GRID_PARAMS = ("category", "subcategory", "item_name", "page", "cursor")
+
+HITS_KEY = "shop:fragments:hits"
+MISSES_KEY = "shop:fragments:misses"
+
+
+def grid_params(query):
+    """
+    Keep only the parameters that affect the grid, in a canonical form:
+    fixed order, blanks dropped, search text lower-cased and whitespace
+    collapsed. Tracking parameters and the like cannot split the cache.
+    """
+    params = QueryDict(mutable=True)
+    for name in GRID_PARAMS:
+        value = (query.get(name) or "").strip()
+        if name == "item_name":
+            value = " ".join(value.lower().split())
+        if value:
+            params[name] = value
+    params._mutable = False
+    return params
+
+
+def grid_cache_key(params):
+    digest = hashlib.md5(params.urlencode().encode()).hexdigest()
+    return f"shop:grid:{get_version(CATALOG)}:{digest}"
+
+
+async def agrid_cache_key(params):
+    digest = hashlib.md5(params.urlencode().encode()).hexdigest()
+    return f"shop:grid:{await aget_version(CATALOG)}:{digest}"
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+async def _acount(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, None):
+            await cache.aincr(key)
+
+
+def get_fragment(key):
+    fragment = cache.get(key)
+    _count(MISSES_KEY if fragment is None else HITS_KEY)
+    return fragment
+
+
+async def aget_fragment(key):
+    fragment = await cache.aget(key)
+    await _acount(MISSES_KEY if fragment is None else HITS_KEY)
+    return fragment
+
+
+def set_fragment(key, fragment):
+    cache.set(key, fragment, getattr(settings, "SHOP_FRAGMENT_CACHE_TIMEOUT", 600))
+
+
+async def aset_fragment(key, fragment):
+    await cache.aset(key, fragment, getattr(settings, "SHOP_FRAGMENT_CACHE_TIMEOUT", 600))
+
+
+def stats():
+    """Hit/miss totals since the cache was last cleared."""
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counts.get(HITS_KEY, 0)
+    misses = counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else 0.0,
+    }
@@ -0,0 +1,262 @@
+"""
+Sized product image variants.
+
+Every product image is rendered once into ``VARIANTS`` widths, each as WebP
+and JPEG, and pages pick the smallest that fits via ``srcset`` (see
+``templatetags/shop_images.py``) instead of shipping the original.
+
+Variants are content-addressed: they live under
+``variants/<sha256[:2]>/<sha256>/`` next to a ``manifest.json``, so the same
+picture uploaded twice is only rendered once. The manifest is also copied
+onto ``Products.image_variants`` so templates never touch storage.
+
+Rendering is CPU-bound and runs in a process pool. ``render_variants``
+takes and returns plain bytes so it works with any storage backend and
+imports nothing from Django.
+"""
+import hashlib
+import io
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+
+# Largest width of each variant, in pixels (never upscaled).
+VARIANTS = {
+    "thumb": 160,
+    "card": 480,
+    "detail": 1200,
+}
+
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+VARIANTS_ROOT = "variants"
+
+
+# ==========================
+# RENDERING (worker side)
+# ==========================
+def render_variants(data):
+    """
+    Original image bytes -> ``{variant: {"width", "height", ext: bytes}}``.
+    Runs in a worker process.
+    """
+    largest = max(VARIANTS.values())
+    with Image.open(io.BytesIO(data)) as original:
+        # JPEGs can decode straight at 1/2, 1/4 or 1/8 scale.
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white (JPEG has no alpha).
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        rendered = {}
+        # Largest first, so each step resizes the previous (smaller) result.
+        for name, width in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+            entry = {"width": image.width, "height": image.height}
+            for ext, (fmt, options) in FORMATS.items():
+                buffer = io.BytesIO()
+                image.save(buffer, fmt, **options)
+                entry[ext] = buffer.getvalue()
+            rendered[name] = entry
+    return rendered
+
+
+# ==========================
+# STORAGE
+# ==========================
+def content_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def variants_dir(digest):
+    return f"{VARIANTS_ROOT}/{digest[:2]}/{digest}"
+
+
+def load_manifest(digest):
+    """The stored manifest for ``digest``, or None if not rendered yet."""
+    from django.core.files.storage import default_storage
+
+    name = f"{variants_dir(digest)}/manifest.json"
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name, "rb") as handle:
+        return json.load(handle)
+
+
+def _save(name, content, replace):
+    """Save ``content`` as ``name``; returns the name actually stored."""
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
+    if default_storage.exists(name):
+        if not replace:
+            return name
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content))
+
+
+def store_variants(digest, rendered, force=False):
+    """
+    Save rendered variants under ``digest``; return their manifest. Files
+    already stored are kept (same content, same name) unless ``force``.
+    """
+    from django.core.files.storage import default_storage
+
+    directory = variants_dir(digest)
+    manifest_name = f"{directory}/manifest.json"
+    if not force:
+        # A concurrent render of the same picture finished first.
+        manifest = load_manifest(digest)
+        if manifest is not None:
+            return manifest
+
+    manifest = {"digest": digest, "variants": {}}
+    for name, entry in rendered.items():
+        files = {"width": entry["width"], "height": entry["height"]}
+        for ext in FORMATS:
+            files[ext] = _save(f"{directory}/{name}-{entry['width']}.{ext}", entry[ext], replace=force)
+        manifest["variants"][name] = files
+
+    # Written last: its presence means the set is complete.
+    stored = _save(manifest_name, json.dumps(manifest).encode(), replace=True)
+    if stored != manifest_name:
+        # Lost a race to another writer between delete and save; theirs
+        # describes the same content.
+        default_storage.delete(stored)
+    return manifest
+
+
+def variant_bytes(manifest):
+    """Total stored bytes per format, e.g. ``{"webp": ..., "jpeg": ...}``."""
+    from django.core.files.storage import default_storage
+
+    totals = dict.fromkeys(FORMATS, 0)
+    for files in manifest["variants"].values():
+        for ext in FORMATS:
+            totals[ext] += default_storage.size(files[ext])
+    return totals
+
+
+# ==========================
+# PRODUCTS
+# ==========================
+def read_source(product):
+    """Bytes of ``product.image`` or None if there is no readable upload."""
+    if not product.image:
+        return None
+    try:
+        with product.image.open("rb") as handle:
+            return handle.read()
+    except OSError:
+        return None
+
+
+def attach(product_id, source, manifest, field="image"):
+    """
+    Record ``manifest`` on the product if its ``field`` (``image`` or
+    ``image_url``) still holds ``source``.
+    """
+    from django.utils import timezone
+
+    from .models import Products
+    from .versions import CATALOG, bump_version
+
+    manifest = dict(manifest, source=source)
+    products = Products.objects.filter(pk=product_id, **{field: source})
+    if field == "image_url":
+        products = products.filter(image="")   # an upload takes precedence
+    # update() rather than save(): no signals, so no re-render loop.
+    updated = products.update(image_variants=manifest, updated_at=timezone.now())
+    if updated:
+        bump_version(CATALOG)   # cached grid HTML embeds the srcset
+    return updated
+
+
+def variants_for(data, executor=None):
+    """
+    Manifest for the image in ``data``, rendering it unless a picture with
+    the same content has been rendered before.
+    ``executor`` runs the render step; None renders in this process.
+    """
+    digest = content_digest(data)
+    manifest = load_manifest(digest)
+    if manifest is None:
+        rendered = executor.submit(render_variants, data).result() if executor else render_variants(data)
+        manifest = store_variants(digest, rendered)
+    return manifest
+
+
+def build_variants(product, executor=None):
+    """
+    Render (or reuse) variants for ``product.image`` and attach them.
+    Returns the manifest, or None when there is no image.
+    """
+    data = read_source(product)
+    if data is None:
+        return None
+    manifest = variants_for(data, executor)
+    attach(product.pk, product.image.name, manifest)
+    return manifest
+
+
+# ==========================
+# BACKGROUND RENDERING
+# ==========================
+_pool = None
+_dispatcher = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process pool shared by upload-time rendering in this process."""
+    global _pool, _dispatcher
+    from django.conf import settings
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.SHOP_IMAGE_WORKERS)
+            # Reads, storage and the row update happen on a thread; only
+            # the pixel work is shipped to the pool.
+            _dispatcher = ThreadPoolExecutor(max_workers=settings.SHOP_IMAGE_WORKERS)
+    return _pool, _dispatcher
+
+
+def _build(product_id, executor=None):
+    from .models import Products
+
+    product = Products.objects.filter(pk=product_id).first()
+    if product is not None:
+        build_variants(product, executor=executor)
+
+
+def _build_in_background(product_id):
+    from django.db import connection
+
+    try:
+        _build(product_id, executor=get_pool()[0])
+    finally:
+        connection.close()
+
+
+def schedule(product_id):
+    """Render variants for a newly uploaded image without blocking the request."""
+    from django.conf import settings
+
+    if not settings.SHOP_IMAGE_WORKERS:
+        _build(product_id)
+        return
+    get_pool()[1].submit(_build_in_background, product_id)
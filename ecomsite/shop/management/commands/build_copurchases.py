@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop import copurchase
+
+
+class Command(BaseCommand):
+    help = "Rebuild the \"frequently bought together\" index from the whole order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=settings.SHOP_IMAGE_WORKERS or 1,
+            help="Counting processes; 0 counts inline (default: SHOP_IMAGE_WORKERS).",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=5000,
+            help="Orders per counting task.",
+        )
+
+    def handle(self, *args, **options):
+        orders, pairs, rows = copurchase.rebuild(
+            workers=options["workers"], chunk_size=options["chunk_size"], log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {rows:,} top pairs for products from {orders:,} orders ({pairs:,} distinct pairs)."
+        ))
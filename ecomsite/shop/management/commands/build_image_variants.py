@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop import images
+from shop.models import Products
+
+
+class Command(BaseCommand):
+    help = "Render thumb/card/detail WebP and JPEG variants for product images (backfill)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=settings.SHOP_IMAGE_WORKERS or 1,
+            help="Render processes (default: SHOP_IMAGE_WORKERS).",
+        )
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Re-render products that already have variants.",
+        )
+
+    def handle(self, *args, **options):
+        products = Products.objects.exclude(image="").exclude(image__isnull=True).order_by("pk")
+        if not options["force"]:
+            products = products.filter(image_variants={})
+
+        self.force = options["force"]
+        self.built = self.rendered = self.original_bytes = 0
+        self.variant_bytes = dict.fromkeys(images.FORMATS, 0)
+        skipped = 0
+        started = time.perf_counter()
+
+        # digest -> (future, [(product_id, image name)]); products sharing
+        # a picture share one render. Bounded so originals aren't all held
+        # in memory at once.
+        in_flight = {}
+        window = options["workers"] * 2
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            for product in products.iterator():
+                data = images.read_source(product)
+                if data is None:
+                    self.stderr.write(f"Skipping #{product.pk}: cannot read {product.image.name}")
+                    skipped += 1
+                    continue
+
+                digest = images.content_digest(data)
+                if digest in in_flight:
+                    in_flight[digest][1].append((product.pk, product.image.name))
+                    continue
+                manifest = None if options["force"] else images.load_manifest(digest)
+                if manifest is not None:
+                    self._attach([(product.pk, product.image.name)], manifest)
+                    continue
+
+                future = pool.submit(images.render_variants, data)
+                in_flight[digest] = (future, [(product.pk, product.image.name)])
+                self.original_bytes += len(data)
+                if len(in_flight) >= window:
+                    self._collect(in_flight, FIRST_COMPLETED)
+
+            while in_flight:
+                self._collect(in_flight, FIRST_COMPLETED)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Built variants for {self.built} products ({self.rendered} rendered, "
+            f"{skipped} skipped) in {elapsed:.1f}s."
+        ))
+        if self.rendered:
+            self.stdout.write(
+                f"Rendered originals {self.original_bytes:,} bytes -> all variants "
+                + ", ".join(f"{ext} {size:,} bytes" for ext, size in self.variant_bytes.items())
+            )
+
+    def _collect(self, in_flight, return_when):
+        done, _ = wait([future for future, _ in in_flight.values()], return_when=return_when)
+        for digest in [digest for digest, (future, _) in in_flight.items() if future in done]:
+            future, products = in_flight.pop(digest)
+            manifest = images.store_variants(digest, future.result(), force=self.force)
+            self._attach(products, manifest)
+            self.rendered += 1
+            for ext, size in images.variant_bytes(manifest).items():
+                self.variant_bytes[ext] += size
+
+    def _attach(self, products, manifest):
+        for product_id, source in products:
+            images.attach(product_id, source, manifest)
+        self.built += len(products)
@@ -0,0 +1,39 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import order_export
+from shop.models import Order
+
+
+class Command(BaseCommand):
+    help = "Stream orders and their items as CSV (one row per line) or JSONL (one record per order)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(order_export.FORMATS), default="csv")
+        parser.add_argument("--since", type=date.fromisoformat, help="First day included (YYYY-MM-DD).")
+        parser.add_argument("--until", type=date.fromisoformat, help="First day excluded (YYYY-MM-DD).")
+        parser.add_argument(
+            "--status", action="append", choices=[value for value, _ in Order.STATUS_CHOICES],
+            help="Only this status; repeat for several.",
+        )
+        parser.add_argument("--output", "-o", help="File to write (default: stdout).")
+        parser.add_argument("--chunk-size", type=int, default=order_export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options["since"] and options["until"] and options["since"] >= options["until"]:
+            raise CommandError("--since must be before --until.")
+
+        orders = order_export.filter_orders(
+            since=options["since"], until=options["until"], statuses=options["status"],
+        )
+        rows, _, _ = order_export.FORMATS[options["format"]]
+
+        lines = rows(orders, options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as output:
+                output.writelines(lines)
+            self.stderr.write(f"Wrote {options['output']}.")
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from shop import remote_images
+from shop.models import Products
+
+
+class Command(BaseCommand):
+    help = "Download image_url pictures into the local store and render their variants."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=settings.SHOP_IMAGE_FETCH_CONCURRENCY,
+            help="Simultaneous downloads (default: SHOP_IMAGE_FETCH_CONCURRENCY).",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=settings.SHOP_IMAGE_WORKERS or 1,
+            help="Render processes (default: SHOP_IMAGE_WORKERS).",
+        )
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Re-ingest products that already have variants.",
+        )
+
+    def handle(self, *args, **options):
+        products = Products.objects.filter(image="").exclude(image_url__isnull=True).exclude(image_url="")
+        if not options["force"]:
+            products = products.filter(image_variants={})
+        jobs = list(products.values_list("pk", "image_url"))
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as renderer, \
+                ThreadPoolExecutor(max_workers=options["concurrency"]) as fetcher:
+
+            def ingest(job):
+                try:
+                    return remote_images.try_ingest(*job, executor=renderer)
+                finally:
+                    connection.close()
+
+            results = list(fetcher.map(ingest, jobs))
+
+        done = sum(manifest is not None for manifest in results)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {done} of {len(jobs)} remote images in {elapsed:.1f}s "
+            f"({len(jobs) - done} failed, see log)."
+        ))
@@ -0,0 +1,53 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_import import CatalogImporter, CatalogImportError, Checkpoint, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream categories, subcategories and products from a CSV or JSONL file "
+        "into the catalog, upserting products by sku. Restartable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV (with header) or JSONL file.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Default: from the file extension.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk upsert.")
+        parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per transaction/checkpoint.")
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.checkpoint).")
+        parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start over.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            fmt = options["format"] or detect_format(path)
+            checkpoint = Checkpoint(options["checkpoint"] or path + ".checkpoint", path)
+            if options["restart"]:
+                checkpoint.clear()
+            resume_from = checkpoint.load()
+        except (CatalogImportError, OSError) as exc:
+            raise CommandError(exc)
+        if resume_from:
+            self.stdout.write(f"Resuming after row {resume_from:,} (checkpoint {checkpoint.path}).")
+
+        importer = CatalogImporter(
+            batch_size=options["batch_size"],
+            chunk_size=options["chunk_size"],
+            progress=lambda rows, rate: self.stdout.write(f"  {rows:,} rows ({rate:,.0f} rows/s)"),
+        )
+        with open(path, newline="", encoding="utf-8") as handle:
+            try:
+                rate = importer.run(read_rows(handle, fmt), checkpoint)
+            except (CatalogImportError, csv.Error, ValueError) as exc:   # malformed CSV/JSON line
+                raise CommandError(f"{exc} (progress saved, rerun to resume)")
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.rows:,} rows ({importer.products:,} products upserted, "
+            f"{importer.skipped:,} skipped) at {rate:,.0f} rows/s."
+        ))
+        if importer.products:
+            self.stdout.write("Run fetch_remote_images to localise new image_url pictures.")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from shop import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the products table."
+
+    def handle(self, *args, **options):
+        if not search.fts5_available():
+            self.stdout.write(
+                "FTS5 index not present; search uses the basic backend, nothing to do."
+            )
+            return
+
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
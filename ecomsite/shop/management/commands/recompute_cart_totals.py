@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored item_count/subtotal of every cart from its items."
+
+    def handle(self, *args, **options):
+        updated = Cart.objects.recompute_totals()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed totals for {updated} carts."))
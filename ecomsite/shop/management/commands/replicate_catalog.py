@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.replication import Replicator
+
+
+class Command(BaseCommand):
+    help = "Keep the local catalog replica files (SHOP_REPLICA_DB_PATHS) in sync with the primary."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=1.0, help="seconds between copies")
+        parser.add_argument("--once", action="store_true", help="copy once and exit")
+
+    def handle(self, *args, **options):
+        if not settings.SHOP_CATALOG_REPLICAS:
+            raise CommandError("No replicas configured; set SHOP_REPLICA_DB_PATHS.")
+
+        replicator = Replicator()
+        while True:
+            started = time.perf_counter()
+            targets = replicator.run_once()
+            if options["verbosity"] > 1 or options["once"]:
+                self.stdout.write(f"Replicated to {len(targets)} replica(s) in {time.perf_counter() - started:.2f}s.")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,267 @@
+"""
+Per-view request metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every request and, through a database
+``execute_wrapper``, counts its queries and their time. Results are
+aggregated per URL name in this process:
+
+* ``shop_http_requests_total{view, status}``
+* ``shop_http_request_duration_seconds{view}`` (histogram)
+* ``shop_db_queries_total{view}``
+* ``shop_db_query_duration_seconds_total{view}``
+
+The wrapper is attached to every connection rather than only around the
+request, since async views run their ORM calls on a worker thread with
+its own connection. It finds the current request's tally through a
+context variable, which follows the request into that thread.
+
+With several worker processes, set ``SHOP_METRICS_DIR``. Each process
+then snapshots its totals to ``<dir>/<pid>.json`` at most once per
+``SHOP_METRICS_FLUSH_INTERVAL`` seconds, and ``/metrics`` adds up every
+snapshot. Clear the directory when the server starts.
+"""
+import contextvars
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ==========================
+# REGISTRY
+# ==========================
+def _empty():
+    return {
+        "requests": {},                          # status -> count
+        "buckets": [0] * (len(BUCKETS) + 1),     # last slot is +Inf
+        "duration": 0.0,
+        "queries": 0,
+        "db_time": 0.0,
+    }
+
+
+class Registry:
+    """Per-view totals for this process (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+        self._flushed_at = 0.0
+
+    def record(self, view, status, duration, queries, db_time):
+        with self._lock:
+            totals = self.views.get(view)
+            if totals is None:
+                totals = self.views[view] = _empty()
+            status = str(status)
+            totals["requests"][status] = totals["requests"].get(status, 0) + 1
+            totals["buckets"][bisect_left(BUCKETS, duration)] += 1
+            totals["duration"] += duration
+            totals["queries"] += queries
+            totals["db_time"] += db_time
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.views))
+
+    def flush(self, force=False):
+        """Write this process's totals for /metrics in other processes."""
+        directory = settings.SHOP_METRICS_DIR
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed_at < settings.SHOP_METRICS_FLUSH_INTERVAL:
+            return
+        self._flushed_at = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as handle:
+            json.dump(self.snapshot(), handle)
+        os.replace(path + ".tmp", path)
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+
+registry = Registry()
+
+
+def merged_views():
+    """Totals of every process sharing ``SHOP_METRICS_DIR`` (or just this one)."""
+    directory = settings.SHOP_METRICS_DIR
+    if not directory:
+        return registry.snapshot()
+
+    registry.flush(force=True)
+    merged = {}
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as handle:
+                views = json.load(handle)
+        except (OSError, ValueError):
+            continue   # being replaced right now; next scrape gets it
+        for view, totals in views.items():
+            target = merged.setdefault(view, _empty())
+            for status, count in totals["requests"].items():
+                target["requests"][status] = target["requests"].get(status, 0) + count
+            target["buckets"] = [a + b for a, b in zip(target["buckets"], totals["buckets"])]
+            for key in ("duration", "queries", "db_time"):
+                target[key] += totals[key]
+    return merged
+
+
+# ==========================
+# QUERY TALLY
+# ==========================
+class _Tally:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_current = contextvars.ContextVar("shop_metrics_tally", default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    tally = _current.get()
+    if tally is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        tally.queries += 1
+        tally.db_time += time.perf_counter() - started
+
+
+def _attach(connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def install():
+    """Attach the query counter to current and future connections."""
+    connection_created.connect(_attach, dispatch_uid="shop.metrics")
+    for connection in connections.all(initialized_only=True):
+        _attach(connection)
+
+
+# ==========================
+# MIDDLEWARE
+# ==========================
+class MetricsMiddleware:
+    """Outermost middleware, so session/auth queries count too."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        tally, token, started = self._begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._end(request, response, tally, started)
+        return response
+
+    async def __acall__(self, request):
+        tally, token, started = self._begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._end(request, response, tally, started)
+        return response
+
+    def _begin(self):
+        tally = _Tally()
+        return tally, _current.set(tally), time.perf_counter()
+
+    def _end(self, request, response, tally, started):
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        registry.record(
+            view, response.status_code, time.perf_counter() - started, tally.queries, tally.db_time,
+        )
+        registry.flush()
+
+
+# ==========================
+# EXPOSITION
+# ==========================
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render(views):
+    lines = [
+        "# HELP shop_http_requests_total Requests handled, by view and status code.",
+        "# TYPE shop_http_requests_total counter",
+    ]
+    for view, totals in sorted(views.items()):
+        for status, count in sorted(totals["requests"].items()):
+            lines.append(f'shop_http_requests_total{{view="{_label(view)}",status="{status}"}} {count}')
+
+    lines += [
+        "# HELP shop_http_request_duration_seconds Request latency, by view.",
+        "# TYPE shop_http_request_duration_seconds histogram",
+    ]
+    for view, totals in sorted(views.items()):
+        label = _label(view)
+        cumulative = 0
+        for bound, count in zip([*map(str, BUCKETS), "+Inf"], totals["buckets"]):
+            cumulative += count
+            lines.append(f'shop_http_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'shop_http_request_duration_seconds_sum{{view="{label}"}} {totals["duration"]:.6f}')
+        lines.append(f'shop_http_request_duration_seconds_count{{view="{label}"}} {cumulative}')
+
+    for name, key, help_text, fmt in (
+        ("shop_db_queries_total", "queries", "SQL queries issued, by view.", "{}"),
+        ("shop_db_query_duration_seconds_total", "db_time", "Time spent in SQL, by view.", "{:.6f}"),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for view, totals in sorted(views.items()):
+            lines.append(f'{name}{{view="{_label(view)}"}} {fmt.format(totals[key])}')
+    return "\n".join(lines) + "\n"
+
+
+def _may_scrape(request):
+    token = settings.SHOP_METRICS_TOKEN
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    if request.META.get("REMOTE_ADDR") in settings.SHOP_METRICS_ALLOWED_IPS:
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (staff, SHOP_METRICS_TOKEN or listed IPs)."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(merged_views()), content_type=CONTENT_TYPE)
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+
+FTS_TABLE = "shop_products_fts"
+VOCAB_TABLE = "shop_products_fts_vocab"
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Build the FTS5 mirror of shop_products. Skipped on other databases and
+    on SQLite builds without FTS5 — shop.search then uses its fallback.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        options = {row[0] for row in cursor.fetchall()}
+        if "ENABLE_FTS5" not in options:
+            return
+
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', "
+            "prefix = '2 3')"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {VOCAB_TABLE} "
+            f"USING fts5vocab({FTS_TABLE}, 'row')"
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+            "SELECT id, title, description FROM shop_products"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {VOCAB_TABLE}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_wishlist'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
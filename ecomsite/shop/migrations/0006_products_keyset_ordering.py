@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_products_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='products',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['created_at', 'id'], name='products_created_id_idx'),
+        ),
+    ]
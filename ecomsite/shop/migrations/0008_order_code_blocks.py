@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_cart_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderCodeBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('claimed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_products_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='subcategory',
+            constraint=models.UniqueConstraint(fields=('category', 'name'), name='subcategory_unique_per_category'),
+        ),
+    ]
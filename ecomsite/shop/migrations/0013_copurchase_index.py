@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+
+
+def link_order_items(apps, schema_editor):
+    """Point past order lines at their product where the title is unambiguous."""
+    Products = apps.get_model("shop", "Products")
+    OrderItem = apps.get_model("shop", "OrderItem")
+    unique_title = (
+        Products.objects.filter(title=OuterRef("product_name"))
+        .values("title")
+        .annotate(n=Count("id"), first_id=Min("id"))
+        .filter(n=1)
+        .values("first_id")
+    )
+    OrderItem.objects.filter(product__isnull=True).update(product=Subquery(unique_title))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_products_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='shop.products'),
+        ),
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField()),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.products')),
+                ('related', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.products')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-orders', 'related'], name='copurchase_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'related'), name='copurchase_unique_pair')],
+            },
+        ),
+        migrations.RunPython(link_order_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_copurchase_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoPurchaseRebuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('through_order', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,8 +1,7 @@
-import string
-import random
-
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
 from smart_selects.db_fields import ChainedForeignKey
 
 
@@ -30,6 +29,12 @@ class SubCategory(models.Model):
         related_name="subcategories"
     )
 
+    class Meta:
+        constraints = [
+            # Lets import_catalog upsert subcategories by (category, name).
+            models.UniqueConstraint(fields=["category", "name"], name="subcategory_unique_per_category"),
+        ]
+
     def __str__(self):
         return f"{self.category.name} → {self.name}"
 
@@ -41,15 +46,21 @@ class Products(models.Model):
 
     title = models.CharField(max_length=200)
 
+    # Stable catalog key used by import_catalog to update products in place
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
     price = models.FloatField()
 
     discount = models.FloatField(default=0)
 
+    # Not indexed on their own: the composite listing indexes below lead
+    # with these columns.
     category = models.ForeignKey(
         Category,
         on_delete=models.SET_NULL,
         null=True,
-        blank=True
+        blank=True,
+        db_index=False
     )
 
     subcategory = ChainedForeignKey(
@@ -61,7 +72,8 @@ class Products(models.Model):
         sort=True,
         on_delete=models.SET_NULL,
         null=True,
-        blank=True
+        blank=True,
+        db_index=False
     )
 
     description = models.TextField()
@@ -80,7 +92,24 @@ class Products(models.Model):
         blank=True
     )
 
+    # Sized WebP/JPEG renditions of the image, see shop/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last change to anything the product pages show; see shop/conditional.py
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Newest first; id breaks ties so keyset pagination is stable.
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="products_created_id_idx"),
+            # Category / subcategory listings, already in page order. A
+            # subcategory implies its category, so the second index also
+            # serves requests that filter on both.
+            models.Index(fields=["category", "created_at", "id"], name="products_cat_created_idx"),
+            models.Index(fields=["subcategory", "created_at", "id"], name="products_subcat_created_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -112,6 +141,31 @@ class Wishlist(models.Model):
 # ==========================
 # CART MODEL  (one per user)
 # ==========================
+class CartQuerySet(models.QuerySet):
+
+    def adjust_totals(self, items=0, amount=0):
+        """Shift the stored aggregates in place with F() — no read needed."""
+        return self.update(
+            item_count=F("item_count") + items,
+            subtotal=F("subtotal") + amount,
+            updated_at=Now(),
+        )
+
+    def recompute_totals(self):
+        """Rebuild item_count/subtotal from CartItem in one UPDATE statement."""
+        lines = CartItem.objects.filter(cart=OuterRef("pk")).order_by().values("cart")
+        return self.update(
+            item_count=Coalesce(
+                Subquery(lines.annotate(n=Count("pk")).values("n")), 0
+            ),
+            subtotal=Coalesce(
+                Subquery(lines.annotate(total=Sum(F("price") * F("quantity"))).values("total")),
+                0.0,
+                output_field=models.FloatField(),
+            ),
+        )
+
+
 class Cart(models.Model):
 
     user = models.OneToOneField(
@@ -120,20 +174,27 @@ class Cart(models.Model):
         related_name="cart"
     )
 
+    # Denormalized aggregates, maintained by the cart views via
+    # CartQuerySet.adjust_totals(); `manage.py recompute_cart_totals` repairs them.
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.FloatField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart – {self.user.username}"
 
     @property
     def total_price(self):
         """Sum of (price × quantity) for every item in the cart."""
-        return sum(item.line_total for item in self.items.all())
+        return self.subtotal
 
     @property
     def total_items(self):
-        return self.items.count()
+        return self.item_count
 
 
 # ==========================
@@ -177,15 +238,22 @@ class CartItem(models.Model):
 # ==========================
 def generate_order_code():
     """
-    Generate a unique, human-readable order code like #ORD-7A2B9.
-    Uses a 5-character alphanumeric string (uppercase + digits).
-    Collision-safe: checks database uniqueness before returning.
+    Return a unique, human-readable order code like #ORD-7A2B9.
+    Codes are a keyed permutation of a block-allocated sequence
+    (see shop/order_codes.py), so no uniqueness probe is needed.
     """
-    chars = string.ascii_uppercase + string.digits
-    while True:
-        code = "#ORD-" + "".join(random.choices(chars, k=5))
-        if not Order.objects.filter(order_code=code).exists():
-            return code
+    from .order_codes import get_allocator
+
+    return get_allocator().next_code()
+
+
+class OrderCodeBlock(models.Model):
+    """One row per block of order-code sequence numbers claimed by a process."""
+
+    claimed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Order code block {self.pk}"
 
 
 class Order(models.Model):
@@ -198,10 +266,12 @@ class Order(models.Model):
         ("cancelled", "Cancelled"),
     ]
 
+    # Indexed through order_user_created_idx below.
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name="orders"
+        related_name="orders",
+        db_index=False
     )
 
     order_code = models.CharField(
@@ -220,10 +290,38 @@ class Order(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A user's orders newest first (profile, double-submit check);
+            # order_code lookups scoped to a user use the unique index.
+            models.Index(fields=["user", "created_at"], name="order_user_created_idx"),
+            # Admin status filter + date sort, and date-range exports.
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+            models.Index(fields=["created_at"], name="order_created_idx"),
+        ]
+
     def save(self, *args, **kwargs):
-        if not self.order_code:
+        if self.order_code:
+            return super().save(*args, **kwargs)
+
+        # A block claimed inside a transaction that later rolled back can be
+        # handed out again; the unique index catches that, so drop the block
+        # and retry with a fresh one.
+        from .order_codes import get_allocator
+
+        for attempt in range(3):
             self.order_code = generate_order_code()
-        super().save(*args, **kwargs)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Retry only if the code really is taken, whatever the
+                # backend's error message says.
+                taken = Order.objects.filter(order_code=self.order_code).exists()
+                self.order_code = ""
+                if not taken or attempt == 2:
+                    raise
+                get_allocator().discard_block()
 
     def __str__(self):
         return f"{self.order_code} – {self.user.username} (${self.total:.2f})"
@@ -240,6 +338,16 @@ class OrderItem(models.Model):
         related_name="items"
     )
 
+    # The product as it was ordered; name and price are kept as bought, and
+    # the line survives the product being deleted.
+    product = models.ForeignKey(
+        Products,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="order_items",
+    )
+
     product_name = models.CharField(max_length=200)
     price = models.FloatField()
     quantity = models.PositiveIntegerField()
@@ -249,4 +357,42 @@ class OrderItem(models.Model):
 
     @property
     def line_total(self):
-        return self.price * self.quantity
\ No newline at end of file
+        return self.price * self.quantity
+
+
+# ==========================
+# FREQUENTLY BOUGHT TOGETHER
+# ==========================
+class CoPurchase(models.Model):
+    """
+    One of ``product``'s top co-purchased products: ``orders`` is how many
+    orders contained both. Built and maintained by shop/copurchase.py.
+    """
+
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="+", db_index=False)
+    related = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="+", db_index=False)
+    orders = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "related"], name="copurchase_unique_pair"),
+        ]
+        indexes = [
+            # details: WHERE product_id = ? ORDER BY orders DESC, related_id
+            models.Index(fields=["product", "-orders", "related"], name="copurchase_top_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.related_id} ({self.orders})"
+
+
+class CoPurchaseRebuild(models.Model):
+    """
+    Single row: the last order the latest full build of ``CoPurchase``
+    counted. ``record_order`` skips orders at or below it.
+    """
+
+    through_order = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Rebuilt through order {self.through_order}"
@@ -0,0 +1,150 @@
+"""
+Order code allocation without read-before-write.
+
+Codes are a keyed permutation of a monotonic sequence:
+
+* sequence numbers are claimed in blocks — one INSERT into
+  ``OrderCodeBlock`` hands this process ``BLOCK_SIZE`` numbers that no
+  other process can receive;
+* each number goes through a 4-round Feistel network keyed from
+  ``SECRET_KEY`` (cycle-walking keeps it inside the 36^5 code space), so
+  consecutive orders get unrelated-looking codes;
+* the result is written in base 36 as ``#ORD-XXXXX``.
+
+A permutation never maps two sequence numbers to the same code, so there is
+nothing to probe for: uniqueness follows from the sequence.
+"""
+import hashlib
+import string
+import threading
+
+from django.conf import settings
+
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 5
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH   # 60,466,176
+PREFIX = "#ORD-"
+
+# Sequence numbers handed out per OrderCodeBlock row. Changing this would
+# make new blocks overlap old ones, so treat it as part of the schema.
+BLOCK_SIZE = 50
+
+
+# ==========================
+# PERMUTATION
+# ==========================
+class FeistelPermutation:
+    """Keyed bijection on ``range(domain)`` (balanced Feistel + cycle walking)."""
+
+    def __init__(self, key, domain=CODE_SPACE, rounds=4):
+        bits = max(2, (domain - 1).bit_length())
+        bits += bits % 2
+        self.domain = domain
+        self.half_bits = bits // 2
+        self.mask = (1 << self.half_bits) - 1
+        self.round_keys = [
+            hashlib.blake2b(key, digest_size=16, person=b"ordercode%d" % n).digest()
+            for n in range(rounds)
+        ]
+
+    def _round(self, round_key, value):
+        digest = hashlib.blake2b(value.to_bytes(4, "big"), key=round_key, digest_size=4).digest()
+        return int.from_bytes(digest, "big") & self.mask
+
+    def _encrypt_block(self, value):
+        left, right = value >> self.half_bits, value & self.mask
+        for round_key in self.round_keys:
+            left, right = right, left ^ self._round(round_key, right)
+        return (left << self.half_bits) | right
+
+    def _decrypt_block(self, value):
+        left, right = value >> self.half_bits, value & self.mask
+        for round_key in reversed(self.round_keys):
+            left, right = right ^ self._round(round_key, left), left
+        return (left << self.half_bits) | right
+
+    def permute(self, value):
+        if not 0 <= value < self.domain:
+            raise ValueError(f"{value} is outside the permutation domain")
+        value = self._encrypt_block(value)
+        while value >= self.domain:
+            value = self._encrypt_block(value)
+        return value
+
+    def invert(self, value):
+        if not 0 <= value < self.domain:
+            raise ValueError(f"{value} is outside the permutation domain")
+        value = self._decrypt_block(value)
+        while value >= self.domain:
+            value = self._decrypt_block(value)
+        return value
+
+
+def encode(number):
+    chars = []
+    for _ in range(CODE_LENGTH):
+        number, digit = divmod(number, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return PREFIX + "".join(reversed(chars))
+
+
+def decode(code):
+    if not code.startswith(PREFIX) or len(code) != len(PREFIX) + CODE_LENGTH:
+        raise ValueError(f"{code!r} is not an order code")
+    number = 0
+    for char in code[len(PREFIX):]:
+        number = number * len(ALPHABET) + ALPHABET.index(char)
+    return number
+
+
+# ==========================
+# ALLOCATOR
+# ==========================
+class OrderCodeAllocator:
+    """Hands out codes from per-process blocks of the global sequence."""
+
+    def __init__(self, key=None, block_size=BLOCK_SIZE):
+        key = key if key is not None else settings.SECRET_KEY.encode()
+        self.permutation = FeistelPermutation(key)
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+
+    def _claim_block(self):
+        from .models import OrderCodeBlock
+
+        block = OrderCodeBlock.objects.create()
+        start = (block.pk - 1) * self.block_size
+        if start + self.block_size > CODE_SPACE:
+            raise RuntimeError("Order code space exhausted; widen CODE_LENGTH.")
+        self._next, self._end = start, start + self.block_size
+
+    def next_sequence(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._claim_block()
+            number = self._next
+            self._next += 1
+            return number
+
+    def next_code(self):
+        return encode(self.permutation.permute(self.next_sequence()))
+
+    def discard_block(self):
+        """Drop the rest of the current block (e.g. after a rolled-back claim)."""
+        with self._lock:
+            self._next = self._end = 0
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = OrderCodeAllocator()
+    return _allocator
@@ -0,0 +1,163 @@
+"""
+Streaming order export (admin action and ``manage.py export_orders``).
+
+Orders and their lines come out of one LEFT JOIN query read with
+``.iterator(chunk_size=...)``, ordered so each order's lines are
+adjacent. Rows are turned into CSV lines (one per order line) or JSONL
+records (one per order, lines nested) as they arrive. Nothing is
+buffered beyond the current order, so memory stays flat however many
+orders there are. Under ASGI the admin action streams the ``a*`` variants,
+which read the same query a chunk at a time; a sync generator there
+would be drained into a list before the first byte went out.
+"""
+import csv
+import itertools
+import json
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .models import Order
+
+
+CHUNK_SIZE = 2000
+
+COLUMNS = [
+    "order_code", "created_at", "status", "username", "email", "order_total",
+    "product_name", "price", "quantity", "line_total",
+]
+
+_FIELDS = [
+    "id", "order_code", "created_at", "status", "user__username", "user__email", "total",
+    "items__product_name", "items__price", "items__quantity",
+]
+
+
+def filter_orders(queryset=None, since=None, until=None, statuses=None):
+    """
+    Orders created in ``[since, until)`` (dates or datetimes, either
+    optional) with one of ``statuses`` (all when empty).
+    """
+    queryset = Order.objects.all() if queryset is None else queryset
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=_as_datetime(since))
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=_as_datetime(until))
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset
+
+
+def _as_datetime(value):
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def order_lines(queryset, chunk_size=CHUNK_SIZE):
+    """One tuple per order line (or per order without lines), order by order."""
+    return (
+        queryset.order_by("created_at", "id", "items__id")
+        .values_list(*_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+async def aorder_lines(queryset, chunk_size=CHUNK_SIZE):
+    """``order_lines`` as an async iterator, for responses served under ASGI."""
+    # Not .aiterator(): on values_list() querysets it runs the query in the
+    # event loop. Fetch each chunk in the sync thread instead.
+    rows = order_lines(queryset, chunk_size)
+    while chunk := await sync_to_async(list)(itertools.islice(rows, chunk_size)):
+        for row in chunk:
+            yield row
+
+
+# ==========================
+# CSV
+# ==========================
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_line(writer, row):
+    _, code, created_at, status, username, email, total, name, price, quantity = row
+    line_total = round(price * quantity, 2) if name is not None else ""
+    return writer.writerow([
+        code, created_at.isoformat(), status, username, email, total,
+        name or "", "" if price is None else price, "" if quantity is None else quantity, line_total,
+    ])
+
+
+def csv_rows(queryset, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in order_lines(queryset, chunk_size):
+        yield _csv_line(writer, row)
+
+
+async def acsv_rows(queryset, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    async for row in aorder_lines(queryset, chunk_size):
+        yield _csv_line(writer, row)
+
+
+# ==========================
+# JSONL
+# ==========================
+class _JsonlGrouper:
+    """Folds consecutive lines of an order into one JSON record."""
+
+    def __init__(self):
+        self.current_id, self.record = None, None
+
+    def add(self, row):
+        """The finished previous record as a line, or None."""
+        order_id, code, created_at, status, username, email, total, name, price, quantity = row
+        done = None
+        if order_id != self.current_id:
+            done = self.flush()
+            self.current_id = order_id
+            self.record = {
+                "order_code": code, "created_at": created_at.isoformat(), "status": status,
+                "username": username, "email": email, "total": total, "items": [],
+            }
+        if name is not None:
+            self.record["items"].append({"product_name": name, "price": price, "quantity": quantity})
+        return done
+
+    def flush(self):
+        record, self.record = self.record, None
+        return None if record is None else json.dumps(record) + "\n"
+
+
+def jsonl_rows(queryset, chunk_size=CHUNK_SIZE):
+    grouper = _JsonlGrouper()
+    for row in order_lines(queryset, chunk_size):
+        if (line := grouper.add(row)) is not None:
+            yield line
+    if (line := grouper.flush()) is not None:
+        yield line
+
+
+async def ajsonl_rows(queryset, chunk_size=CHUNK_SIZE):
+    grouper = _JsonlGrouper()
+    async for row in aorder_lines(queryset, chunk_size):
+        if (line := grouper.add(row)) is not None:
+            yield line
+    if (line := grouper.flush()) is not None:
+        yield line
+
+
+# Format: (sync rows, async rows, content type).
+FORMATS = {
+    "csv": (csv_rows, acsv_rows, "text/csv"),
+    "jsonl": (jsonl_rows, ajsonl_rows, "application/x-ndjson"),
+}
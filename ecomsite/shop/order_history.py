@@ -0,0 +1,29 @@
+"""
+A shopper's order history (profile page).
+
+Pages are keyset-paginated newest first along ``order_user_created_idx``
+(user, created_at), so the thousandth page costs what the first does.
+Each order on a page carries its line count and item quantity, computed
+in the same query by correlated subqueries on the order-item FK index:
+one small probe per row shown, never a GROUP BY over the user's whole
+history. Line items themselves are fetched only when an order is
+expanded (``views.order_items``).
+"""
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from .models import Order, OrderItem
+from .pagination import KeysetPaginator
+
+
+def orders_for(user):
+    """``user``'s orders with ``line_count`` and ``item_quantity``."""
+    lines = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+    return Order.objects.filter(user=user).annotate(
+        line_count=Subquery(lines.annotate(n=Count("id")).values("n")),
+        item_quantity=Subquery(lines.annotate(n=Sum("quantity")).values("n")),
+    )
+
+
+def paginator(user, per_page):
+    # No total is shown, so the paginator never counts.
+    return KeysetPaginator(orders_for(user), per_page, count_key="")
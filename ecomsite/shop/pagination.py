@@ -0,0 +1,169 @@
+"""
+Pagination helpers for the product listing and order history.
+
+``KeysetPaginator`` walks any ``(created_at, id)``-ordered queryset (the
+catalog, a user's orders) using opaque cursors, so every page costs the
+same no matter how deep it is.
+``CachedCountPaginator`` keeps the classic ``?page=N`` links working (ranked
+search results and old bookmarks) but caches the expensive COUNT(*).
+Cached counts are keyed on the catalog version, so they are exact.
+"""
+import base64
+import collections.abc
+import hashlib
+import json
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .versions import CATALOG, aget_version, get_version
+
+
+COUNT_CACHE_TIMEOUT = 60 * 60
+
+
+def cached_count(queryset, key):
+    """COUNT(*) of ``queryset``, cached per catalog version under ``key``."""
+    digest = hashlib.md5(key.encode()).hexdigest()
+    return cache.get_or_set(
+        f"shop:count:{get_version(CATALOG)}:{digest}", queryset.count, COUNT_CACHE_TIMEOUT
+    )
+
+
+async def acached_count(queryset, key):
+    digest = hashlib.md5(key.encode()).hexdigest()
+    cache_key = f"shop:count:{await aget_version(CATALOG)}:{digest}"
+    count = await cache.aget(cache_key)
+    if count is None:
+        count = await queryset.acount()
+        await cache.aset(cache_key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+# ==========================
+# OFFSET PAGINATION (legacy ?page=N)
+# ==========================
+class CachedCountPaginator(Paginator):
+    """A regular Paginator whose total is read from the cache."""
+
+    def __init__(self, object_list, per_page, count_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.count_key)
+
+
+# ==========================
+# KEYSET PAGINATION
+# ==========================
+def encode_cursor(direction, row):
+    payload = json.dumps([direction, row.created_at.isoformat(), row.pk])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return ``(direction, created_at, id)`` or None for a malformed token."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        direction, created_at, pk = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ("next", "prev"):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+class KeysetPage(collections.abc.Sequence):
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self.object_list)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def approximate_count(self):
+        return self.paginator.count
+
+
+class KeysetPaginator:
+    """
+    Newest-first pagination over ``(created_at, id)``.
+
+    Each page is a single indexed range query; no OFFSET and no COUNT(*)
+    (the optional total comes from ``cached_count``).
+    """
+
+    def __init__(self, queryset, per_page, count_key):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return cached_count(self.queryset, self.count_key)
+
+    async def acount(self):
+        """Async fill of ``count`` so templates can read it without I/O."""
+        self.count = await acached_count(self.queryset, self.count_key)
+        return self.count
+
+    def _query(self, token):
+        """The single range query for ``token`` and which way it walks."""
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            return self.queryset.order_by("-created_at", "-id")[: self.per_page + 1], "first"
+
+        direction, created_at, pk = cursor
+        if direction == "next":
+            return self.queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            ).order_by("-created_at", "-id")[: self.per_page + 1], direction
+
+        return self.queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        ).order_by("created_at", "id")[: self.per_page + 1], direction
+
+    def get_page(self, token=None):
+        queryset, direction = self._query(token)
+        return self._page(list(queryset), direction)
+
+    async def aget_page(self, token=None):
+        queryset, direction = self._query(token)
+        return self._page([row async for row in queryset], direction)
+
+    def _page(self, rows, direction):
+        has_more = len(rows) > self.per_page
+        if direction == "prev":
+            rows = rows[: self.per_page][::-1]
+            has_next, has_previous = bool(rows), has_more
+        else:
+            rows = rows[: self.per_page]
+            has_next, has_previous = has_more, direction == "next" and bool(rows)
+
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=encode_cursor("next", rows[-1]) if has_next else None,
+            previous_cursor=encode_cursor("prev", rows[0]) if has_previous else None,
+        )
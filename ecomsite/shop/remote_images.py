@@ -0,0 +1,150 @@
+"""
+Local copies of external product images (``Products.image_url``).
+
+Instead of hotlinking third-party hosts, the image is fetched once in the
+background and kept in a content-addressed store
+(``originals/<sha256[:2]>/<sha256>``): two URLs serving the same bytes are
+stored and rendered once. The bytes then go through the same variant
+pipeline as uploads (shop/images.py). Until that has finished the
+templates keep pointing at the original URL.
+
+Fetching is I/O-bound, so it runs on a small thread pool whose size
+(``SHOP_IMAGE_FETCH_CONCURRENCY``) bounds how many downloads are open at
+once; rendering is handed to the image process pool.
+"""
+import hashlib
+import logging
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+
+from . import images
+
+
+logger = logging.getLogger(__name__)
+
+ORIGINALS_ROOT = "originals"
+
+# url -> digest of what it served, so re-saves don't download again.
+URL_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+class FetchError(Exception):
+    pass
+
+
+# ==========================
+# FETCHING
+# ==========================
+def fetch(url, timeout=None, max_bytes=None):
+    """GET ``url`` and return the image bytes, or raise FetchError."""
+    timeout = timeout or settings.SHOP_IMAGE_FETCH_TIMEOUT
+    max_bytes = max_bytes or settings.SHOP_IMAGE_FETCH_MAX_BYTES
+
+    if urlsplit(url).scheme not in ("http", "https"):
+        raise FetchError(f"unsupported URL scheme: {url}")
+    request = urllib.request.Request(url, headers={"User-Agent": "ecomsite-image-fetcher/1.0"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            content_type = response.headers.get_content_type()
+            if not content_type.startswith("image/"):
+                raise FetchError(f"{url} is {content_type}, not an image")
+            data = response.read(max_bytes + 1)
+    except OSError as exc:   # URLError, HTTPError and timeouts
+        raise FetchError(f"{url}: {exc}") from exc
+    if len(data) > max_bytes:
+        raise FetchError(f"{url} is larger than {max_bytes} bytes")
+    return data
+
+
+# ==========================
+# CONTENT-ADDRESSED STORE
+# ==========================
+def original_name(digest):
+    return f"{ORIGINALS_ROOT}/{digest[:2]}/{digest}"
+
+
+def store_original(data):
+    """Keep ``data`` under its hash (once); return the digest."""
+    digest = images.content_digest(data)
+    name = original_name(digest)
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    return digest
+
+
+def _url_key(url):
+    return "shop:remote_image:" + hashlib.md5(url.encode()).hexdigest()
+
+
+def ingest(product_id, url, executor=None):
+    """
+    Fetch ``url`` (unless already stored), render its variants and attach
+    them to the product. Returns the manifest.
+    """
+    digest = cache.get(_url_key(url))
+    manifest = images.load_manifest(digest) if digest else None
+    if manifest is None:
+        data = fetch(url)
+        digest = store_original(data)
+        manifest = images.variants_for(data, executor)
+        cache.set(_url_key(url), digest, URL_CACHE_TIMEOUT)
+    images.attach(product_id, url, manifest, field="image_url")
+    return manifest
+
+
+def try_ingest(product_id, url, executor=None):
+    """``ingest`` that logs failures and returns None instead of raising."""
+    try:
+        return ingest(product_id, url, executor)
+    except Exception:
+        # Bad URLs and broken images are expected; the URL keeps serving.
+        logger.warning("Could not ingest image for product %s from %s", product_id, url, exc_info=True)
+        return None
+
+
+# ==========================
+# BACKGROUND FETCHING
+# ==========================
+_fetcher = None
+_fetcher_lock = threading.Lock()
+_pending = set()
+
+
+def get_fetcher():
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = ThreadPoolExecutor(
+                max_workers=settings.SHOP_IMAGE_FETCH_CONCURRENCY,
+                thread_name_prefix="image-fetch",
+            )
+    return _fetcher
+
+
+def _ingest_in_background(product_id, url):
+    try:
+        try_ingest(product_id, url, executor=images.get_pool()[0])
+    finally:
+        with _fetcher_lock:
+            _pending.discard((product_id, url))
+        connection.close()
+
+
+def schedule(product_id, url):
+    """Queue ``url`` for ``product_id``; duplicate requests are dropped."""
+    if not settings.SHOP_IMAGE_WORKERS:
+        try_ingest(product_id, url)
+        return
+    with _fetcher_lock:
+        if (product_id, url) in _pending:
+            return
+        _pending.add((product_id, url))
+    get_fetcher().submit(_ingest_in_background, product_id, url)
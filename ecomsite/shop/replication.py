@@ -0,0 +1,53 @@
+"""
+Replication stand-in for local SQLite catalog replicas.
+
+Production would stream the primary's changes to real replicas. Locally,
+``manage.py replicate_catalog`` plays that part: every ``--interval``
+seconds it copies the primary file into each replica file with SQLite's
+online backup API. That gives a consistent snapshot, and readers of the
+replica keep their own snapshot while it is replaced.
+
+Pages rendered from a replica are cached under the catalog version. A
+replica can lag a write that already bumped the version, so a pass that
+brings in new catalog data bumps it again (and drops the category tree).
+Anything cached from the stale copy then expires. This needs a cache
+shared with the web workers (``SHOP_CACHE_BACKEND``).
+"""
+import sqlite3
+from contextlib import closing
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from . import category_tree
+from .versions import CATALOG, bump_version, get_version
+
+
+def copy_database(source, target):
+    """Consistent snapshot of the SQLite file ``source`` into ``target``."""
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+
+
+class Replicator:
+
+    def __init__(self, aliases=None):
+        self.aliases = settings.SHOP_CATALOG_REPLICAS if aliases is None else aliases
+        self.version = None
+
+    def run_once(self):
+        """Copy the primary into every replica; returns the replica paths."""
+        version = get_version(CATALOG)   # read before the copy
+        source = settings.DATABASES[DEFAULT_DB_ALIAS]["NAME"]
+        targets = [settings.DATABASES[alias]["NAME"] for alias in self.aliases]
+        for target in targets:
+            copy_database(source, target)
+        if version != self.version:
+            category_tree.invalidate()
+            bumped = bump_version(CATALOG)
+            # If ours was the only bump since the read, the replicas hold
+            # everything up to ``bumped``. Otherwise a write landed during
+            # or after the copy and may be missing from them: keep the
+            # pre-copy version so the next pass bumps again.
+            self.version = bumped if bumped == version + 1 else version
+        return targets
@@ -0,0 +1,132 @@
+"""
+Catalog read replicas.
+
+``CatalogReplicaRouter`` sends reads of the catalog models (products,
+categories, subcategories) to one of the ``SHOP_CATALOG_REPLICAS``
+aliases, picked at random once per request so a page never mixes two
+replicas' states. Everything else, and every write, uses the primary
+(``default``).
+
+Replicas lag, so reads are *pinned* to the primary:
+
+* for the whole of a non-GET/HEAD request (it reads back what it writes);
+* for the rest of any request, from its first write on;
+* inside ``transaction.atomic()`` on the primary;
+* for ``SHOP_REPLICA_STICKY_SECONDS`` after a request that wrote. That
+  request gets a short-lived cookie, so the user's next pages still see
+  their own changes while the replicas catch up.
+
+Replicas are only used inside a request that went through
+``ReplicaPinningMiddleware``. Management commands, background jobs and
+tests outside a request always read the primary.
+"""
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+CATALOG_MODELS = {"shop.products", "shop.category", "shop.subcategory"}
+
+STICKY_COOKIE = "shop_primary"
+
+
+class _Route:
+    __slots__ = ("replica", "pinned", "wrote")
+
+    def __init__(self, replica, pinned):
+        self.replica = replica
+        self.pinned = pinned
+        self.wrote = False
+
+
+_route = contextvars.ContextVar("shop_db_route", default=None)
+
+
+# ==========================
+# ROUTER
+# ==========================
+class CatalogReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if (
+            route is None
+            or route.pinned
+            or model._meta.label_lower not in CATALOG_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            # Explicitly the primary: left to Django, a related lookup from
+            # a replica-loaded product would follow it to the replica.
+            return DEFAULT_DB_ALIAS
+        return route.replica
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is not None:
+            route.pinned = route.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        pool = {DEFAULT_DB_ALIAS, *settings.SHOP_CATALOG_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema with the data (shop/replication.py).
+        return db not in settings.SHOP_CATALOG_REPLICAS
+
+
+# ==========================
+# MIDDLEWARE
+# ==========================
+class ReplicaPinningMiddleware:
+    """Tracks writes per request; sits outside SessionMiddleware."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        route, token = self._begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+        return self._end(route, response)
+
+    async def __acall__(self, request):
+        route, token = self._begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _route.reset(token)
+        return self._end(route, response)
+
+    def _begin(self, request):
+        replicas = settings.SHOP_CATALOG_REPLICAS
+        if not replicas:
+            return None, _route.set(None)
+        route = _Route(
+            replica=random.choice(replicas),
+            pinned=request.method not in ("GET", "HEAD") or STICKY_COOKIE in request.COOKIES,
+        )
+        return route, _route.set(route)
+
+    def _end(self, route, response):
+        if route is not None and route.wrote:
+            response.set_cookie(
+                STICKY_COOKIE, "1", max_age=settings.SHOP_REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax",
+            )
+        return response
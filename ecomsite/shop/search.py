@@ -0,0 +1,219 @@
+"""
+Product search.
+
+On SQLite builds with FTS5 the catalog is mirrored into the
+``shop_products_fts`` virtual table (see migration 0005) and searched with
+ranked, prefix-aware MATCH queries. Misspelled words are corrected against
+the index vocabulary. Every other database falls back to a portable
+``icontains`` search over title and description.
+"""
+import difflib
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+
+FTS_TABLE = "shop_products_fts"
+VOCAB_TABLE = "shop_products_fts_vocab"
+
+# bm25() column weights: a hit in the title outranks one in the description.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Words shorter than this are never "corrected" — too many false friends.
+MIN_FUZZY_LENGTH = 4
+MAX_FUZZY_CANDIDATES = 3
+FUZZY_CUTOFF = 0.75
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_fts5_available = None
+
+
+# ==========================
+# BACKEND DETECTION
+# ==========================
+def fts5_available():
+    """True when the FTS5 search index exists on the default database."""
+    global _fts5_available
+
+    backend = getattr(settings, "SHOP_SEARCH_BACKEND", "auto")
+    if backend == "basic":
+        return False
+
+    if connection.vendor != "sqlite":
+        return False
+
+    if _fts5_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [FTS_TABLE],
+            )
+            _fts5_available = cursor.fetchone() is not None
+    return _fts5_available
+
+
+def reset_backend_cache():
+    """Forget the cached FTS5 probe (used after creating/dropping the index)."""
+    global _fts5_available
+    _fts5_available = None
+
+
+def tokenize(query):
+    return [token.lower() for token in _TOKEN_RE.findall(query or "")]
+
+
+# ==========================
+# INDEX MAINTENANCE
+# ==========================
+def index_product(product):
+    """Insert or refresh a single product in the search index."""
+    if not fts5_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)",
+            [product.pk, product.title, product.description],
+        )
+
+
+def index_products(rows):
+    """Insert or refresh many ``(id, title, description)`` rows at once."""
+    if not fts5_available() or not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)", rows
+        )
+
+
+def unindex_product(product_id):
+    if not fts5_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+def rebuild_index():
+    """
+    Repopulate the index from ``shop_products`` in one statement.
+    Needed after bulk_create()/update(), which bypass model signals.
+    Returns the number of indexed products.
+    """
+    if not fts5_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+            "SELECT id, title, description FROM shop_products"
+        )
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+# ==========================
+# QUERY BUILDING
+# ==========================
+def _has_prefix(cursor, token):
+    cursor.execute(
+        f"SELECT 1 FROM {VOCAB_TABLE} WHERE term >= %s AND term < %s LIMIT 1",
+        [token, token + "\uffff"],
+    )
+    return cursor.fetchone() is not None
+
+
+def _close_terms(cursor, token):
+    """Vocabulary terms within a small edit distance of ``token``."""
+    cursor.execute(
+        f"SELECT term FROM {VOCAB_TABLE} "
+        "WHERE term >= %s AND term < %s AND length(term) BETWEEN %s AND %s",
+        [token[0], token[0] + "\uffff", len(token) - 2, len(token) + 2],
+    )
+    candidates = [row[0] for row in cursor.fetchall()]
+    return difflib.get_close_matches(
+        token, candidates, n=MAX_FUZZY_CANDIDATES, cutoff=FUZZY_CUTOFF
+    )
+
+
+def build_match_expression(query):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word is a quoted prefix term (so "lap" finds "laptop"); a word that
+    matches nothing in the vocabulary is replaced by its closest spellings.
+    Returns None when nothing searchable is left.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+
+    parts = []
+    with connection.cursor() as cursor:
+        for token in tokens:
+            if len(token) >= MIN_FUZZY_LENGTH and not _has_prefix(cursor, token):
+                alternatives = _close_terms(cursor, token)
+                if alternatives:
+                    parts.append(
+                        "(" + " OR ".join(f'"{term}"' for term in alternatives) + ")"
+                    )
+                    continue
+            parts.append(f'"{token}"*')
+    return " AND ".join(parts)
+
+
+# ==========================
+# PUBLIC API
+# ==========================
+def search_products(queryset, query):
+    """
+    Restrict a ``Products`` queryset to matches for ``query``, best first.
+
+    The queryset may already carry other filters (category, subcategory);
+    the result is still a lazy queryset, so pagination works unchanged.
+    """
+    if fts5_available():
+        return _fts_search(queryset, query)
+    return _basic_search(queryset, query)
+
+
+def _fts_search(queryset, query):
+    expression = build_match_expression(query)
+    if expression is None:
+        return queryset
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[
+            f"{FTS_TABLE}.rowid = shop_products.id",
+            f"{FTS_TABLE} MATCH %s",
+        ],
+        params=[expression],
+        select={
+            "search_rank": f"bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT})"
+        },
+        order_by=["search_rank", "-id"],
+    )
+
+
+def _basic_search(queryset, query):
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+
+    for token in tokens:
+        queryset = queryset.filter(
+            Q(title__icontains=token) | Q(description__icontains=token)
+        )
+
+    title_hits = [When(title__icontains=token, then=Value(1)) for token in tokens]
+    return queryset.annotate(
+        search_rank=sum(
+            (Case(hit, default=Value(0), output_field=IntegerField()) for hit in title_hits),
+            Value(0),
+        )
+    ).order_by("-search_rank", "-id")
@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import auth_cache, category_tree, images, remote_images, search, wishlist_cache
+from .models import Category, Products, SubCategory, Wishlist
+from .versions import CATALOG, bump_version
+
+
+# ==========================
+# SEARCH INDEX SYNC
+# ==========================
+@receiver(post_save, sender=Products)
+def index_product_on_save(sender, instance, **kwargs):
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Products)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    search.unindex_product(instance.pk)
+
+
+# ==========================
+# IMAGE VARIANTS
+# ==========================
+@receiver(post_save, sender=Products)
+def render_image_variants(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # An upload wins over image_url, as in the templates.
+    source = instance.image.name if instance.image else instance.image_url
+    if instance.image_variants.get("source") == source:
+        return
+    if instance.image_variants:
+        # Stale: show the new original until its variants are ready.
+        Products.objects.filter(pk=instance.pk).update(image_variants={})
+
+    # After commit, so the background job sees the saved row.
+    product_id = instance.pk
+    if instance.image:
+        transaction.on_commit(lambda: images.schedule(product_id))
+    elif instance.image_url:
+        transaction.on_commit(lambda: remote_images.schedule(product_id, source))
+
+
+# ==========================
+# CATEGORY TREE CACHE
+# ==========================
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+@receiver([post_save, post_delete], sender=Products)
+def invalidate_category_tree(sender, **kwargs):
+    # Products count towards per-node totals, so they bump the tree too.
+    # After commit, so a concurrent request cannot rebuild the old tree
+    # under the new version.
+    transaction.on_commit(category_tree.invalidate)
+
+
+# ==========================
+# CATALOG VERSION
+# ==========================
+@receiver([post_save, post_delete], sender=Products)
+def bump_catalog_version(sender, **kwargs):
+    # After commit, so a concurrent request cannot cache a grid or page
+    # built from the old rows under the new version.
+    transaction.on_commit(lambda: bump_version(CATALOG))
+
+
+# ==========================
+# WISHLIST MEMBERSHIP CACHE
+# ==========================
+@receiver(m2m_changed, sender=Wishlist.products.through)
+def sync_wishlist_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    # Patches run after commit, so a concurrent request cannot re-cache the
+    # old set over them. They are idempotent, so a reader that loads the
+    # new set first is fine.
+    if reverse:
+        # product.wishlisted_by.add(...) — rare; just drop the affected users.
+        if action in ("post_add", "post_remove", "pre_clear"):
+            if pk_set:
+                wishlists = Wishlist.objects.filter(pk__in=pk_set)
+            else:
+                wishlists = instance.wishlisted_by.all()
+            user_ids = list(wishlists.values_list("user_id", flat=True))
+            transaction.on_commit(lambda: wishlist_cache.invalidate(*user_ids))
+        return
+
+    user_id, product_ids = instance.user_id, set(pk_set or ())
+    if action == "post_add":
+        transaction.on_commit(lambda: wishlist_cache.add(user_id, product_ids))
+    elif action == "post_remove":
+        transaction.on_commit(lambda: wishlist_cache.remove(user_id, product_ids))
+    elif action == "post_clear":
+        transaction.on_commit(lambda: wishlist_cache.invalidate(user_id))
+
+
+# ==========================
+# CACHED AUTH USER
+# ==========================
+@receiver([post_save, post_delete], sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    # After commit, so a concurrent request cannot re-cache the old row.
+    transaction.on_commit(lambda: auth_cache.invalidate(instance.pk))
+
+
+# ==========================
+# SQLITE JOURNAL MODE
+# ==========================
+def set_sqlite_journal_mode(sender, using, **kwargs):
+    """After migrate: switch the file to SHOP_SQLITE_JOURNAL_MODE (it persists)."""
+    connection = connections[using]
+    if connection.vendor != "sqlite" or not settings.SHOP_SQLITE_TUNED:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA journal_mode={settings.SHOP_SQLITE_JOURNAL_MODE}")
@@ -9,3 +9,114 @@ function startChat() {
 function logout() {
   alert('Logged out!');
 }
+
+// ================= In-place cart & wishlist updates =================
+// Links keep their plain href as a no-JS fallback; when JS is available the
+// click goes to the JSON API instead and only the affected bits change.
+function goToLogin() {
+  window.location = '/login/?next=' + encodeURIComponent(window.location.pathname);
+  throw new Error('login required');
+}
+
+function shopApi(url, data) {
+  // Pages only carry a CSRF token for signed-in users (anonymous pages are
+  // shared by caches), so no token means: log in first.
+  const token = document.querySelector('meta[name="csrf-token"]');
+  if (!token) return Promise.resolve().then(goToLogin);
+  return fetch(url, {
+    method: 'POST',
+    credentials: 'same-origin',
+    headers: { 'X-CSRFToken': token.content },
+    body: new URLSearchParams(data || {}),
+  }).then((response) => {
+    if (response.status === 401) goToLogin();
+    if (!response.ok) throw new Error('request failed: ' + response.status);
+    return response.json();
+  });
+}
+
+function formatMoney(value) {
+  return '$' + Number(value).toFixed(2);
+}
+
+function updateCartSummary(data) {
+  document.querySelectorAll('[data-cart-count]').forEach((el) => {
+    el.textContent = data.item_count;
+    el.hidden = !data.item_count;
+  });
+  document.querySelectorAll('[data-cart-lines]').forEach((el) => { el.textContent = data.item_count; });
+  document.querySelectorAll('[data-cart-subtotal]').forEach((el) => { el.textContent = formatMoney(data.subtotal); });
+  if (document.querySelector('[data-cart-row]') === null && document.querySelector('[data-cart-subtotal]')) {
+    window.location.reload();  // cart emptied: show the empty state
+  }
+}
+
+function removeCartRows(itemId) {
+  document.querySelectorAll('[data-cart-row="' + itemId + '"], [data-summary-row="' + itemId + '"]')
+    .forEach((el) => el.remove());
+}
+
+document.addEventListener('click', (event) => {
+  const add = event.target.closest('[data-cart-add]');
+  if (add) {
+    event.preventDefault();
+    shopApi(add.dataset.cartAdd).then((data) => {
+      updateCartSummary(data);
+      if (typeof showCartToast === 'function') showCartToast('Added to cart!');
+    });
+    return;
+  }
+
+  const heart = event.target.closest('[data-wishlist-toggle]');
+  if (heart) {
+    event.preventDefault();
+    shopApi(heart.dataset.wishlistToggle).then((data) => {
+      heart.classList.toggle('active', data.wishlisted);
+      if (!data.wishlisted && heart.hasAttribute('data-remove-card')) {
+        const card = heart.closest('[data-wishlist-card]');
+        if (card) card.remove();
+      }
+    });
+    return;
+  }
+
+  const remove = event.target.closest('[data-cart-remove]');
+  if (remove) {
+    event.preventDefault();
+    shopApi(remove.dataset.cartRemove).then((data) => {
+      removeCartRows(data.item_id);
+      updateCartSummary(data);
+    });
+  }
+});
+
+document.addEventListener('change', (event) => {
+  const input = event.target.closest('[data-cart-quantity]');
+  if (!input) return;
+  shopApi(input.dataset.cartQuantity, { quantity: input.value }).then((data) => {
+    if (data.quantity === 0) {
+      removeCartRows(data.item_id);
+    } else {
+      document.querySelectorAll('[data-cart-row="' + data.item_id + '"] [data-line-total], [data-summary-row="' + data.item_id + '"] [data-line-total]')
+        .forEach((el) => { el.textContent = formatMoney(data.line_total); });
+      document.querySelectorAll('[data-summary-row="' + data.item_id + '"] [data-summary-quantity]')
+        .forEach((el) => { el.textContent = data.quantity; });
+    }
+    updateCartSummary(data);
+  });
+});
+
+// ================= Order history: items load on expand =================
+// 'toggle' doesn't bubble, hence the capture listener.
+document.addEventListener('toggle', (event) => {
+  const order = event.target;
+  if (!order.open || !order.dataset || !order.dataset.orderItems || order.dataset.loaded) return;
+  order.dataset.loaded = '1';
+  fetch(order.dataset.orderItems, { credentials: 'same-origin' })
+    .then((response) => {
+      if (!response.ok) throw new Error('request failed: ' + response.status);
+      return response.text();
+    })
+    .then((html) => { order.querySelector('[data-order-lines]').innerHTML = html; })
+    .catch(() => { delete order.dataset.loaded; });
+}, true);
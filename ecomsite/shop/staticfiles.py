@@ -0,0 +1,208 @@
+"""
+Static asset build and serving.
+
+``collectstatic`` with ``ShopStaticFilesStorage``:
+
+* content-hashes every file name (``ManifestStaticFilesStorage``), so a
+  URL never changes meaning and can be cached forever;
+* minifies CSS and JS as they are written (``minify_css`` / ``minify_js``
+  are deliberately conservative: comments and whitespace only);
+* writes ``.gz`` and, when the optional ``brotli`` package is installed,
+  ``.br`` siblings of every compressible file.
+
+``serve`` hands those files out with the best encoding the client accepts
+and ``Cache-Control: immutable`` for hashed names. Before a build exists
+(development, tests) ``{% static %}`` keeps returning plain names.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.functional import cached_property
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:   # optional: gzip only
+    brotli = None
+
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map")
+
+# Smaller than this, the compressed sibling isn't worth a file.
+MIN_COMPRESS_SIZE = 256
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+
+# ==========================
+# MINIFICATION
+# ==========================
+_CSS_STRING = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+
+
+def minify_css(source):
+    """Drop comments and redundant whitespace; strings are left untouched."""
+    parts = _CSS_STRING.split(_CSS_COMMENT.sub("", source))
+    for index in range(0, len(parts), 2):   # even slots are outside strings
+        code = re.sub(r"\s+", " ", parts[index])
+        code = re.sub(r"\s*([{};,>])\s*", r"\1", code)
+        code = re.sub(r":\s+", ":", code)
+        # Space before ":" only inside declaration blocks ("a :hover" is a selector).
+        # (A block can be cut short by a string, hence the ^ and $.)
+        code = re.sub(r"(?:^|\{)[^{}]*(?:\}|$)", lambda block: re.sub(r"\s+:", ":", block.group()), code)
+        parts[index] = code.replace(";}", "}")
+    return "".join(parts).strip()
+
+
+# A "/" after one of these starts a regex literal, not a division.
+_JS_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^\n")
+
+
+def minify_js(source):
+    """
+    Drop comments, indentation and blank lines. Line breaks are kept so
+    automatic semicolon insertion behaves exactly as before.
+    """
+    out = []
+    i, length = 0, len(source)
+    last = "\n"   # last significant character emitted
+    while i < length:
+        char = source[i]
+        pair = source[i:i + 2]
+        if pair == "//":
+            i = source.find("\n", i)
+            i = length if i == -1 else i
+            continue
+        if pair == "/*":
+            end = source.find("*/", i + 2)
+            i = length if end == -1 else end + 2
+            out.append(" ")
+            continue
+        if char in "'\"`" or (char == "/" and last in _JS_REGEX_PRECEDERS):
+            start, i = i, i + 1
+            in_class = False
+            while i < length:
+                if source[i] == "\\":
+                    i += 2
+                    continue
+                if char == "/" and source[i] == "[":
+                    in_class = True
+                elif char == "/" and source[i] == "]":
+                    in_class = False
+                elif source[i] == char and not in_class:
+                    break
+                i += 1
+            i += 1
+            out.append(source[start:i])
+            last = char
+            continue
+        out.append(char)
+        if not char.isspace():
+            last = char
+        i += 1
+
+    lines = (line.strip() for line in "".join(out).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+# ==========================
+# STORAGE
+# ==========================
+class ShopStaticFilesStorage(ManifestStaticFilesStorage):
+
+    @cached_property
+    def immutable_names(self):
+        """Collected names that carry a content hash."""
+        return frozenset(self.hashed_files.values())
+
+    def stored_name(self, name):
+        # Names missing from the manifest (nothing collected yet, or a file
+        # added since the last build) stay plain instead of raising.
+        hashed_name = self.hashed_files.get(self.hash_key(self.clean_name(name)))
+        return name if hashed_name is None else hashed_name
+
+    def _save(self, name, content):
+        minify = MINIFIERS.get(os.path.splitext(name)[1])
+        if minify is not None and not name.endswith((".min.css", ".min.js")):
+            content.seek(0)
+            content = ContentFile(minify(content.read().decode()).encode())
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            if name.endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as handle:
+            data = handle.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        siblings = {".gz": gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            siblings[".br"] = brotli.compress(data, quality=11)
+        for suffix, compressed in siblings.items():
+            if len(compressed) < len(data):
+                path = self.path(name + suffix)
+                with open(path, "wb") as handle:
+                    handle.write(compressed)
+
+
+# ==========================
+# SERVING
+# ==========================
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _accepted(request):
+    header = request.headers.get("Accept-Encoding", "")
+    return {token.split(";")[0].strip() for token in header.split(",")}
+
+
+def serve(request, path):
+    """Serve a collected file, precompressed when possible."""
+    path = posixpath.normpath(path).lstrip("/")
+    try:
+        fullpath = safe_join(staticfiles_storage.location, path)
+    except ValueError:
+        raise Http404(path)
+    if not os.path.isfile(fullpath) or fullpath.endswith((".gz", ".br")):
+        raise Http404(path)
+
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    immutable = path in staticfiles_storage.immutable_names
+    content_type, _ = mimetypes.guess_type(fullpath)
+
+    served, encoding = fullpath, None
+    accepted = _accepted(request)
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(fullpath + suffix):
+            served, encoding = fullpath + suffix, name
+            break
+
+    response = FileResponse(open(served, "rb"), content_type=content_type or "application/octet-stream")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Last-Modified"] = http_date(stat.st_mtime)
+    response.headers["Cache-Control"] = IMMUTABLE if immutable else REVALIDATE
+    return response
@@ -0,0 +1,50 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from shop.images import VARIANTS
+
+
+register = template.Library()
+
+
+def _srcset(variants, ext):
+    return ", ".join(
+        f"{default_storage.url(files[ext])} {files['width']}w"
+        for files in sorted(variants.values(), key=lambda files: files["width"])
+    )
+
+
+def _original_url(product):
+    if product.image:
+        return product.image.url
+    if product.image_url:
+        return product.image_url
+    return static("shop/no-image.svg")
+
+
+@register.simple_tag
+def product_picture(product, variant="card", sizes="100vw", alt=None, loading="lazy"):
+    """
+    ``<picture>`` for ``product`` with WebP and JPEG ``srcset`` over every
+    rendered size; ``variant`` picks the fallback ``src``. Falls back to the
+    original image (or URL) until variants exist.
+
+        {% product_picture product "thumb" sizes="80px" %}
+    """
+    alt = product.title if alt is None else alt
+    variants = product.image_variants.get("variants")
+    if not variants:
+        return format_html('<img src="{}" alt="{}" loading="{}" />', _original_url(product), alt, loading)
+
+    default = variants.get(variant) or variants[max(variants, key=lambda name: VARIANTS.get(name, 0))]
+    return format_html(
+        '<picture class="product-picture">'
+        '<source type="image/webp" srcset="{}" sizes="{}" />'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="{}" />'
+        "</picture>",
+        _srcset(variants, "webp"), sizes,
+        default_storage.url(default["jpeg"]), _srcset(variants, "jpeg"), sizes,
+        default["width"], default["height"], alt, loading,
+    )
@@ -1,3 +1,1605 @@
-from django.test import TestCase
+import gzip
+import csv
+import io
+import unittest
+import unittest.mock
+import json
+from datetime import date, datetime, timezone as dt_timezone
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse, QueryDict
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.http import http_date
+from PIL import Image
+
+from benchmarks import dataset, suite
+
+from . import (
+    catalog_import, checkout, copurchase, fragments, images, metrics, order_codes, order_export,
+    order_history, pagination, remote_images, replication, routers, search, signals, staticfiles, views,
+    wishlist_cache,
+)
+from .cart import remove_item, set_quantity
+from .category_tree import get_category_tree
+from .models import (
+    Cart, CartItem, Category, CoPurchase, Order, OrderCodeBlock, OrderItem, Products, SubCategory, Wishlist,
+)
+from .pagination import KeysetPaginator
+from .versions import CATALOG, bump_version, get_version
+
+
+class ShopTestCase(TestCase):
+    """Cache state outlives the per-test rollback, so start each test cold."""
+
+    def setUp(self):
+        cache.clear()
+
+
+def make_product(title, description="", **kwargs):
+    return Products.objects.create(
+        title=title, description=description, price=kwargs.pop("price", 10.0), **kwargs
+    )
+
+
+# ==========================
+# SEARCH
+# ==========================
+class ProductSearchTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(name="Phones")
+        cls.laptop = make_product("Gaming Laptop", "Fast machine with a big screen")
+        cls.bag = make_product("Canvas Bag", "Fits any laptop up to 15 inches")
+        cls.phone = make_product("Smartphone", "Pocket sized", category=cls.phones)
+
+    def search(self, query, queryset=None):
+        queryset = Products.objects.all() if queryset is None else queryset
+        return list(search.search_products(queryset, query))
+
+    def test_matches_title_and_description_title_first(self):
+        self.assertEqual(self.search("laptop"), [self.laptop, self.bag])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search("smart"), [self.phone])
+
+    def test_combines_with_category_filter(self):
+        queryset = Products.objects.filter(category=self.phones)
+        self.assertEqual(self.search("pocket", queryset), [self.phone])
+        self.assertEqual(self.search("laptop", queryset), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.laptop.title = "Workstation"
+        self.laptop.save()
+        self.assertEqual(self.search("workstation"), [self.laptop])
+
+        self.bag.delete()
+        self.assertEqual(self.search("canvas"), [])
+
+    def test_typo_tolerance(self):
+        if not search.fts5_available():
+            self.skipTest("typo correction needs the FTS5 index")
+        self.assertEqual(self.search("smartphnoe"), [self.phone])
+
+    def test_punctuation_only_query_is_ignored(self):
+        self.assertEqual(len(self.search('"*)')), 3)
+
+    def test_index_view_uses_search(self):
+        response = self.client.get(reverse("index"), {"item_name": "laptop"})
+        self.assertEqual(list(response.context["product_objects"]), [self.laptop, self.bag])
+
+    @override_settings(SHOP_SEARCH_BACKEND="basic")
+    def test_basic_backend_fallback(self):
+        self.assertFalse(search.fts5_available())
+        self.assertEqual(self.search("laptop"), [self.laptop, self.bag])
+        self.assertEqual(self.search("smart"), [self.phone])
+
+
+# ==========================
+# PAGINATION
+# ==========================
+class KeysetPaginationTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [make_product(f"Item {n}") for n in range(25)]
+
+    def test_walks_forward_and_back_without_gaps(self):
+        paginator = KeysetPaginator(Products.objects.all(), 10, count_key="all")
+        newest_first = sorted(self.products, key=lambda p: (p.created_at, p.id), reverse=True)
+
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([p for page in pages for p in page], newest_first)
+        self.assertFalse(pages[0].has_previous())
+
+        back = paginator.get_page(pages[2].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        back = paginator.get_page(back.previous_cursor)
+        self.assertEqual(list(back), list(pages[0]))
+        self.assertFalse(back.has_previous())
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Products.objects.all(), 10, count_key="all")
+        self.assertEqual(list(paginator.get_page("not-a-cursor")), list(paginator.get_page()))
+
+    def test_index_pages_with_cursor_and_caches_count(self):
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "25 products")
+        cursor = response.context["product_objects"].next_cursor
+
+        # Just the keyset query: the count and the sidebar come from the cache.
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("index"), {"cursor": cursor})
+        self.assertEqual(len(response.context["product_objects"]), 10)
+
+    def test_legacy_page_links_still_work(self):
+        response = self.client.get(reverse("index"), {"page": 3})
+        page = response.context["product_objects"]
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 5)
+
+
+# ==========================
+# CATEGORY TREE
+# ==========================
+class CategoryTreeTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fashion = Category.objects.create(name="Fashion")
+        cls.men = SubCategory.objects.create(name="Men", category=cls.fashion)
+        make_product("Shirt", category=cls.fashion, subcategory=cls.men)
+        make_product("Scarf", category=cls.fashion)
+
+    def test_snapshot_contents(self):
+        tree = get_category_tree()
+        node = tree.category(self.fashion.id)
+        self.assertEqual((node.name, node.product_count), ("Fashion", 2))
+        self.assertEqual(node.subcategories, (tree.subcategory(self.men.id),))
+        self.assertEqual(tree.subcategory(self.men.id).product_count, 1)
+
+    def test_cached_until_invalidated(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            tree = get_category_tree()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SubCategory.objects.create(name="Women", category=self.fashion)
+            # Not before commit: a reader now would re-cache the old rows.
+            self.assertEqual(get_category_tree().version, tree.version)
+        with self.assertNumQueries(2):
+            fresh = get_category_tree()
+        self.assertGreater(fresh.version, tree.version)
+        self.assertEqual(len(fresh.category(self.fashion.id).subcategories), 2)
+
+    @unittest.skipIf(settings.SHOP_CACHE_BACKEND == "locmem", "per-process cache")
+    def test_bump_from_another_process_is_seen(self):
+        tree = get_category_tree()
+        # e.g. import_catalog, or a category edit handled by another worker
+        subprocess.run(
+            [sys.executable, "-c", "import django; django.setup(); from shop import category_tree; category_tree.invalidate()"],
+            cwd=settings.BASE_DIR, env=os.environ | {"DJANGO_SETTINGS_MODULE": "ecomsite.settings"}, check=True,
+        )
+        self.assertGreater(get_category_tree().version, tree.version)
+
+    def test_product_changes_refresh_counts(self):
+        get_category_tree()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product("Hat", category=self.fashion)
+        self.assertEqual(get_category_tree().category(self.fashion.id).product_count, 3)
+
+    def test_index_sidebar(self):
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, f'href="?subcategory={self.men.id}"')
+
+
+# ==========================
+# PRODUCT GRID FRAGMENTS
+# ==========================
+class ProductGridCacheTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lamp = make_product("Desk Lamp")
+        cls.user = User.objects.create_user("alice", password="pw")
+
+    def test_params_are_normalized(self):
+        a = fragments.grid_params(QueryDict("item_name=Desk%20%20LAMP&utm_source=x"))
+        b = fragments.grid_params(QueryDict("item_name=desk+lamp"))
+        self.assertEqual(fragments.grid_cache_key(a), fragments.grid_cache_key(b))
+
+    def test_grid_is_shared_across_users(self):
+        self.client.get(reverse("index"))
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("index"))
+        self.assertContains(response, "Desk Lamp")
+        listing = [q for q in queries if q["sql"].startswith('SELECT "shop_products"."id", "shop_products"."title"')]
+        self.assertEqual(listing, [])
+        self.assertEqual(fragments.stats()["hits"], 1)
+        self.assertEqual(fragments.stats()["misses"], 1)
+
+    def test_product_change_invalidates_grid(self):
+        self.client.get(reverse("index"))
+        self.lamp.title = "Floor Lamp"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lamp.save()
+            # Not before commit: a grid built now must not carry the new version.
+            self.assertEqual(fragments.stats()["misses"], 1)
+            self.client.get(reverse("index"))
+            self.assertEqual(fragments.stats()["misses"], 1)
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "Floor Lamp")
+        self.assertEqual(fragments.stats()["misses"], 2)
+
+
+# ==========================
+# READ-ONLY PAGE VIEWS
+# ==========================
+class ReadOnlyViewTests(ShopTestCase):
+
+    WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+    @classmethod
+    def setUpTestData(cls):
+        make_product("Desk Lamp")
+        cls.user = User.objects.create_user("alice", password="pw")
+
+    def assertNoWrites(self, *paths):
+        for path in paths:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path)
+            self.assertIn(response.status_code, (200, 302))
+            writes = [q["sql"] for q in queries if q["sql"].lstrip().upper().startswith(self.WRITE_PREFIXES)]
+            self.assertEqual(writes, [], path)
+
+    def test_anonymous_gets_do_not_write(self):
+        self.assertNoWrites("/", "/cart/", "/profile/")
+
+    def test_logged_in_gets_do_not_write(self):
+        self.client.force_login(self.user)
+        self.assertNoWrites("/", "/cart/", "/profile/")
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertFalse(Wishlist.objects.filter(user=self.user).exists())
+
+    def test_rows_created_on_first_mutation(self):
+        self.client.force_login(self.user)
+        product = Products.objects.get()
+        self.client.get(reverse("add_to_cart", args=[product.id]))
+        self.client.get(reverse("toggle_wishlist", args=[product.id]))
+        self.assertEqual(self.user.cart.total_items, 1)
+        self.assertContains(self.client.get("/profile/"), "Desk Lamp")
+
+
+class AsyncReadViewTests(ShopTestCase):
+    """index, details and profile are async views (served natively under ASGI)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lamp = make_product("Desk Lamp")
+        cls.user = User.objects.create_user("alice", password="pw")
+        Wishlist.objects.create(user=cls.user).products.add(cls.lamp)
+
+    async def test_index_and_details(self):
+        client = AsyncClient()
+        response = await client.get("/")
+        self.assertContains(response, "Desk Lamp")
+        response = await client.get(f"/{self.lamp.id}/")
+        self.assertContains(response, "Desk Lamp")
+        response = await client.get("/999999/")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_logged_in_reads(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get("/")
+        self.assertEqual(response.context["wishlist_ids"], [self.lamp.id])
+        response = await client.get("/profile/")
+        self.assertContains(response, "alice")
+        self.assertContains(response, "Desk Lamp")
+
+    async def test_profile_requires_login(self):
+        response = await AsyncClient().get("/profile/")
+        self.assertEqual(response.status_code, 302)
+
+
+class ConditionalGetTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lamp = make_product("Desk Lamp")
+        cls.user = User.objects.create_user("alice", password="pw")
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_details_answers_304_until_the_product_changes(self):
+        client = Client()
+        url = f"/{self.lamp.id}/"
+        first = client.get(url)
+        self.assertIn("public", first["Cache-Control"])
+        self.assertIn("s-maxage", first["Cache-Control"])
+        self.assertEqual(first["Last-Modified"], http_date(self.lamp.updated_at.timestamp()))
+
+        with self.assertNumQueries(2):   # the product and its bought-together row
+            again = self.revalidate(client, url, first)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+
+        self.lamp.price = 12
+        self.lamp.save()
+        self.assertEqual(self.revalidate(client, url, first).status_code, 200)
+
+    def test_listing_answers_304_until_the_catalog_changes(self):
+        client = Client()
+        first = client.get("/")
+        self.assertEqual(self.revalidate(client, "/", first).status_code, 304)
+        self.assertEqual(self.revalidate(client, "/?category=1", first).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product("Chair")
+        self.assertEqual(self.revalidate(client, "/", first).status_code, 200)
+
+    def test_members_get_private_pages_of_their_own(self):
+        anonymous = Client().get("/")
+        self.assertNotContains(anonymous, 'name="csrf-token"')
+
+        client = Client()
+        client.force_login(self.user)
+        page = client.get("/")
+        self.assertContains(page, 'name="csrf-token"')
+        self.assertEqual(page["Cache-Control"], "private, no-cache")
+        self.assertNotEqual(page["ETag"], anonymous["ETag"])
+        self.assertEqual(self.revalidate(client, "/", anonymous).status_code, 200)
+        self.assertEqual(self.revalidate(client, "/", page).status_code, 304)
+
+        # Hearting a product on the page changes it.
+        with self.captureOnCommitCallbacks(execute=True):
+            Wishlist.objects.create(user=self.user).products.add(self.lamp)
+        self.assertEqual(self.revalidate(client, "/", page).status_code, 200)
+
+    def test_flash_messages_are_never_served_stale(self):
+        client = Client()
+        client.force_login(self.user)
+        page = client.get(f"/{self.lamp.id}/")
+        response = client.get(f"/add-to-cart/{self.lamp.id}/", HTTP_REFERER=f"/{self.lamp.id}/")
+        response = client.get(response["Location"], HTTP_IF_NONE_MATCH=page["ETag"])
+        self.assertContains(response, "Desk Lamp added to cart!")
+        self.assertNotIn("ETag", response)
+
+
+# ==========================
+# WISHLIST MEMBERSHIP CACHE
+# ==========================
+class WishlistCacheTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [make_product(f"Item {n}") for n in range(4)]
+        cls.user = User.objects.create_user("alice", password="pw")
+        cls.wishlist = Wishlist.objects.create(user=cls.user)
+        cls.wishlist.products.add(cls.products[0], cls.products[2])
+
+    def ids(self, *indexes):
+        return [self.products[i].id for i in indexes]
+
+    def test_intersects_with_page(self):
+        self.assertEqual(
+            wishlist_cache.wishlisted_among(self.user.id, self.ids(0, 1, 2)),
+            self.ids(0, 2),
+        )
+        with self.assertNumQueries(0):
+            wishlist_cache.wishlisted_among(self.user.id, self.ids(3, 2))
+
+    def test_toggle_updates_cache_in_place(self):
+        wishlist_cache.wishlist_ids(self.user.id)
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("toggle_wishlist", args=[self.products[1].id]))
+            self.client.get(reverse("toggle_wishlist", args=[self.products[0].id]))
+            # Not before commit: the old set stays until the patches run.
+            self.assertEqual(wishlist_cache.wishlisted_among(self.user.id, self.ids(0, 1)), self.ids(0))
+        with self.assertNumQueries(0):
+            ids = wishlist_cache.wishlisted_among(self.user.id, self.ids(0, 1, 2, 3))
+        self.assertEqual(ids, self.ids(1, 2))
+
+    def test_index_sends_only_page_ids(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("index"))
+        self.assertEqual(sorted(response.context["wishlist_ids"]), self.ids(0, 2))
+
+
+# ==========================
+# CART AGGREGATES
+# ==========================
+class CartTotalsTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pen = make_product("Pen", price=2.5)
+        cls.book = make_product("Book", price=10.0)
+        cls.user = User.objects.create_user("alice", password="pw")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def cart(self):
+        return Cart.objects.get(user=self.user)
+
+    def test_add_and_delete_maintain_totals(self):
+        for product in (self.pen, self.pen, self.book):
+            self.client.get(reverse("add_to_cart", args=[product.id]))
+        cart = self.cart()
+        self.assertEqual((cart.total_items, cart.total_price), (2, 15.0))
+        self.assertContains(self.client.get(reverse("cart")), "$15.00")
+
+        pen_line = cart.items.get(product=self.pen)
+        self.assertEqual(pen_line.quantity, 2)
+        self.client.get(reverse("delete_cart_item", args=[pen_line.id]))
+        cart = self.cart()
+        self.assertEqual((cart.total_items, cart.total_price), (1, 10.0))
+
+    def test_removing_a_line_twice_changes_totals_once(self):
+        self.client.get(reverse("add_to_cart", args=[self.pen.id]))
+        line = self.cart().items.get()
+        stale = CartItem.objects.get(pk=line.pk)   # the same line, open in a second tab
+        self.assertTrue(remove_item(line))
+        self.assertFalse(remove_item(stale))
+        self.assertFalse(set_quantity(stale, 3))
+        self.assertEqual((self.cart().item_count, self.cart().subtotal), (0, 0))
+
+    def test_set_quantity_uses_the_stored_quantity(self):
+        self.client.get(reverse("add_to_cart", args=[self.pen.id]))
+        stale = self.cart().items.get()   # quantity 1
+        self.client.get(reverse("add_to_cart", args=[self.pen.id]))   # now 2
+        set_quantity(stale, 4)
+        self.assertEqual((self.cart().item_count, self.cart().subtotal), (1, 10.0))
+
+    def test_properties_read_stored_values(self):
+        self.client.get(reverse("add_to_cart", args=[self.book.id]))
+        cart = self.cart()
+        with self.assertNumQueries(0):
+            self.assertEqual((cart.total_items, cart.total_price), (1, 10.0))
+
+    def test_recompute_command_repairs_drift(self):
+        self.client.get(reverse("add_to_cart", args=[self.book.id]))
+        CartItem.objects.filter(cart__user=self.user).update(quantity=3)
+        Cart.objects.update(item_count=7, subtotal=-1)
+        empty = Cart.objects.create(user=User.objects.create_user("bob"), item_count=4)
+
+        call_command("recompute_cart_totals", stdout=StringIO())
+        cart = self.cart()
+        self.assertEqual((cart.item_count, cart.subtotal), (1, 30.0))
+        empty.refresh_from_db()
+        self.assertEqual((empty.item_count, empty.subtotal), (0, 0))
+
+
+# ==========================
+# ORDER CODES
+# ==========================
+class OrderCodeTests(ShopTestCase):
+
+    def test_feistel_is_a_bijection(self):
+        permutation = order_codes.FeistelPermutation(b"k", domain=1000)
+        outputs = [permutation.permute(n) for n in range(1000)]
+        self.assertEqual(sorted(outputs), list(range(1000)))
+        self.assertNotEqual(outputs[:10], list(range(10)))
+        self.assertEqual([permutation.invert(n) for n in outputs], list(range(1000)))
+
+    def test_encode_round_trip(self):
+        for number in (0, 1, 12345, order_codes.CODE_SPACE - 1):
+            code = order_codes.encode(number)
+            self.assertRegex(code, r"^#ORD-[A-Z0-9]{5}$")
+            self.assertEqual(order_codes.decode(code), number)
+
+    def test_allocator_claims_blocks_and_never_probes(self):
+        allocator = order_codes.OrderCodeAllocator(key=b"test", block_size=10)
+        with CaptureQueriesContext(connection) as queries:
+            codes = {allocator.next_code() for _ in range(25)}
+        self.assertEqual(len(codes), 25)
+        self.assertEqual(OrderCodeBlock.objects.count(), 3)
+        self.assertFalse(any('"shop_order"' in q["sql"] for q in queries))
+
+    def test_save_retries_on_code_collision(self):
+        user = User.objects.create_user("alice")
+        allocator = order_codes.get_allocator()
+        allocator.discard_block()
+        # This process claims a block in a transaction that rolls back but
+        # keeps handing out its codes; another process then claims the same
+        # block and uses them first.
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            allocator.next_code()
+            raise RuntimeError("rolled back")
+        other = order_codes.OrderCodeAllocator()
+        taken = [other.next_code() for _ in range(2)]
+        for code in taken:
+            Order.objects.create(user=user, total=1, order_code=code)
+
+        order = Order.objects.create(user=user, total=2)
+        self.assertNotIn(order.order_code, taken)
+        self.assertEqual(Order.objects.count(), 3)
+        # The colliding block was dropped for a fresh one.
+        self.assertEqual(OrderCodeBlock.objects.count(), 2)
+
+
+# ==========================
+# CHECKOUT
+# ==========================
+class CheckoutTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pen = make_product("Pen", price=2.5)
+        cls.book = make_product("Book", price=10.0)
+        cls.user = User.objects.create_user("alice", password="pw")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        for product in (self.pen, self.pen, self.book):
+            self.client.get(reverse("add_to_cart", args=[product.id]))
+
+    def test_places_order_and_clears_cart(self):
+        response = self.client.post(reverse("place_order"))
+        order = Order.objects.get(user=self.user)
+        self.assertRedirects(response, reverse("order_success", args=[order.order_code]))
+        self.assertEqual(order.total, 15.0)
+        self.assertEqual(
+            sorted(order.items.values_list("product_name", "quantity")),
+            [("Book", 1), ("Pen", 2)],
+        )
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual((cart.items.count(), cart.item_count, cart.subtotal), (0, 0, 0))
+
+    def test_pipeline_statement_count(self):
+        order_codes.get_allocator().next_code()  # keep block claims out of the count
+        with CaptureQueriesContext(connection) as queries:
+            checkout.place_order_from_cart(self.user)
+        statements = [q["sql"].split()[0] for q in queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(statements, ["UPDATE", "SELECT", "INSERT", "INSERT", "DELETE"])
+
+    def test_double_submit_places_one_order(self):
+        first = self.client.post(reverse("place_order"))
+        second = self.client.post(reverse("place_order"))
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(first["Location"], second["Location"])
+
+    def test_get_is_not_allowed(self):
+        self.assertEqual(self.client.get(reverse("place_order")).status_code, 405)
+        self.assertFalse(Order.objects.exists())
+
+
+# ==========================
+# FREQUENTLY BOUGHT TOGETHER
+# ==========================
+class CoPurchaseTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice", password="pw")
+        cls.pen, cls.ink, cls.pad, cls.lamp = (make_product(title) for title in ("Pen", "Ink", "Pad", "Lamp"))
+
+    def order(self, *products):
+        order = Order.objects.create(user=self.user, total=0)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, product_name=product.title, price=1, quantity=1)
+            for product in products
+        ])
+        return order
+
+    def pairs(self, product):
+        return list(CoPurchase.objects.filter(product=product).order_by("-orders", "related_id")
+                    .values_list("related__title", "orders"))
+
+    def test_rebuild_counts_pairs_per_product(self):
+        self.order(self.pen, self.ink, self.pad)
+        self.order(self.pen, self.ink)
+        self.order(self.pen, self.pen)   # one distinct product: no pairs
+        self.assertEqual(copurchase.rebuild(workers=0), (2, 3, 6))
+        self.assertEqual(self.pairs(self.pen), [("Ink", 2), ("Pad", 1)])
+        self.assertEqual(self.pairs(self.pad), [("Pen", 1), ("Ink", 1)])
+
+    def test_process_pool_matches_inline_count(self):
+        for n in range(12):
+            self.order(*[self.pen, self.ink, self.pad, self.lamp][: 2 + n % 3])
+        copurchase.rebuild(workers=0)
+        inline = sorted(CoPurchase.objects.values_list("product_id", "related_id", "orders"))
+        copurchase.rebuild(workers=2, chunk_size=5)
+        self.assertEqual(sorted(CoPurchase.objects.values_list("product_id", "related_id", "orders")), inline)
+
+    @override_settings(SHOP_COPURCHASE_KEEP=1, SHOP_COPURCHASE_MAX_BASKET=3)
+    def test_limits(self):
+        self.order(self.pen, self.ink, self.pad, self.lamp)   # bulk buy: left out
+        self.order(self.pen, self.ink)
+        self.order(self.pen, self.pad)
+        self.order(self.pen, self.pad)
+        copurchase.rebuild(workers=0)
+        self.assertEqual(self.pairs(self.pen), [("Pad", 2)])
+
+        copurchase.record_order(self.order(self.pen, self.lamp).id)
+        self.assertEqual(self.pairs(self.pen), [("Pad", 2)])
+        self.assertEqual(self.pairs(self.lamp), [("Pen", 1)])
+
+    def test_checkout_counts_the_order_once_committed(self):
+        self.client.force_login(self.user)
+        for placed in (1, 2):
+            for product in (self.pen, self.ink):
+                self.client.get(reverse("add_to_cart", args=[product.id]))
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                order = checkout.place_order_from_cart(self.user)
+                self.assertFalse(CoPurchase.objects.filter(orders=placed).exists())   # not before commit
+            self.assertEqual(len(callbacks), 1)
+            self.assertEqual(self.pairs(self.pen), [("Ink", placed)])
+            self.assertEqual(self.pairs(self.ink), [("Pen", placed)])
+
+        self.assertEqual(set(order.items.values_list("product_id", flat=True)), {self.pen.id, self.ink.id})
+
+    def test_hook_running_after_a_rebuild_is_skipped(self):
+        counted = self.order(self.pen, self.ink)
+        copurchase.rebuild(workers=0)
+        cache.clear()   # the hook runs in a web worker, not the build command
+        copurchase.record_order(counted.id)   # on_commit hook landing late
+        self.assertEqual(self.pairs(self.pen), [("Ink", 1)])
+
+        copurchase.record_order(self.order(self.pen, self.ink).id)
+        self.assertEqual(self.pairs(self.pen), [("Ink", 2)])
+
+    def test_details_page_shows_bought_together(self):
+        self.order(self.pen, self.ink)
+        copurchase.rebuild(workers=0)
+        response = self.client.get(f"/{self.pen.id}/")
+        self.assertContains(response, 'class="bought-together glass-card"')
+        self.assertContains(response, f'href="/{self.ink.id}/"')
+        self.assertNotContains(self.client.get(f"/{self.lamp.id}/"), 'class="bought-together glass-card"')
+
+
+# ==========================
+# JSON API
+# ==========================
+class CartApiTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pen = make_product("Pen", price=2.5)
+        cls.user = User.objects.create_user("alice", password="pw")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_add_set_quantity_remove(self):
+        response = self.client.post(reverse("api_cart_add", args=[self.pen.id]))
+        self.assertEqual(response.templates, [])
+        self.assertEqual(response.json()["item_count"], 1)
+        data = self.client.post(reverse("api_cart_add", args=[self.pen.id])).json()
+        self.assertEqual((data["item_count"], data["subtotal"], data["quantity"]), (1, 5.0, 2))
+
+        item = CartItem.objects.get()
+        data = self.client.post(
+            reverse("api_cart_set_quantity", args=[item.id]), {"quantity": 4}
+        ).json()
+        self.assertEqual((data["item_id"], data["subtotal"], data["line_total"]), (item.id, 10.0, 10.0))
+
+        data = self.client.post(reverse("api_cart_remove", args=[item.id])).json()
+        self.assertEqual((data["item_id"], data["item_count"], data["subtotal"]), (item.id, 0, 0))
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_set_quantity_to_zero_reports_the_removed_line(self):
+        self.client.post(reverse("api_cart_add", args=[self.pen.id]))
+        item = CartItem.objects.get()
+        data = self.client.post(reverse("api_cart_set_quantity", args=[item.id]), {"quantity": 0}).json()
+        self.assertEqual((data["item_id"], data["quantity"], data["item_count"]), (item.id, 0, 0))
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_bad_quantity_and_foreign_items(self):
+        self.client.post(reverse("api_cart_add", args=[self.pen.id]))
+        item = CartItem.objects.get()
+        url = reverse("api_cart_set_quantity", args=[item.id])
+        self.assertEqual(self.client.post(url, {"quantity": "lots"}).status_code, 400)
+        for quantity in (-1, 1000, 10 ** 20):
+            response = self.client.post(url, {"quantity": quantity})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("between 0 and 999", response.json()["error"])
+        self.assertEqual(Cart.objects.get().subtotal, 2.5)
+
+        self.client.force_login(User.objects.create_user("mallory"))
+        self.assertEqual(self.client.post(url, {"quantity": 1}).status_code, 404)
+
+    def test_header_badge_shows_the_stored_count(self):
+        empty = self.client.get("/")
+        self.assertContains(empty, '<span class="cart-badge" data-cart-count hidden></span>', html=True)
+        self.client.post(reverse("api_cart_add", args=[self.pen.id]))
+
+        badge = '<span class="cart-badge" data-cart-count>1</span>'
+        for path in ("/", f"/{self.pen.id}/", "/profile/", reverse("cart")):
+            self.assertContains(self.client.get(path), badge, html=True)
+        # A browser holding the empty-cart page must not get a 304.
+        self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=empty["ETag"]).status_code, 200)
+
+    def test_wishlist_toggle(self):
+        url = reverse("api_wishlist_toggle", args=[self.pen.id])
+        self.assertEqual(self.client.post(url).json(), {"product_id": self.pen.id, "wishlisted": True})
+        self.assertEqual(self.client.post(url).json()["wishlisted"], False)
+
+    def test_requires_post_login_and_csrf(self):
+        url = reverse("api_cart_add", args=[self.pen.id])
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+        self.assertEqual(Client().post(url).status_code, 401)
+
+        csrf_client = Client(enforce_csrf_checks=True)
+        csrf_client.force_login(self.user)
+        self.assertEqual(csrf_client.post(url).status_code, 403)
+
+
+# ==========================
+# IMAGE VARIANTS
+# ==========================
+def make_jpeg(size=(2000, 1000), color="teal"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+class TempMediaMixin:
+    """Give each test an empty MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+@override_settings(SHOP_IMAGE_WORKERS=0)
+class ImageVariantTests(TempMediaMixin, ShopTestCase):
+
+    def upload(self, title, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = make_product(title, image=SimpleUploadedFile(f"{title}.jpg", data))
+        product.refresh_from_db()
+        return product
+
+    def test_upload_renders_sized_variants(self):
+        product = self.upload("lamp", make_jpeg())
+        variants = product.image_variants["variants"]
+        self.assertEqual(product.image_variants["source"], product.image.name)
+        self.assertEqual(
+            {name: (files["width"], files["height"]) for name, files in variants.items()},
+            {"thumb": (160, 80), "card": (480, 240), "detail": (1200, 600)},
+        )
+        for files in variants.values():
+            self.assertTrue(default_storage.exists(files["webp"]))
+            self.assertTrue(default_storage.exists(files["jpeg"]))
+
+    def test_identical_uploads_share_one_render(self):
+        data = make_jpeg()
+        first = self.upload("lamp", data)
+        second = self.upload("lamp-copy", data)
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants["variants"], second.image_variants["variants"])
+
+    def test_picture_tag(self):
+        template = Template('{% load shop_images %}{% product_picture product "thumb" sizes="64px" %}')
+        plain = make_product("Linked", image_url="https://img.example/pen.jpg")
+        self.assertIn('src="https://img.example/pen.jpg"', template.render(Context({"product": plain})))
+
+        html = template.render(Context({"product": self.upload("lamp", make_jpeg())}))
+        self.assertIn('<source type="image/webp" srcset="/media/variants/', html)
+        self.assertIn("160w", html)
+        self.assertIn("1200w", html)
+        self.assertIn('sizes="64px"', html)
+        self.assertIn('width="160" height="80"', html)
+
+    def test_backfill_command(self):
+        product = self.upload("lamp", make_jpeg())
+        Products.objects.filter(pk=product.pk).update(image_variants={})
+        out = StringIO()
+        call_command("build_image_variants", workers=1, force=True, stdout=out)
+        self.assertIn("Built variants for 1 products (1 rendered", out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(set(product.image_variants["variants"]), set(images.VARIANTS))
+
+    def test_forced_rebuild_replaces_files_in_place(self):
+        product = self.upload("lamp", make_jpeg())
+        thumb = product.image_variants["variants"]["thumb"]["webp"]
+        directory = thumb.rsplit("/", 1)[0]
+        files_before = sorted(default_storage.listdir(directory)[1])
+        default_storage.delete(thumb)
+        default_storage.save(thumb, io.BytesIO(b"corrupt"))
+
+        call_command("build_image_variants", workers=1, force=True, stdout=StringIO())
+        self.assertEqual(sorted(default_storage.listdir(directory)[1]), files_before)   # no *_XXXX copies
+        with default_storage.open(thumb, "rb") as handle:
+            self.assertNotEqual(handle.read(), b"corrupt")
+
+
+# ==========================
+# REMOTE IMAGES
+# ==========================
+class ImageHost:
+    """Local HTTP stand-in for third-party image hosts: path -> (type, body)."""
+
+    def __init__(self, files, delay=0):
+        self.files = files
+        self.requests = []
+        self.active = self.peak = 0
+        lock = threading.Lock()
+        host = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with lock:
+                    host.requests.append(self.path)
+                    host.active += 1
+                    host.peak = max(host.peak, host.active)
+                time.sleep(delay)
+                with lock:
+                    host.active -= 1
+                if self.path not in host.files:
+                    self.send_error(404)
+                    return
+                content_type, body = host.files[self.path]
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(SHOP_IMAGE_WORKERS=0)
+class RemoteImageTests(TempMediaMixin, ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        photo = make_jpeg()
+        self.host = ImageHost({
+            "/a.jpg": ("image/jpeg", photo),
+            "/mirror/a.jpg": ("image/jpeg", photo),
+            "/page.html": ("text/html", b"<html></html>"),
+        })
+        self.addCleanup(self.host.close)
+
+    def linked(self, title, path):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = make_product(title, image_url=self.host.url(path))
+        product.refresh_from_db()
+        return product
+
+    def test_fetched_into_store_and_variants(self):
+        product = self.linked("lamp", "/a.jpg")
+        manifest = product.image_variants
+        self.assertEqual(manifest["source"], product.image_url)
+        self.assertEqual(set(manifest["variants"]), set(images.VARIANTS))
+        self.assertTrue(default_storage.exists(remote_images.original_name(manifest["digest"])))
+
+        html = Template("{% load shop_images %}{% product_picture p %}").render(Context({"p": product}))
+        self.assertIn("/media/variants/", html)
+        self.assertNotIn("127.0.0.1", html)
+
+    def test_same_bytes_stored_once_and_url_fetched_once(self):
+        first = self.linked("lamp", "/a.jpg")
+        second = self.linked("mirror", "/mirror/a.jpg")
+        third = self.linked("again", "/a.jpg")
+        self.assertEqual(first.image_variants["digest"], second.image_variants["digest"])
+        self.assertEqual(third.image_variants["variants"], first.image_variants["variants"])
+        self.assertEqual(self.host.requests, ["/a.jpg", "/mirror/a.jpg"])
+        _, originals = default_storage.listdir(f"{remote_images.ORIGINALS_ROOT}/{first.image_variants['digest'][:2]}")
+        self.assertEqual(len(originals), 1)
+
+    def test_failures_fall_back_to_url(self):
+        for path in ("/missing.jpg", "/page.html"):
+            with self.assertLogs("shop.remote_images", "WARNING"):
+                product = self.linked(path, path)
+            self.assertEqual(product.image_variants, {})
+            html = Template("{% load shop_images %}{% product_picture p %}").render(Context({"p": product}))
+            self.assertIn(f'src="{product.image_url}"', html)
+
+
+@override_settings(SHOP_IMAGE_WORKERS=0)
+class RemoteImageBackfillTests(TempMediaMixin, TransactionTestCase):
+
+    def test_downloads_are_bounded(self):
+        self.host = ImageHost(
+            {f"/{n}.jpg": ("image/jpeg", make_jpeg(color=(n, 0, 0))) for n in range(6)}, delay=0.1,
+        )
+        self.addCleanup(self.host.close)
+        Products.objects.bulk_create([
+            Products(title=f"p{n}", price=1, description="", image_url=self.host.url(f"/{n}.jpg"))
+            for n in range(6)
+        ])
+
+        out = StringIO()
+        call_command("fetch_remote_images", concurrency=2, workers=1, stdout=out)
+        self.assertIn("Ingested 6 of 6", out.getvalue())
+        self.assertEqual(self.host.peak, 2)
+        self.assertFalse(Products.objects.filter(image_variants={}).exists())
+
+
+# ==========================
+# STATIC BUILD
+# ==========================
+class StaticBuildTests(SimpleTestCase):
+
+    def test_minify_css(self):
+        css = '/* note */\n.a > .b ,\n.c {\n  color : red;\n  content: " a  b ";\n}\n'
+        self.assertEqual(staticfiles.minify_css(css), '.a>.b,.c{color:red;content:" a  b "}')
+
+    def test_minify_js_keeps_strings_regexes_and_lines(self):
+        js = (
+            "// header\n"
+            "const url = 'http://x/y';  // trailing\n"
+            "\n"
+            "    const re = /\\/\\/[/]/; /* block */ go(url);\n"
+        )
+        self.assertEqual(
+            staticfiles.minify_js(js),
+            "const url = 'http://x/y';\nconst re = /\\/\\/[/]/;   go(url);",
+        )
+
+    def test_collect_hash_compress_and_serve(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        with override_settings(STATIC_ROOT=static_root, DEBUG=False):
+            call_command("collectstatic", interactive=False, verbosity=0)
+
+            url = static("shop/css/background.css")
+            self.assertRegex(url, r"^/static/shop/css/background\.[0-9a-f]{12}\.css$")
+            self.assertNotIn("<style", Client().get(reverse("login")).content.decode())
+
+            response = Client().get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(response.headers["Cache-Control"], staticfiles.IMMUTABLE)
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+            body = gzip.decompress(b"".join(response.streaming_content)).decode()
+            self.assertNotIn("/*", body)
+
+            plain = Client().get("/static/shop/css/background.css")
+            self.assertEqual(plain.headers["Cache-Control"], staticfiles.REVALIDATE)
+            self.assertNotIn("Content-Encoding", plain.headers)
+            self.assertEqual(Client().get(url + ".gz").status_code, 404)
+
+
+# ==========================
+# CATALOG IMPORT
+# ==========================
+class CatalogImportTests(ShopTestCase):
+
+    CSV = (
+        "category,subcategory,sku,title,price,discount,description,image_url\n"
+        "Fashion,Men,,,,,,\n"
+        "Fashion,Men,SKU-1,Linen Shirt,30,5,Breathable linen,\n"
+        "Fashion,Women,SKU-2,Wool Scarf,20,,Warm wool,https://img.example/scarf.jpg\n"
+        "Home,,SKU-3,Desk Lamp,25,,Warm light,\n"
+        "Home,,SKU-4,Broken,not-a-price,,,\n"
+    )
+
+    def write(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f"{directory}/{name}"
+        with open(path, "w") as handle:
+            handle.write(content)
+        return path
+
+    def run_import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command("import_catalog", path, stdout=out, stderr=err, batch_size=2, chunk_size=2, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import(self):
+        out, err = self.run_import(self.write("catalog.csv", self.CSV))
+        self.assertIn("Imported 5 rows (3 products upserted, 1 skipped)", out)
+        self.assertIn("row 5: could not convert", err)
+
+        self.assertEqual(set(Category.objects.values_list("name", flat=True)), {"Fashion", "Home"})
+        self.assertEqual(SubCategory.objects.filter(category__name="Fashion").count(), 2)
+        shirt = Products.objects.get(sku="SKU-1")
+        self.assertEqual((shirt.price, shirt.discount, shirt.subcategory.name), (30.0, 5.0, "Men"))
+        self.assertEqual(Products.objects.get(sku="SKU-2").image_url, "https://img.example/scarf.jpg")
+        self.assertEqual(
+            list(search.search_products(Products.objects.all(), "linen").values_list("sku", flat=True)), ["SKU-1"]
+        )
+
+    def test_reimport_updates_in_place(self):
+        self.run_import(self.write("catalog.csv", self.CSV))
+        jsonl = "\n".join([
+            '{"category": "Fashion", "subcategory": "Men", "sku": "SKU-1", "title": "Linen Shirt", "price": 27}',
+            '{"category": "Outdoor", "sku": "SKU-9", "title": "Tent", "price": 120}',
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            self.run_import(self.write("update.jsonl", jsonl))
+        self.assertLess(len(queries), 15)
+        self.assertEqual(Products.objects.count(), 4)
+        self.assertEqual(Products.objects.get(sku="SKU-1").price, 27.0)
+        self.assertEqual(Products.objects.get(sku="SKU-9").category.name, "Outdoor")
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write("catalog.csv", self.CSV)
+        catalog_import.Checkpoint(path + ".checkpoint", path).save(2)
+        out, _ = self.run_import(path)
+        self.assertIn("Resuming after row 2", out)
+        self.assertFalse(Products.objects.filter(sku="SKU-1").exists())
+        self.assertTrue(Products.objects.filter(sku="SKU-2").exists())
+        self.assertFalse(os.path.exists(path + ".checkpoint"))
+
+        catalog_import.Checkpoint(path + ".checkpoint", path).save(2)
+        with open(path, "a") as handle:
+            handle.write("Home,,SKU-5,Rug,40,,,\n")
+        with self.assertRaisesMessage(CommandError, "--restart"):
+            self.run_import(path)
+        self.run_import(path, restart=True)
+        self.assertEqual(Products.objects.filter(sku__in=["SKU-1", "SKU-5"]).count(), 2)
+
+    def test_malformed_lines_are_named(self):
+        with self.assertRaisesMessage(CommandError, "line 3: ',' expected after '\"'"):
+            self.run_import(self.write("quote.csv", self.CSV.replace("Linen Shirt", '"Linen" Shirt')))
+        with self.assertRaisesMessage(CommandError, "line 2: Expecting"):
+            self.run_import(self.write("bad.jsonl", '{"sku": "SKU-1", "title": "Shirt"}\n{"sku": \n'), restart=True)
+
+    def test_seed_categories_file(self):
+        self.run_import(str(settings.BASE_DIR / "data" / "categories.csv"))
+        self.assertEqual(Category.objects.count(), 9)
+        self.assertEqual(SubCategory.objects.count(), 35)
+
+
+# ==========================
+# ORDER HISTORY
+# ==========================
+class OrderHistoryTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice", password="pw")
+        cls.other = User.objects.create_user("bob", password="pw")
+        cls.orders = []
+        for n in range(5):
+            order = Order.objects.create(user=cls.user, total=n)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_name=f"Item {n}-{k}", price=1, quantity=k + 1) for k in range(n + 1)
+            ])
+            cls.orders.append(order)
+        Order.objects.create(user=cls.other, total=99)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_profile_lists_orders_newest_first_with_counts(self):
+        response = self.client.get(reverse("profile"))
+        page = response.context["orders"]
+        self.assertEqual([order.pk for order in page], [order.pk for order in reversed(self.orders)])
+        self.assertEqual((page[0].line_count, page[0].item_quantity), (5, 15))
+        self.assertContains(response, "15 items")
+        self.assertNotContains(response, "Item 4-0")   # line items load on expand
+
+    @override_settings(SHOP_ORDER_HISTORY_PER_PAGE=2)
+    def test_keyset_pages_cost_the_same(self):
+        first = self.client.get(reverse("profile")).context["orders"]
+        with CaptureQueriesContext(connection) as on_first:
+            self.client.get(reverse("profile"))
+        with CaptureQueriesContext(connection) as on_next:
+            second = self.client.get(reverse("profile"), {"orders": first.next_cursor}).context["orders"]
+        self.assertEqual(len(on_first), len(on_next))
+        self.assertEqual([order.pk for order in second], [self.orders[2].pk, self.orders[1].pk])
+        back = self.client.get(reverse("profile"), {"orders": second.previous_cursor}).context["orders"]
+        self.assertEqual([order.pk for order in back], [order.pk for order in first])
+
+    def test_order_items_partial_and_fallback(self):
+        url = reverse("order_items", args=[self.orders[1].order_code])
+        partial = self.client.get(url, {"partial": 1})
+        self.assertContains(partial, "Item 1-1")
+        self.assertNotContains(partial, "<html")
+        self.assertContains(self.client.get(url), f"Order {self.orders[1].order_code}")
+
+    def test_order_items_are_owner_only(self):
+        other = Order.objects.get(user=self.other)
+        self.assertEqual(self.client.get(reverse("order_items", args=[other.order_code])).status_code, 404)
+
+
+# ==========================
+# ORDER EXPORT
+# ==========================
+class OrderExportTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("finance", email="f@example.com")
+        cls.orders = []
+        for day, status, lines in [
+            (date(2026, 8, 31), "delivered", [("Lamp", 25.0, 1)]),
+            (date(2026, 9, 1), "pending", [("Pen", 2.5, 4), ("Desk", 120.0, 1)]),
+            (date(2026, 9, 30), "shipped", [("Rug", 40.0, 2)]),
+            (date(2026, 10, 1), "pending", []),
+        ]:
+            order = Order.objects.create(
+                user=cls.user, status=status, total=sum(price * qty for _, price, qty in lines),
+            )
+            Order.objects.filter(pk=order.pk).update(
+                created_at=datetime.combine(day, datetime.min.time(), dt_timezone.utc),
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_name=name, price=price, quantity=qty) for name, price, qty in lines
+            ])
+            cls.orders.append(order)
+
+    def test_csv_is_one_query_and_one_row_per_line(self):
+        september = order_export.filter_orders(since=date(2026, 9, 1), until=date(2026, 10, 1))
+        with self.assertNumQueries(1):
+            lines = list(order_export.csv_rows(september, chunk_size=2))
+        rows = list(csv.DictReader(lines))
+        self.assertEqual([row["product_name"] for row in rows], ["Pen", "Desk", "Rug"])
+        self.assertEqual(rows[0]["line_total"], "10.0")
+        self.assertEqual(rows[0]["email"], "f@example.com")
+
+    def test_jsonl_groups_items_per_order(self):
+        records = [json.loads(line) for line in order_export.jsonl_rows(order_export.filter_orders())]
+        self.assertEqual([len(record["items"]) for record in records], [1, 2, 1, 0])
+        self.assertEqual(records[1]["items"][1], {"product_name": "Desk", "price": 120.0, "quantity": 1})
+
+    def test_command_filters(self):
+        out = StringIO()
+        call_command("export_orders", "--format", "jsonl", "--status", "pending", stdout=out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([record["status"] for record in records], ["pending", "pending"])
+
+        with self.assertRaises(CommandError):
+            call_command("export_orders", "--since", "2026-10-01", "--until", "2026-09-01")
+
+    def test_admin_action_streams(self):
+        admin_user = User.objects.create_superuser("boss", password="pw")
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse("admin:shop_order_changelist") + "?status__exact=pending", {
+            "action": "export_csv", "select_across": "1", "index": "0",
+            "_selected_action": [order.pk for order in self.orders],
+        })
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+        rows = list(csv.DictReader(line.decode() for line in response.streaming_content))
+        self.assertEqual([row["product_name"] for row in rows], ["Pen", "Desk", ""])
+
+    async def test_admin_action_streams_under_asgi(self):
+        client = AsyncClient()
+        await client.aforce_login(await User.objects.acreate(username="boss", is_staff=True, is_superuser=True))
+        response = await client.post(reverse("admin:shop_order_changelist"), {
+            "action": "export_jsonl", "select_across": "1", "index": "0",
+            "_selected_action": [order.pk for order in self.orders],
+        })
+        self.assertTrue(response.is_async)
+        with warnings.catch_warnings():
+            # "StreamingHttpResponse must consume synchronous iterators"
+            warnings.simplefilter("error")
+            lines = [line async for line in response]
+        self.assertEqual([len(json.loads(line)["items"]) for line in lines], [1, 2, 1, 0])
+
+
+# ==========================
+# QUERY PLANS
+# ==========================
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite's")
+class QueryPlanTests(TestCase):
+    """
+    The hot queries must be answered from an index: no full table scan and
+    no sort step. Seeded and ANALYZEd so the planner sees real statistics.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("planner")
+        others = User.objects.bulk_create([User(username=f"u{n}") for n in range(30)])
+        categories = Category.objects.bulk_create([Category(name=f"c{n}") for n in range(10)])
+        subcategories = SubCategory.objects.bulk_create([
+            SubCategory(category=category, name=f"s{n}") for category in categories for n in range(5)
+        ])
+        Products.objects.bulk_create([
+            Products(
+                title=f"p{n}", price=1, description="", category=sub.category, subcategory=sub,
+            )
+            for n, sub in enumerate(subcategories * 40)
+        ])
+        Order.objects.bulk_create([
+            Order(user=user, order_code=f"#ORD-{n:05d}", status=status, total=1)
+            for n, (user, status) in enumerate(
+                (user, status) for user in [cls.user, *others] for status, _ in Order.STATUS_CHOICES * 4
+            )
+        ])
+        products = list(Products.objects.values_list("id", flat=True))
+        CoPurchase.objects.bulk_create([
+            CoPurchase(product_id=product, related_id=products[(n + k) % len(products)], orders=k)
+            for n, product in enumerate(products) for k in range(1, 9)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertIndexed(self, queryset, index):
+        plan = queryset.explain()
+        self.assertRegex(plan, rf"USING (COVERING )?INDEX {index}\b")
+        full_scans = [line for line in plan.splitlines() if " SCAN " in line and "USING" not in line]
+        self.assertEqual(full_scans, [], plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def listing(self, **params):
+        return KeysetPaginator(
+            views._filtered_products(QueryDict(mutable=True) | params), 10, count_key="",
+        )._query(None)[0]
+
+    def test_product_listing(self):
+        category = Category.objects.first()
+        subcategory = category.subcategories.first()
+        self.assertIndexed(self.listing(), "products_created_id_idx")
+        self.assertIndexed(self.listing(category=category.id), "products_cat_created_idx")
+        self.assertIndexed(self.listing(subcategory=subcategory.id), "products_subcat_created_idx")
+        self.assertIndexed(
+            self.listing(category=category.id, subcategory=subcategory.id), "products_subcat_created_idx",
+        )
+
+    def test_listing_next_page(self):
+        category = Category.objects.first()
+        product = Products.objects.filter(category=category).first()
+        token = pagination.encode_cursor("next", product)
+        paginator = KeysetPaginator(Products.objects.filter(category=category), 10, count_key="")
+        self.assertIndexed(paginator._query(token)[0], "products_cat_created_idx")
+
+    def test_admin_order_status_filter(self):
+        orders = Order.objects.filter(status="pending").order_by("-created_at", "-pk")
+        self.assertIndexed(orders, "order_status_created_idx")
+
+    def test_order_export_date_range(self):
+        orders = order_export.filter_orders(since=date(2026, 9, 1), until=date(2026, 10, 1))
+        self.assertIndexed(orders.order_by("created_at", "id"), "order_created_idx")
+
+    def test_users_orders(self):
+        self.assertIndexed(Order.objects.filter(user=self.user).order_by("-created_at"), "order_user_created_idx")
+
+    def test_order_history_page(self):
+        paginator = order_history.paginator(self.user, 10)
+        self.assertIndexed(paginator._query(None)[0], "order_user_created_idx")
+        token = pagination.encode_cursor("next", Order.objects.filter(user=self.user).first())
+        self.assertIndexed(paginator._query(token)[0], "order_user_created_idx")
+
+    def test_bought_together(self):
+        self.assertIndexed(copurchase.bought_with(Products.objects.first().id), "copurchase_top_idx")
+
+    def test_order_lookup_by_code_and_user(self):
+        plan = Order.objects.filter(order_code="#ORD-00001", user=self.user).explain()
+        self.assertIn("USING INDEX sqlite_autoindex_shop_order_1 (order_code=?)", plan)
+
+
+# ==========================
+# SESSIONS, AUTH USER, MESSAGES
+# ==========================
+def session_or_auth_queries(captured):
+    return [
+        query["sql"] for query in captured
+        if '"django_session"' in query["sql"] or 'FROM "auth_user"' in query["sql"]
+    ]
+
+
+@override_settings(
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    AUTHENTICATION_BACKENDS=["shop.auth_cache.CachedModelBackend", "django.contrib.auth.backends.ModelBackend"],
+    MESSAGE_STORAGE="django.contrib.messages.storage.cookie.CookieStorage",
+)
+class FastSessionProfileTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lamp = make_product("Desk Lamp")
+        cls.user = User.objects.create_user("alice", password="pw")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_requests_skip_session_and_user_queries(self):
+        self.client.get("/cart/")
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get("/cart/").status_code, 200)
+        self.assertEqual(session_or_auth_queries(captured), [])
+
+    async def test_async_views_use_the_cached_user(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        await client.get("/profile/")
+        # update() skips signals, so only a cache hit still says "alice".
+        await User.objects.filter(pk=self.user.pk).aupdate(username="renamed")
+        self.assertContains(await client.get("/profile/"), "alice")
+
+    def test_saving_the_user_drops_the_cached_row(self):
+        self.client.get("/cart/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get("/cart/").status_code, 302)
+
+    def test_password_change_logs_other_sessions_out(self):
+        self.client.get("/cart/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("new")
+            self.user.save()
+        self.assertEqual(self.client.get("/cart/").status_code, 302)
+
+    def test_flash_messages_travel_in_a_cookie(self):
+        self.client.get("/cart/")
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f"/add-to-cart/{self.lamp.id}/", HTTP_REFERER="/cart/", follow=True)
+        self.assertContains(response, "Desk Lamp added to cart!")
+        self.assertEqual(session_or_auth_queries(captured), [])
+
+    def test_sessions_from_before_the_switch_stay_logged_in(self):
+        client = Client()
+        client.force_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+        self.assertEqual(client.get("/cart/").status_code, 200)
+
+
+class SessionProfileSettingsTests(SimpleTestCase):
+
+    def load_settings(self, **env):
+        """Import the settings module in a fresh interpreter under ``env``."""
+        env = {key: value for key, value in os.environ.items() if not key.startswith("SHOP_")} | env
+        return subprocess.run(
+            [sys.executable, "-c", "from ecomsite import settings as s; print(s.SHOP_SESSION_PROFILE)"],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+
+    def test_fast_profile_follows_a_shared_cache(self):
+        self.assertEqual(self.load_settings().stdout.strip(), "fast")   # file cache by default
+        self.assertEqual(self.load_settings(SHOP_CACHE_BACKEND="locmem").stdout.strip(), "db")
+
+    def test_fast_profile_refuses_a_per_process_cache(self):
+        result = self.load_settings(SHOP_SESSION_PROFILE="fast", SHOP_CACHE_BACKEND="locmem")
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("ImproperlyConfigured", result.stderr)
+
+
+# ==========================
+# METRICS
+# ==========================
+class MetricsTests(ShopTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lamp = make_product("Desk Lamp")
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+
+    def test_sync_view_queries_are_counted(self):
+        client = Client()
+        client.force_login(User.objects.create_user("alice"))
+        with CaptureQueriesContext(connection) as queries:
+            client.get("/cart/")
+        totals = metrics.registry.snapshot()["cart"]
+        self.assertEqual(totals["requests"], {"200": 1})
+        self.assertEqual(totals["queries"], len(queries))
+        self.assertEqual(sum(totals["buckets"]), 1)
+
+    async def test_async_view_queries_are_counted(self):
+        await AsyncClient().get(f"/{self.lamp.id}/")
+        await AsyncClient().get("/999999/")
+        totals = metrics.registry.snapshot()["details"]
+        self.assertEqual(totals["requests"], {"200": 1, "404": 1})
+        self.assertGreaterEqual(totals["queries"], 2)
+        self.assertGreater(totals["db_time"], 0)
+
+    @override_settings(SHOP_METRICS_TOKEN="s3cret")
+    def test_exposition(self):
+        Client().get("/")
+        response = Client().get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn('shop_http_requests_total{view="index",status="200"} 1', body)
+        self.assertIn('shop_http_request_duration_seconds_bucket{view="index",le="+Inf"} 1', body)
+        self.assertIn('shop_http_request_duration_seconds_count{view="index"} 1', body)
+        self.assertIn('shop_db_queries_total{view="index"}', body)
+
+    @override_settings(SHOP_METRICS_TOKEN="s3cret")
+    def test_scrapes_need_staff_a_token_or_a_listed_address(self):
+        # 127.0.0.1 too: behind a local reverse proxy that is every client.
+        self.assertEqual(Client().get("/metrics").status_code, 403)
+        self.assertEqual(Client().get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+
+        staff = Client()
+        staff.force_login(User.objects.create_user("ops", is_staff=True))
+        self.assertEqual(staff.get("/metrics").status_code, 200)
+        with self.settings(SHOP_METRICS_ALLOWED_IPS=["10.0.0.9"]):
+            self.assertEqual(Client(REMOTE_ADDR="10.0.0.9").get("/metrics").status_code, 200)
+
+    def test_workers_are_merged(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        other = metrics._empty()
+        other.update(requests={"200": 2}, queries=7)
+        other["buckets"][0] = 2
+        with open(os.path.join(directory, "1.json"), "w") as handle:
+            json.dump({"index": other}, handle)
+        with override_settings(SHOP_METRICS_DIR=directory):
+            Client().get("/")
+            totals = metrics.merged_views()["index"]
+        self.assertEqual(totals["requests"], {"200": 3})
+        self.assertEqual(sum(totals["buckets"]), 3)
+        self.assertGreater(totals["queries"], 7)
+
+
+# ==========================
+# SQLITE PROFILE
+# ==========================
+@unittest.skipUnless(connection.vendor == "sqlite" and settings.SHOP_SQLITE_TUNED, "tuned SQLite profile is off")
+class SQLiteProfileTests(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_on_connect(self):
+        self.assertEqual(self.pragma("synchronous"), 1)   # NORMAL
+        self.assertEqual(self.pragma("busy_timeout"), settings.SHOP_SQLITE_PRAGMAS["busy_timeout"])
+        self.assertEqual(self.pragma("cache_size"), settings.SHOP_SQLITE_PRAGMAS["cache_size"])
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+    def file_connection(self, path):
+        db = connection.copy()
+        db.settings_dict = dict(db.settings_dict, NAME=path)
+        self.addCleanup(db.close)
+        return db
+
+    def journal_mode(self, db):
+        with db.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            return cursor.fetchone()[0]
+
+    def test_migrate_switches_file_databases_to_wal(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "wal.sqlite3")
+        # Connecting alone (any manage.py command) leaves the file as it is.
+        self.assertEqual(self.journal_mode(self.file_connection(path)), "delete")
+
+        connections["wal_test"] = self.file_connection(path)
+        self.addCleanup(connections.__delitem__, "wal_test")
+        signals.set_sqlite_journal_mode(sender=None, using="wal_test")
+        self.assertEqual(self.journal_mode(self.file_connection(path)), "wal")   # persisted
+
+
+# ==========================
+# READ REPLICA ROUTING
+# ==========================
+@override_settings(SHOP_CATALOG_REPLICAS=["replica1"])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routing decisions only; the replica alias is never connected to."""
+
+    router = routers.CatalogReplicaRouter()
+
+    def serve(self, request, write=False):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Products))
+            if write:
+                self.router.db_for_write(Cart)
+                seen.append(self.router.db_for_read(Products))
+            seen.append(self.router.db_for_read(Order))
+            return HttpResponse()
+
+        response = routers.ReplicaPinningMiddleware(view)(request)
+        return seen, response
+
+    def test_catalog_reads_use_the_replica(self):
+        seen, response = self.serve(RequestFactory().get("/"))
+        self.assertEqual(seen, ["replica1", "default"])
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    def test_writes_pin_the_rest_of_the_request_and_the_next_few_seconds(self):
+        seen, response = self.serve(RequestFactory().get("/add-to-cart/1/"), write=True)
+        self.assertEqual(seen, ["replica1", "default", "default"])
+        cookie = response.cookies[routers.STICKY_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.SHOP_REPLICA_STICKY_SECONDS)
+
+        request = RequestFactory().get("/")
+        request.COOKIES[routers.STICKY_COOKIE] = "1"
+        self.assertEqual(self.serve(request)[0], ["default", "default"])
+
+    def test_unsafe_methods_and_code_outside_requests_use_the_primary(self):
+        self.assertEqual(self.serve(RequestFactory().post("/place-order/"))[0], ["default", "default"])
+        self.assertEqual(self.router.db_for_read(Products), "default")
+
+    def test_copy_database(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source, target = os.path.join(directory, "primary.sqlite3"), os.path.join(directory, "replica.sqlite3")
+        with sqlite3.connect(source) as db:
+            db.execute("CREATE TABLE t (x)")
+            db.execute("INSERT INTO t VALUES (1)")
+        db.close()
+        replication.copy_database(source, target)
+        db = sqlite3.connect(target)
+        self.assertEqual(db.execute("SELECT x FROM t").fetchall(), [(1,)])
+        db.close()
+
+    def test_replicator_bumps_again_after_a_write_during_the_copy(self):
+        replicator = replication.Replicator(aliases=["default"])
+        writes = [True, False, False]
+
+        def copy(source, target):
+            if writes.pop(0):
+                bump_version(CATALOG)   # a catalog write commits mid-copy
+
+        versions = [get_version(CATALOG)]
+        with unittest.mock.patch.object(replication, "copy_database", copy):
+            for _ in range(3):
+                replicator.run_once()
+                versions.append(get_version(CATALOG))
+        # The write plus the first pass's bump; then one more bump for the
+        # copy that surely includes the write; then nothing new.
+        self.assertEqual([v - versions[0] for v in versions], [0, 2, 3, 3])
+
+
+# ==========================
+# BENCHMARK HARNESS
+# ==========================
+class BenchmarkSuiteTests(ShopTestCase):
+
+    def test_dataset_and_client_driver(self):
+        data = dataset.generate(categories=2, subcategories=2, products=30, users=5, carts=3, orders=10)
+        self.assertEqual(Products.objects.filter(subcategory__isnull=False).count(), 30)
+        self.assertEqual(Order.objects.count(), 10)
+        self.assertEqual(Cart.objects.filter(item_count=3).count(), 3)
+        self.assertEqual(len(data["buyers"]), 2)
+
+        selected = suite.scenarios(data)
+        stats = suite.run_client(selected["details"], data, requests=5, warmup=1)
+        self.assertEqual((stats["requests"], stats["errors"]), (5, {}))
+        self.assertGreater(stats["queries_per_request"], 0)
+        stats = suite.run_client(selected["place_order"], data, requests=5, warmup=1)
+        self.assertEqual(stats["requests"], 2)   # one per buyer with a cart
+        self.assertEqual(Order.objects.count(), 12)
+
+    def test_compare_flags_regressions(self):
+        def report(p95, throughput, queries):
+            return {"results": {"client/index": {
+                "p95": p95, "throughput": throughput, "queries_per_request": queries,
+            }}}
+
+        self.assertEqual(suite.compare(report(10, 100, 3), report(11, 95, 3)), [])
+        self.assertEqual(len(suite.compare(report(10, 100, 3), report(13, 70, 4))), 3)
@@ -0,0 +1,52 @@
+"""
+Shared version counters for cache invalidation.
+
+A version lives in the default cache under ``shop:version:<name>`` and is
+bumped (never reset) when the data it describes changes. Cache keys that
+embed a version go stale the moment it moves, so there is nothing to
+delete and every worker agrees on what is current, provided they share
+the cache (``SHOP_CACHE_BACKEND`` file or redis, not locmem).
+"""
+import time
+
+from django.core.cache import cache
+
+
+# Bumped whenever any product is saved or deleted.
+CATALOG = "catalog"
+# Bumped on category, subcategory and product changes.
+CATEGORY_TREE = "category_tree"
+
+
+def _key(name):
+    return f"shop:version:{name}"
+
+
+def _seed(name):
+    # Seeded from the clock rather than 1: after a cache flush, a process
+    # still holding data for an old version must not see that number again.
+    cache.add(_key(name), time.time_ns(), None)
+
+
+def get_version(name):
+    version = cache.get(_key(name))
+    if version is None:
+        _seed(name)
+        version = cache.get(_key(name))
+    return version
+
+
+def bump_version(name):
+    try:
+        return cache.incr(_key(name))
+    except ValueError:
+        _seed(name)
+        return cache.get(_key(name))
+
+
+async def aget_version(name):
+    version = await cache.aget(_key(name))
+    if version is None:
+        await cache.aadd(_key(name), time.time_ns(), None)
+        version = await cache.aget(_key(name))
+    return version
@@ -1,74 +1,188 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db import transaction
-
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_POST
+
+from .cart import MAX_QUANTITY, add_product, aitem_count, remove_item, set_quantity, summary as cart_summary
+from .category_tree import get_category_tree
+from .checkout import place_order_from_cart
+from .conditional import finish, not_modified, page_etag
+from .copurchase import bought_with
+from .fragments import agrid_cache_key, aget_fragment, aset_fragment, grid_params
+from .order_history import paginator as order_history_paginator
+from .pagination import CachedCountPaginator, KeysetPaginator
+from .search import search_products
+from .wishlist_cache import awishlisted_among
 from .models import (
     Products,
-    Category,
     SubCategory,
     Cart,
     CartItem,
     Order,
-    OrderItem,
     Wishlist,
 )
 
 
+# How long after checkout a repeated "Place Order" shows that order again.
+DOUBLE_SUBMIT_WINDOW = timedelta(seconds=30)
+
+
+async def _aload_request_state(request):
+    """
+    Load the session, user and cart badge count before rendering. Templates
+    read them (header, messages) synchronously, which must not fall through
+    to the database from an async view.
+    """
+    await request.session.akeys()
+    request.user = await request.auser()
+    if request.user.is_authenticated:
+        request.cart_count = await aitem_count(request.user)
+
+
 # ==========================
 # INDEX (PRODUCT LISTING)
 # ==========================
-def index(request):
+async def index(request):
+    await _aload_request_state(request)
+
+    # The grid + pager HTML is shared by everyone who asks for the same
+    # filters at the same catalog version; see shop/fragments.py.
+    params = grid_params(request.GET)
+    grid_key = await agrid_cache_key(params)
+    grid = await aget_fragment(grid_key)
+    if grid is None:
+        grid = await _arender_product_grid(params)
+        await aset_fragment(grid_key, grid)
+
+    # Sidebar taxonomy from the process-wide snapshot (no queries when warm)
+    categories = await sync_to_async(get_category_tree)()
+
+    # Hearted products on this page only (applied client-side over the grid),
+    # answered from the cached per-user ID set; see shop/wishlist_cache.py.
+    wishlist_ids = []
+    if request.user.is_authenticated:
+        wishlist_ids = await awishlisted_among(request.user.id, grid["product_ids"])
+
+    # Everything the page shows is in hand: answer 304 without rendering
+    # when the browser's copy matches; see shop/conditional.py.
+    etag = page_etag(request, "index", grid_key, categories.version, wishlist_ids)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    context = {
+        "product_grid": mark_safe(grid["html"]),
+        "categories": categories,
+        "wishlist_ids": wishlist_ids,
+    }
+
+    return finish(request, render(request, "shop/index.html", context), etag)
+
 
+async def _arender_product_grid(params):
+    """
+    Plain browsing pages by keyset cursor with the async ORM. Ranked search
+    (raw FTS5 SQL) and legacy ?page=N links run the sync path in a thread.
+    """
+    if params.get("item_name") or params.get("page"):
+        return await sync_to_async(_render_product_grid)(params)
+
+    product_objects = _filtered_products(params)
+    paginator = KeysetPaginator(product_objects, 10, count_key=_count_key(params))
+    product_objects = await paginator.aget_page(params.get("cursor"))
+    await paginator.acount()
+    return _grid_fragment(product_objects, params)
+
+
+def _filtered_products(params):
     product_objects = Products.objects.all()
 
     # CATEGORY FILTER
-    category_id = request.GET.get("category")
+    category_id = params.get("category")
     if category_id:
         product_objects = product_objects.filter(category_id=category_id)
 
     # SUBCATEGORY FILTER
-    subcategory_id = request.GET.get("subcategory")
+    subcategory_id = params.get("subcategory")
     if subcategory_id:
         product_objects = product_objects.filter(subcategory_id=subcategory_id)
 
-    # SEARCH
-    item_name = request.GET.get("item_name")
+    # SEARCH (ranked full-text, see shop/search.py)
+    item_name = params.get("item_name")
     if item_name:
-        product_objects = product_objects.filter(title__icontains=item_name)
+        product_objects = search_products(product_objects, item_name)
 
-    # PAGINATION
-    paginator = Paginator(product_objects, 10)
-    page = request.GET.get("page")
-    product_objects = paginator.get_page(page)
+    return product_objects
 
-    # Categories with prefetch
-    categories = Category.objects.prefetch_related("subcategories")
 
-    # Wishlist IDs for heart icon state
-    wishlist_ids = []
-    if request.user.is_authenticated:
-        wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
-        wishlist_ids = list(wishlist.products.values_list("id", flat=True))
+def _count_key(params):
+    count_params = params.copy()
+    count_params.pop("page", None)
+    count_params.pop("cursor", None)
+    return count_params.urlencode()
 
-    context = {
-        "product_objects": product_objects,
-        "categories": categories,
-        "wishlist_ids": wishlist_ids,
-    }
 
-    return render(request, "shop/index.html", context)
+def _grid_fragment(product_objects, params):
+    html = render_to_string(
+        "shop/product_grid.html",
+        {"product_objects": product_objects, "grid_params": params},
+    )
+    return {"html": html, "product_ids": [product.id for product in product_objects]}
+
+
+def _render_product_grid(params):
+    """Run the listing query for ``params`` and render the shared grid HTML."""
+    product_objects = _filtered_products(params)
+
+    # PAGINATION
+    # Browsing uses keyset cursors over (created_at, id); ranked search
+    # results and old ?page=N links keep offset pages. Either way the
+    # total is cached per filter set rather than counted on every view.
+    count_key = _count_key(params)
+    page = params.get("page")
+    if params.get("item_name") or page:
+        paginator = CachedCountPaginator(product_objects, 10, count_key=count_key)
+        product_objects = paginator.get_page(page)
+    else:
+        paginator = KeysetPaginator(product_objects, 10, count_key=count_key)
+        product_objects = paginator.get_page(params.get("cursor"))
+
+    return _grid_fragment(product_objects, params)
 
 
 # ==========================
 # PRODUCT DETAIL
 # ==========================
-def details(request, id):
-    product_object = get_object_or_404(Products, id=id)
-    return render(request, "shop/details.html", {"product_object": product_object})
+async def details(request, id):
+    await _aload_request_state(request)
+    product_object = await aget_object_or_404(Products, id=id)
+    # "Frequently bought together": one indexed query (copurchase.py).
+    bought_together = [pair.related async for pair in bought_with(product_object.id)]
+
+    etag = page_etag(
+        request, "details", product_object.id, product_object.updated_at,
+        [(related.id, related.updated_at) for related in bought_together],
+    )
+    last_modified = max([product_object.updated_at, *(related.updated_at for related in bought_together)])
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    response = render(request, "shop/details.html", {
+        "product_object": product_object,
+        "bought_together": bought_together,
+    })
+    return finish(request, response, etag, last_modified)
 
 
 # ==========================
@@ -78,17 +192,7 @@ def details(request, id):
 def add_to_cart(request, product_id):
     """Add a product to the authenticated user's cart."""
     product = get_object_or_404(Products, id=product_id)
-    cart, _ = Cart.objects.get_or_create(user=request.user)
-
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={"price": product.price, "quantity": 1},
-    )
-
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    add_product(request.user, product)
 
     messages.success(request, f"{product.title} added to cart!")
     # Redirect back to wherever the user came from
@@ -101,8 +205,12 @@ def add_to_cart(request, product_id):
 @login_required
 def cart_view(request):
     """Display the user's cart with items, summary, and order-tracking form."""
-    cart, _ = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.select_related("product").all()
+    # The Cart row is only created by add_to_cart; viewing never writes.
+    cart = Cart.objects.filter(user=request.user).first()
+    if cart is None:
+        cart_items = CartItem.objects.none()
+    else:
+        cart_items = cart.items.select_related("product").all()
 
     context = {
         "cart": cart,
@@ -117,9 +225,11 @@ def cart_view(request):
 @login_required
 def delete_cart_item(request, item_id):
     """Remove a single item from the user's cart (owner-only)."""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    cart_item = get_object_or_404(
+        CartItem.objects.select_related("product"), id=item_id, cart__user=request.user
+    )
     product_name = cart_item.product.title
-    cart_item.delete()
+    remove_item(cart_item)
     messages.success(request, f"{product_name} removed from cart.")
     return redirect("cart")
 
@@ -128,40 +238,31 @@ def delete_cart_item(request, item_id):
 # PLACE ORDER  (atomic)
 # ==========================
 @login_required
+@require_POST
 def place_order(request):
     """
     Convert the user's cart into an Order + OrderItems.
-    Uses a database transaction so partial saves never happen.
+    The whole pipeline is one short transaction; see shop/checkout.py.
     """
-    cart = get_object_or_404(Cart, user=request.user)
-    cart_items = cart.items.select_related("product").all()
-
-    if not cart_items.exists():
+    order = place_order_from_cart(request.user)
+
+    if order is None:
+        # A double-submit lands here after the first request emptied the
+        # cart: show the order it just placed rather than an error.
+        recent = (
+            Order.objects.filter(
+                user=request.user,
+                created_at__gte=timezone.now() - DOUBLE_SUBMIT_WINDOW,
+            )
+            .order_by("-created_at")
+            .values_list("order_code", flat=True)
+            .first()
+        )
+        if recent:
+            return redirect("order_success", order_code=recent)
         messages.warning(request, "Your cart is empty — add items first!")
         return redirect("cart")
 
-    with transaction.atomic():
-        # 1. Create Order
-        order = Order.objects.create(
-            user=request.user,
-            total=cart.total_price,
-        )
-
-        # 2. Move CartItems → OrderItems
-        order_items = [
-            OrderItem(
-                order=order,
-                product_name=item.product.title,
-                price=item.price,
-                quantity=item.quantity,
-            )
-            for item in cart_items
-        ]
-        OrderItem.objects.bulk_create(order_items)
-
-        # 3. Clear the cart
-        cart_items.delete()
-
     return redirect("order_success", order_code=order.order_code)
 
 
@@ -207,17 +308,39 @@ def track_order(request):
     )
 
 
+@login_required
+def order_items(request, order_code):
+    """
+    An order's line items. ``?partial=1`` returns just the rows, loaded
+    when an order is expanded in the profile's order history; without it
+    (no JS) the full tracking page.
+    """
+    order = get_object_or_404(Order, order_code=order_code, user=request.user)
+    if request.GET.get("partial"):
+        return render(request, "shop/order_lines.html", {"items": order.items.all()})
+    return render(request, "shop/order_track_result.html", {"order": order, "error": None})
+
+
 # ==========================
 # PROFILE PAGE
 # ==========================
 @login_required
-def profile_view(request):
-    """Display user profile with username, email, and wishlist."""
-    wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
-    wishlist_items = wishlist.products.all()
+async def profile_view(request):
+    """Display user profile with username, email, order history and wishlist."""
+    await _aload_request_state(request)
+    # The Wishlist row is only created by toggle_wishlist; viewing never writes.
+    wishlist_items = [
+        product async for product in
+        Products.objects.filter(wishlisted_by__user=request.user)
+    ]
+    # One keyset page with per-order counts; items load on expand.
+    orders = await order_history_paginator(
+        request.user, settings.SHOP_ORDER_HISTORY_PER_PAGE,
+    ).aget_page(request.GET.get("orders"))
 
     context = {
         "wishlist_items": wishlist_items,
+        "orders": orders,
     }
     return render(request, "shop/profile.html", context)
 
@@ -229,18 +352,97 @@ def profile_view(request):
 def toggle_wishlist(request, product_id):
     """Add or remove a product from the user's wishlist."""
     product = get_object_or_404(Products, id=product_id)
-    wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
 
-    if wishlist.products.filter(id=product_id).exists():
-        wishlist.products.remove(product)
-        messages.success(request, f"{product.title} removed from wishlist.")
-    else:
-        wishlist.products.add(product)
+    if _toggle_wishlist(request.user, product):
         messages.success(request, f"{product.title} added to wishlist!")
+    else:
+        messages.success(request, f"{product.title} removed from wishlist.")
 
     return redirect(request.META.get("HTTP_REFERER", "/"))
 
 
+def _toggle_wishlist(user, product):
+    """Flip ``product`` on the user's wishlist; True if it is now on it."""
+    wishlist, _ = Wishlist.objects.get_or_create(user=user)
+
+    if wishlist.products.filter(id=product.id).exists():
+        wishlist.products.remove(product)
+        return False
+    wishlist.products.add(product)
+    return True
+
+
+# ==========================
+# JSON API  (in-place cart / wishlist updates)
+# ==========================
+def api_login_required(view):
+    """Like login_required, but answers 401 JSON instead of redirecting."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _cart_item_or_404(request, item_id):
+    return get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+
+
+def _cart_payload(request, **extra):
+    payload = cart_summary(request.user)
+    payload.update(extra)
+    return JsonResponse(payload)
+
+
+@require_POST
+@api_login_required
+def api_cart_add(request, product_id):
+    product = get_object_or_404(Products.objects.only("id", "price"), id=product_id)
+    quantity = add_product(request.user, product)
+    return _cart_payload(request, product_id=product.id, quantity=quantity)
+
+
+@require_POST
+@api_login_required
+def api_cart_remove(request, item_id):
+    cart_item = _cart_item_or_404(request, item_id)
+    item_id = cart_item.pk   # delete() clears the pk
+    remove_item(cart_item)
+    return _cart_payload(request, item_id=item_id, quantity=0)
+
+
+@require_POST
+@api_login_required
+def api_cart_set_quantity(request, item_id):
+    try:
+        quantity = int(request.POST.get("quantity", ""))
+    except ValueError:
+        return JsonResponse({"error": "quantity must be a whole number."}, status=400)
+    if not 0 <= quantity <= MAX_QUANTITY:
+        return JsonResponse({"error": f"quantity must be between 0 and {MAX_QUANTITY}."}, status=400)
+
+    cart_item = _cart_item_or_404(request, item_id)
+    item_id = cart_item.pk   # removing the line clears the pk
+    set_quantity(cart_item, quantity)
+    return _cart_payload(
+        request,
+        item_id=item_id,
+        quantity=quantity,
+        line_total=cart_item.price * quantity,
+    )
+
+
+@require_POST
+@api_login_required
+def api_wishlist_toggle(request, product_id):
+    product = get_object_or_404(Products.objects.only("id"), id=product_id)
+    return JsonResponse({
+        "product_id": product.id,
+        "wishlisted": _toggle_wishlist(request.user, product),
+    })
+
+
 # ==========================
 # CHECKOUT (legacy kept for reference)
 # ==========================
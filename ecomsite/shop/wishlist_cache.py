@@ -0,0 +1,108 @@
+"""
+Per-user wishlist membership cache for the heart icons on ``/``.
+
+Each user's wishlisted product IDs are kept in the cache as a sorted
+``array('q')`` (8 bytes per ID), so a listing page answers "which of these
+ten products are hearted?" with a few binary searches instead of loading
+the whole wishlist. ``shop.signals`` patches the array in place whenever
+the wishlist's products change.
+"""
+from array import array
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+
+from .models import Wishlist
+
+
+CACHE_KEY = "shop:wishlist:{user_id}"
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def _decode(raw):
+    ids = array("q")
+    ids.frombytes(raw)
+    return ids
+
+
+def _ids_query(user_id):
+    return (
+        Wishlist.products.through.objects
+        .filter(wishlist__user_id=user_id)
+        .values_list("products_id", flat=True)
+    )
+
+
+def _load(user_id):
+    ids = array("q", sorted(_ids_query(user_id)))
+    cache.set(_key(user_id), ids.tobytes(), CACHE_TIMEOUT)
+    return ids
+
+
+async def _aload(user_id):
+    ids = array("q", sorted([product_id async for product_id in _ids_query(user_id)]))
+    await cache.aset(_key(user_id), ids.tobytes(), CACHE_TIMEOUT)
+    return ids
+
+
+def _contains(ids, product_id):
+    index = bisect_left(ids, product_id)
+    return index < len(ids) and ids[index] == product_id
+
+
+def wishlist_ids(user_id):
+    """Sorted array of the user's wishlisted product IDs."""
+    raw = cache.get(_key(user_id))
+    if raw is None:
+        return _load(user_id)
+    return _decode(raw)
+
+
+def wishlisted_among(user_id, product_ids):
+    """The subset of ``product_ids`` on the user's wishlist, in input order."""
+    if not product_ids:
+        return []
+    ids = wishlist_ids(user_id)
+    return [product_id for product_id in product_ids if _contains(ids, product_id)]
+
+
+async def awishlisted_among(user_id, product_ids):
+    if not product_ids:
+        return []
+    raw = await cache.aget(_key(user_id))
+    ids = await _aload(user_id) if raw is None else _decode(raw)
+    return [product_id for product_id in product_ids if _contains(ids, product_id)]
+
+
+# ==========================
+# INCREMENTAL UPDATES
+# ==========================
+def add(user_id, product_ids):
+    raw = cache.get(_key(user_id))
+    if raw is None:
+        return  # not cached yet; the next read loads the fresh set
+    ids = _decode(raw)
+    for product_id in product_ids:
+        if not _contains(ids, product_id):
+            insort(ids, product_id)
+    cache.set(_key(user_id), ids.tobytes(), CACHE_TIMEOUT)
+
+
+def remove(user_id, product_ids):
+    raw = cache.get(_key(user_id))
+    if raw is None:
+        return
+    ids = _decode(raw)
+    for product_id in product_ids:
+        index = bisect_left(ids, product_id)
+        if index < len(ids) and ids[index] == product_id:
+            del ids[index]
+    cache.set(_key(user_id), ids.tobytes(), CACHE_TIMEOUT)
+
+
+def invalidate(*user_ids):
+    cache.delete_many([_key(user_id) for user_id in user_ids])